@@ -3,25 +3,83 @@ Chess Game with AI using Minimax Algorithm
 Main entry point for the application
 """
 
-import pygame
-from src.game import Game
+import time
+
+# Mốc thời gian bắt đầu, dùng cho --profile-startup
+_START_TIME = time.perf_counter()
+
+import argparse
+import threading
 from src.constants import WIDTH, HEIGHT, TITLE
 
+class StartupProfiler:
+    """Records the time of each startup phase and prints them once the first frame is shown"""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.phases = []
+        self.last = _START_TIME
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def first_frame(self):
+        self.mark('main menu first frame')
+        if not self.enabled:
+            return
+        print("Startup profile (ms):")
+        for phase, elapsed in self.phases:
+            print(f"  {phase:24s} {elapsed * 1000:8.1f}")
+        print(f"  {'time to first frame':24s} {(self.last - _START_TIME) * 1000:8.1f}", flush=True)
+
+def preload_engine():
+    """Import the AI in the background so the first AI move does not wait for it"""
+    import src.ai
+
 def main():
     """Main function to run the chess game"""
+    parser = argparse.ArgumentParser(description=TITLE)
+    parser.add_argument('--fen', help="start the game from this FEN position")
+    parser.add_argument('--profile-startup', action='store_true', help="print the time to the first frame by phase")
+    args = parser.parse_args()
+    profiler = StartupProfiler(args.profile_startup)
+    if args.fen:
+        # Kiểm tra FEN trước khi mở cửa sổ
+        from src.fen import parse_fen
+        try:
+            parse_fen(args.fen)
+        except ValueError as error:
+            parser.error(str(error))
+    profiler.mark('arguments')
+    
     # Initialize pygame
+    import pygame
+    profiler.mark('import pygame')
     pygame.init()
+    profiler.mark('pygame.init')
     
     # Set up the display
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption(TITLE)
+    profiler.mark('display')
+    
+    # Ảnh quân cờ và AI được nạp ở luồng nền trong lúc menu chính hiển thị
+    from src.assets import preload_piece_images
+    preload_piece_images()
+    threading.Thread(target=preload_engine, daemon=True).start()
+    profiler.mark('start preloading')
+    
+    from src.game import Game
+    profiler.mark('import game')
     
     # Create and run the game
-    game = Game(screen)
+    game = Game(screen, args.fen, profiler.first_frame)
     game.run()
     
     # Quit pygame
     pygame.quit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
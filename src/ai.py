@@ -2,9 +2,17 @@
 Chess AI using Minimax algorithm with Alpha-Beta pruning
 """
 
+import sys
 import time
-from src.pieces import get_valid_moves_considering_check, is_check, is_checkmate
-from src.board import make_hypothetical_move
+from contextlib import contextmanager
+from src.pieces import get_valid_moves_considering_check, is_checkmate, is_king_in_check_simple, get_attack_map
+from src.board import make_hypothetical_move, get_game_phase, MAX_PHASE
+from src.zobrist import compute_pawn_key, compute_hash
+from src.endgame import INSUFFICIENT_MATERIAL_KEYS
+from src.cache import LRUCache
+from src.book import probe_book
+from src.experience import probe_experience, record_experience
+from src.tablebase import probe_position, MAX_PIECES as TABLEBASE_MAX_PIECES
 
 # Giá trị của từng loại quân cờ
 PIECE_VALUES = {
@@ -16,7 +24,23 @@ PIECE_VALUES = {
     'K': 900   # Vua
 }
 
-# Bảng giá trị vị trí cho các quân cờ
+# Hệ số đổi PIECE_VALUES (đơn vị 1/10 tốt) sang centipawn dùng trong hàm đánh giá
+CENTIPAWN_SCALE = 10
+
+# Điểm chiếu hết và điểm thưởng khi chiếu (centipawn)
+MATE_SCORE = 100000
+CHECK_BONUS = 500
+
+# Điểm thắng theo bảng tàn cuộc: nhỏ hơn chiếu hết, giảm dần theo số nửa nước tới chiếu hết
+TABLEBASE_WIN_SCORE = MATE_SCORE // 2
+
+# Điểm có trị tuyệt đối lớn hơn mức này là thắng bắt buộc (chiếu hết hoặc theo bảng tàn cuộc).
+# Trong cây tìm kiếm các điểm này được trừ dần theo số nửa nước tính từ gốc,
+# nên điểm tại gốc cho biết khoảng cách tới chiếu hết và thắng nhanh hơn được ưu tiên
+FORCED_WIN_BOUND = TABLEBASE_WIN_SCORE // 2
+
+# Bảng giá trị vị trí cho các quân cờ (nhìn từ phía trắng, hàng 0 là hàng cuối của đen)
+# Mỗi loại quân có hai bảng: trung cuộc (MG) và tàn cuộc (EG)
 # Tốt sẽ được thêm điểm khi tiến gần đến cuối bàn cờ
 PAWN_POSITION_VALUE = [
     [0, 0, 0, 0, 0, 0, 0, 0],
@@ -29,6 +53,18 @@ PAWN_POSITION_VALUE = [
     [0, 0, 0, 0, 0, 0, 0, 0]
 ]
 
+# Tàn cuộc: tốt càng tiến xa càng giá trị, không còn ưu tiên trung tâm
+PAWN_POSITION_VALUE_EG = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [80, 80, 80, 80, 80, 80, 80, 80],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [30, 30, 30, 30, 30, 30, 30, 30],
+    [20, 20, 20, 20, 20, 20, 20, 20],
+    [10, 10, 10, 10, 10, 10, 10, 10],
+    [10, 10, 10, 10, 10, 10, 10, 10],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+
 # Mã được ưu tiên ở vị trí trung tâm
 KNIGHT_POSITION_VALUE = [
     [-50, -40, -30, -30, -30, -30, -40, -50],
@@ -41,107 +77,474 @@ KNIGHT_POSITION_VALUE = [
     [-50, -40, -30, -30, -30, -30, -40, -50]
 ]
 
-# Cache lưu trữ kết quả đánh giá trạng thái bàn cờ
-evaluation_cache = {}
+# Tượng tránh góc và cạnh bàn cờ
+BISHOP_POSITION_VALUE = [
+    [-20, -10, -10, -10, -10, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 5, 10, 10, 5, 0, -10],
+    [-10, 5, 5, 10, 10, 5, 5, -10],
+    [-10, 0, 10, 10, 10, 10, 0, -10],
+    [-10, 10, 10, 10, 10, 10, 10, -10],
+    [-10, 5, 0, 0, 0, 0, 5, -10],
+    [-20, -10, -10, -10, -10, -10, -10, -20]
+]
+
+# Xe được thưởng khi lên hàng 7 và ở cột trung tâm
+ROOK_POSITION_VALUE = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [5, 10, 10, 10, 10, 10, 10, 5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [0, 0, 0, 5, 5, 0, 0, 0]
+]
+
+# Hậu ưu tiên trung tâm nhưng không quá sớm
+QUEEN_POSITION_VALUE = [
+    [-20, -10, -10, -5, -5, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 5, 5, 5, 5, 0, -10],
+    [-5, 0, 5, 5, 5, 5, 0, -5],
+    [0, 0, 5, 5, 5, 5, 0, -5],
+    [-10, 5, 5, 5, 5, 5, 0, -10],
+    [-10, 0, 5, 0, 0, 0, 0, -10],
+    [-20, -10, -10, -5, -5, -10, -10, -20]
+]
+
+# Trung cuộc: vua nên ở sau hàng tốt, đã nhập thành
+KING_POSITION_VALUE = [
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-20, -30, -30, -40, -40, -30, -30, -20],
+    [-10, -20, -20, -20, -20, -20, -20, -10],
+    [20, 20, 0, 0, 0, 0, 20, 20],
+    [20, 30, 10, 0, 0, 10, 30, 20]
+]
+
+# Tàn cuộc: vua cần tiến ra trung tâm
+KING_POSITION_VALUE_EG = [
+    [-50, -40, -30, -20, -20, -30, -40, -50],
+    [-30, -20, -10, 0, 0, -10, -20, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -30, 0, 0, 0, 0, -30, -30],
+    [-50, -30, -30, -30, -30, -30, -30, -50]
+]
+
+def _build_piece_square_tables(position_values):
+    """
+    Tạo bảng phẳng 64 phần tử cho từng (loại quân, màu), đã cộng sẵn giá trị quân.
+    Chỉ số ô: row * 8 + col. Bảng của đen được lật (sq ^ 56) và đổi dấu
+    để hàm đánh giá chỉ cần cộng dồn.
+    """
+    tables = {}
+    for piece_type, table in position_values.items():
+        flat = [value for row in table for value in row]
+        base = PIECE_VALUES[piece_type] * CENTIPAWN_SCALE
+        tables[(piece_type, 'white')] = [base + flat[sq] for sq in range(64)]
+        tables[(piece_type, 'black')] = [-(base + flat[sq ^ 56]) for sq in range(64)]
+    return tables
+
+# Bảng tra cứu trung cuộc và tàn cuộc, tính một lần khi import
+MG_TABLES = _build_piece_square_tables({
+    'P': PAWN_POSITION_VALUE,
+    'N': KNIGHT_POSITION_VALUE,
+    'B': BISHOP_POSITION_VALUE,
+    'R': ROOK_POSITION_VALUE,
+    'Q': QUEEN_POSITION_VALUE,
+    'K': KING_POSITION_VALUE
+})
+EG_TABLES = _build_piece_square_tables({
+    'P': PAWN_POSITION_VALUE_EG,
+    'N': KNIGHT_POSITION_VALUE,
+    'B': BISHOP_POSITION_VALUE,
+    'R': ROOK_POSITION_VALUE,
+    'Q': QUEEN_POSITION_VALUE,
+    'K': KING_POSITION_VALUE_EG
+})
+
+# Điểm cấu trúc tốt (centipawn, trung cuộc/tàn cuộc)
+DOUBLED_PAWN_PENALTY = (10, 20)
+ISOLATED_PAWN_PENALTY = (15, 20)
+BACKWARD_PAWN_PENALTY = (10, 10)
+# Thưởng tốt thông theo số hàng đã tiến (0 = hàng xuất phát của vua, 7 = hàng phong cấp)
+PASSED_PAWN_BONUS_MG = [0, 5, 10, 15, 25, 40, 60, 0]
+PASSED_PAWN_BONUS_EG = [0, 10, 20, 35, 55, 85, 120, 0]
+
+# Độ linh động: điểm cho mỗi ô tấn công được so với mức trung bình của loại quân (trung cuộc, tàn cuộc)
+MOBILITY_WEIGHTS = {'N': (4, 4), 'B': (5, 5), 'R': (2, 4), 'Q': (1, 2)}
+MOBILITY_BASELINE = {'N': 4, 'B': 6, 'R': 7, 'Q': 13}
+
+# An toàn vua: phạt cho mỗi đòn tấn công của đối phương vào các ô quanh vua
+KING_ZONE_ATTACK_PENALTY = (8, 2)
+
+# Giới hạn tổng điểm độ linh động + an toàn vua, cũng là biên cho đánh giá lười:
+# nếu điểm vật chất + vị trí đã nằm ngoài cửa sổ alpha-beta quá biên này thì
+# các thành phần còn lại không thể thay đổi kết quả cắt tỉa
+LAZY_EVAL_MARGIN = 300
+
+# Bảng băm cấu trúc tốt kích thước cố định (lũy thừa của 2), khóa là khóa Zobrist chỉ gồm tốt
+PAWN_HASH_SIZE = 1 << 14
+
+# Thống kê của lần tìm kiếm gần nhất
+search_stats = {
+    'nodes': 0,
+    'evaluations': 0,
+    'eval_cache_hits': 0,
+    'pawn_hash_probes': 0,
+    'pawn_hash_hits': 0,
+    'lazy_exits': 0,
+    'tablebase_hits': 0,
+    'tt_probes': 0,
+    'tt_hits': 0,
+    'depth': 0,  # Độ sâu lớn nhất đã tìm kiếm trọn vẹn tại gốc
+    'repetitions': 0
+}
+
+# Kết quả từng độ sâu của lần tìm kiếm gần nhất:
+# [{'depth', 'move', 'score', 'complete' (độ sâu được tìm kiếm trọn vẹn), 'nodes', 'time' (giây từ lúc bắt đầu)}, ...]
+search_iterations = []
+
+def reset_search_stats():
+    """Đặt lại thống kê tìm kiếm"""
+    for key in search_stats:
+        search_stats[key] = 0
+    search_iterations.clear()
+
+def get_search_stats():
+    """Trả về thống kê tìm kiếm kèm tỉ lệ trúng của các bảng băm"""
+    stats = dict(search_stats)
+    probes = stats['pawn_hash_probes']
+    stats['pawn_hash_hit_rate'] = stats['pawn_hash_hits'] / probes if probes else 0.0
+    evaluations = stats['evaluations']
+    stats['eval_cache_hit_rate'] = stats['eval_cache_hits'] / evaluations if evaluations else 0.0
+    tt_probes = stats['tt_probes']
+    stats['tt_hit_rate'] = stats['tt_hits'] / tt_probes if tt_probes else 0.0
+    return stats
+
+def evaluate_pawn_structure(board):
+    """
+    Đánh giá cấu trúc tốt: tốt chồng, tốt cô lập, tốt lạc hậu và tốt thông.
+    Chỉ phụ thuộc vào vị trí các quân tốt nên có thể lưu trong bảng băm tốt.
+    Trả về cặp (trung cuộc, tàn cuộc), dương có lợi cho trắng.
+    """
+    # Hàng của các tốt theo từng cột
+    pawn_rows = {'white': [[] for _ in range(8)], 'black': [[] for _ in range(8)]}
+    for (row, col), (piece_type, color) in board.items():
+        if piece_type == 'P':
+            pawn_rows[color][col].append(row)
+    
+    mg_score = 0
+    eg_score = 0
+    for color, sign in (('white', 1), ('black', -1)):
+        own = pawn_rows[color]
+        enemy = pawn_rows['black' if color == 'white' else 'white']
+        forward = -1 if color == 'white' else 1
+        
+        for col in range(8):
+            rows = own[col]
+            if not rows:
+                continue
+            
+            # Tốt chồng: mỗi tốt thừa trên cùng một cột
+            if len(rows) > 1:
+                mg_score -= sign * DOUBLED_PAWN_PENALTY[0] * (len(rows) - 1)
+                eg_score -= sign * DOUBLED_PAWN_PENALTY[1] * (len(rows) - 1)
+            
+            neighbour_cols = [c for c in (col - 1, col + 1) if 0 <= c < 8]
+            isolated = not any(own[c] for c in neighbour_cols)
+            
+            for row in rows:
+                if isolated:
+                    mg_score -= sign * ISOLATED_PAWN_PENALTY[0]
+                    eg_score -= sign * ISOLATED_PAWN_PENALTY[1]
+                else:
+                    # Tốt lạc hậu: các tốt bên cạnh đều đã vượt lên trước
+                    # và ô phía trước bị tốt đối phương khống chế
+                    supported = any((r - row) * forward <= 0 for c in neighbour_cols for r in own[c])
+                    stop_row = row + forward
+                    if not supported and any(stop_row + forward in enemy[c] for c in neighbour_cols):
+                        mg_score -= sign * BACKWARD_PAWN_PENALTY[0]
+                        eg_score -= sign * BACKWARD_PAWN_PENALTY[1]
+                
+                # Tốt thông: không có tốt đối phương chặn phía trước trên cột đó và hai cột bên cạnh
+                passed = True
+                for c in [col] + neighbour_cols:
+                    if any((r - row) * forward > 0 for r in enemy[c]):
+                        passed = False
+                        break
+                if passed:
+                    advance = 7 - row if color == 'white' else row
+                    mg_score += sign * PASSED_PAWN_BONUS_MG[advance]
+                    eg_score += sign * PASSED_PAWN_BONUS_EG[advance]
+    
+    return mg_score, eg_score
+
+def evaluate_activity(game_state, attack_map):
+    """
+    Đánh giá độ linh động và an toàn vua từ bản đồ tấn công đã tính.
+    Trả về cặp (trung cuộc, tàn cuộc), dương có lợi cho trắng.
+    """
+    board = game_state['board']
+    mg_score = 0
+    eg_score = 0
+    for color, sign in (('white', 1), ('black', -1)):
+        # Độ linh động của từng quân
+        for pos, count in attack_map[color]['mobility'].items():
+            piece_type = board[pos][0]
+            mg_weight, eg_weight = MOBILITY_WEIGHTS[piece_type]
+            delta = count - MOBILITY_BASELINE[piece_type]
+            mg_score += sign * mg_weight * delta
+            eg_score += sign * eg_weight * delta
+        
+        # Số đòn tấn công của đối phương vào vùng quanh vua
+        king_row, king_col = game_state[f'{color}_king_pos']
+        enemy_attacks = attack_map['black' if color == 'white' else 'white']['attacks']
+        king_zone_attacks = 0
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                king_zone_attacks += enemy_attacks.get((king_row + d_row, king_col + d_col), 0)
+        mg_score -= sign * KING_ZONE_ATTACK_PENALTY[0] * king_zone_attacks
+        eg_score -= sign * KING_ZONE_ATTACK_PENALTY[1] * king_zone_attacks
+    
+    return mg_score, eg_score
+
+def probe_pawn_structure(board, pawn_key):
+    """Lấy điểm cấu trúc tốt từ bảng băm tốt, tính và lưu lại nếu chưa có"""
+    search_stats['pawn_hash_probes'] += 1
+    pawn_hash_table = active_caches.pawn_hash
+    index = pawn_key & (PAWN_HASH_SIZE - 1)
+    entry = pawn_hash_table[index]
+    if entry is not None and entry[0] == pawn_key:
+        search_stats['pawn_hash_hits'] += 1
+        return entry[1]
+    
+    score = evaluate_pawn_structure(board)
+    pawn_hash_table[index] = (pawn_key, score)
+    return score
+
+# Ngân sách bộ nhớ (byte) cho các cache, có thể đổi bằng configure_caches
+EVAL_CACHE_BYTES = 8 * 1024 * 1024
+MOVES_CACHE_BYTES = 16 * 1024 * 1024
+TT_BYTES = 32 * 1024 * 1024
+NOISY_TT_BYTES = 8 * 1024 * 1024
+
+# Kích thước ước tính của một nước đi (start, end) trong danh sách nước đi
+MOVE_ENTRY_BYTES = 120
+
+def _moves_sizeof(moves):
+    return sys.getsizeof(moves) + len(moves) * MOVE_ENTRY_BYTES
+
+TT_EXACT = 0
+TT_LOWER = 1  # Điểm thật >= điểm lưu (cắt tỉa beta)
+TT_UPPER = 2  # Điểm thật <= điểm lưu (cắt tỉa alpha)
+
+class SearchCaches:
+    """
+    Bộ cache của một engine. Mỗi engine trong cùng tiến trình (ví dụ hai bên của một trận
+    tự đấu) dùng một bộ riêng, truyền vào find_best_move, để không dùng chung kết quả.
+    """
+
+    def __init__(self, eval_bytes=EVAL_CACHE_BYTES, moves_bytes=MOVES_CACHE_BYTES, tt_bytes=TT_BYTES):
+        # Kết quả đánh giá trạng thái bàn cờ (khóa Zobrist -> điểm)
+        self.evaluation = LRUCache(eval_bytes)
+        # Các nước đi hợp lệ (khóa Zobrist kèm màu -> danh sách nước đi)
+        self.valid_moves = LRUCache(moves_bytes, _moves_sizeof)
+        # Bảng chuyển vị: khóa Zobrist -> (độ sâu, điểm, loại cận, nước đi tốt nhất)
+        self.transposition = LRUCache(tt_bytes)
+        # Bảng chuyển vị riêng cho từng biên độ nhiễu (biên độ -> bảng): điểm có nhiễu
+        # không được lẫn vào bảng chính hay vào bảng của mức độ khó khác
+        self.noisy_tables = {}
+        # Bảng băm cấu trúc tốt: chỉ số -> (khóa tốt, (trung cuộc, tàn cuộc))
+        self.pawn_hash = [None] * PAWN_HASH_SIZE
+
+    def transposition_for_noise(self, noise=0):
+        """Bảng chuyển vị dùng cho lần tìm kiếm với biên độ nhiễu noise"""
+        if not noise:
+            return self.transposition
+        table = self.noisy_tables.get(noise)
+        if table is None:
+            table = self.noisy_tables[noise] = LRUCache(NOISY_TT_BYTES)
+        return table
+
+    def resize(self, eval_bytes=None, moves_bytes=None, tt_bytes=None):
+        """Đặt lại ngân sách bộ nhớ (byte) của các cache"""
+        if eval_bytes is not None:
+            self.evaluation.resize(eval_bytes)
+        if moves_bytes is not None:
+            self.valid_moves.resize(moves_bytes)
+        if tt_bytes is not None:
+            self.transposition.resize(tt_bytes)
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        self.evaluation.clear()
+        self.valid_moves.clear()
+        self.transposition.clear()
+        self.noisy_tables.clear()
+        for index in range(PAWN_HASH_SIZE):
+            self.pawn_hash[index] = None
+
+    def stats(self):
+        """Thống kê của các cache, cộng dồn từ lần clear gần nhất"""
+        return {
+            'evaluation': self.evaluation.stats(),
+            'valid_moves': self.valid_moves.stats(),
+            'transposition': self.transposition.stats()
+        }
+
+# Bộ cache mặc định của tiến trình, và bộ cache của lần tìm kiếm đang chạy
+default_caches = SearchCaches()
+active_caches = default_caches
+
+def configure_caches(eval_bytes=None, moves_bytes=None, tt_bytes=None):
+    """Đặt lại ngân sách bộ nhớ (byte) của bộ cache mặc định"""
+    default_caches.resize(eval_bytes, moves_bytes, tt_bytes)
 
-# Cache lưu trữ các nước đi hợp lệ
-valid_moves_cache = {}
+def reset_caches():
+    """Xóa bộ cache mặc định khi bắt đầu ván mới (giữa các nước của cùng một ván thì giữ lại)"""
+    default_caches.clear()
 
-def get_board_key(board):
-    """Tạo khóa duy nhất cho bàn cờ để dùng trong cache"""
-    pieces = []
-    for pos, piece in sorted(board.items()):
-        pieces.append(f"{pos}:{piece[0]}{piece[1][0]}")
-    return ":".join(pieces)
+def get_cache_stats():
+    """Thống kê của bộ cache mặc định, cộng dồn từ lần reset_caches gần nhất"""
+    return default_caches.stats()
 
-def get_state_key(game_state):
-    """Tạo khóa duy nhất cho trạng thái để dùng trong cache"""
-    board_key = get_board_key(game_state['board'])
-    castling = "-".join([f"{k}:{v}" for k, v in sorted(game_state['castling_rights'].items())])
-    en_passant = str(game_state['en_passant_target'])
-    turn = game_state['turn']
-    return f"{board_key}|{turn}|{castling}|{en_passant}"
+def get_state_hash(game_state):
+    """Khóa Zobrist của trạng thái (tính lại nếu trạng thái chưa có)"""
+    key = game_state.get('hash')
+    if key is None:
+        key = compute_hash(game_state)
+    return key
 
-def evaluate_board(board, game_state):
+def evaluate_board(board, game_state, alpha=None, beta=None):
     """
     Đánh giá trạng thái bàn cờ.
     Giá trị dương có lợi cho bên trắng, giá trị âm có lợi cho bên đen.
+    Nếu truyền alpha/beta, có thể trả về sớm giá trị xấp xỉ (vẫn nằm ngoài cửa sổ)
+    khi điểm vật chất đã quá xa cửa sổ.
     """
+    search_stats['evaluations'] += 1
+    
     # Kiểm tra cache trước
-    board_key = get_board_key(board)
-    if board_key in evaluation_cache:
-        return evaluation_cache[board_key]
+    state_hash = get_state_hash(game_state)
+    cached = active_caches.evaluation.get(state_hash)
+    if cached is not None:
+        search_stats['eval_cache_hits'] += 1
+        return cached
         
     if not board:  # Bảo vệ trường hợp bàn cờ rỗng (không nên xảy ra)
         return 0
-        
-    # Kiểm tra chiếu hết
-    if is_checkmate(board, game_state, 'white'):
-        return -10000  # Đen thắng
-    if is_checkmate(board, game_state, 'black'):
-        return 10000  # Trắng thắng
     
-    total_eval = 0
+    # Giá trị quân + vị trí: mỗi quân chỉ cần tra hai bảng đã tính sẵn
+    mg_score = 0
+    eg_score = 0
+    for (row, col), piece in board.items():
+        sq = row * 8 + col
+        mg_score += MG_TABLES[piece][sq]
+        eg_score += EG_TABLES[piece][sq]
     
-    # Số quân trên bàn cờ
-    white_material = 0
-    black_material = 0
+    # Cấu trúc tốt, dùng chung cho mọi thế cờ có cùng khung tốt
+    pawn_key = game_state.get('pawn_key')
+    if pawn_key is None:
+        pawn_key = compute_pawn_key(board)
+    pawn_mg, pawn_eg = probe_pawn_structure(board, pawn_key)
+    mg_score += pawn_mg
+    eg_score += pawn_eg
     
-    for pos, piece in board.items():
-        row, col = pos
-        piece_type, color = piece
-        piece_value = PIECE_VALUES[piece_type]
-        
-        # Thêm giá trị vị trí
-        position_value = 0
-        if piece_type == 'P':
-            # Đảo ngược bảng giá trị cho quân đen
-            if color == 'white':
-                position_value = PAWN_POSITION_VALUE[row][col]
-            else:
-                position_value = PAWN_POSITION_VALUE[7-row][col]
-        elif piece_type == 'N':
-            # Đảo ngược bảng giá trị cho quân đen
-            if color == 'white':
-                position_value = KNIGHT_POSITION_VALUE[row][col]
-            else:
-                position_value = KNIGHT_POSITION_VALUE[7-row][col]
-        
-        # Tổng giá trị = giá trị cơ bản + giá trị vị trí
-        piece_total_value = piece_value + position_value * 0.1
-        
-        # Cập nhật tổng giá trị quân
-        if color == 'white':
-            white_material += piece_value
-            total_eval += piece_total_value
-        else:
-            black_material += piece_value
-            total_eval -= piece_total_value
+    # Trộn trung cuộc/tàn cuộc theo giai đoạn ván cờ (được cập nhật dần trong game_state)
+    phase = game_state.get('phase')
+    if phase is None:
+        phase = get_game_phase(board)
+    phase = min(phase, MAX_PHASE)
+    total_eval = (mg_score * phase + eg_score * (MAX_PHASE - phase)) // MAX_PHASE
+    
+    # Đánh giá lười: bỏ qua bản đồ tấn công khi điểm đã quá xa cửa sổ alpha-beta.
+    # Chỉ áp dụng khi bên đi không bị chiếu (không thể là chiếu hết, không có điểm chiếu)
+    if alpha is not None and (total_eval + LAZY_EVAL_MARGIN <= alpha or total_eval - LAZY_EVAL_MARGIN >= beta):
+        turn = game_state['turn']
+        opponent = 'black' if turn == 'white' else 'white'
+        if not is_king_in_check_simple(board, game_state[f'{turn}_king_pos'], opponent):
+            search_stats['lazy_exits'] += 1
+            return total_eval
+    
+    # Bản đồ tấn công của cả hai bên, dùng cho chiếu, độ linh động và an toàn vua
+    attack_map = get_attack_map(board)
+    white_in_check = game_state['white_king_pos'] in attack_map['black']['attacks']
+    black_in_check = game_state['black_king_pos'] in attack_map['white']['attacks']
     
-    # Bổ sung: Thưởng cho giai đoạn tàn cuộc khi có lợi thế vật chất
-    # Khuyến khích AI trao đổi quân khi đang có lợi thế
-    if white_material > black_material and white_material < 30:
-        total_eval += (30 - black_material) * 0.5
-    elif black_material > white_material and black_material < 30:
-        total_eval -= (30 - white_material) * 0.5
+    # Kiểm tra chiếu hết (chỉ khi đang bị chiếu)
+    if white_in_check and is_checkmate(board, game_state, 'white'):
+        return -MATE_SCORE  # Đen thắng
+    if black_in_check and is_checkmate(board, game_state, 'black'):
+        return MATE_SCORE  # Trắng thắng
+    
+    # Độ linh động và an toàn vua, giới hạn trong biên đánh giá lười
+    activity_mg, activity_eg = evaluate_activity(game_state, attack_map)
+    activity = (activity_mg * phase + activity_eg * (MAX_PHASE - phase)) // MAX_PHASE
+    total_eval += max(-LAZY_EVAL_MARGIN, min(LAZY_EVAL_MARGIN, activity))
     
     # Kiểm tra chiếu
-    if is_check(board, game_state, 'white'):
-        total_eval -= 50  # Trừ điểm nếu trắng bị chiếu
-    if is_check(board, game_state, 'black'):
-        total_eval += 50  # Cộng điểm nếu đen bị chiếu
+    if white_in_check:
+        total_eval -= CHECK_BONUS  # Trừ điểm nếu trắng bị chiếu
+    if black_in_check:
+        total_eval += CHECK_BONUS  # Cộng điểm nếu đen bị chiếu
     
     # Lưu kết quả vào cache
-    evaluation_cache[board_key] = total_eval
+    active_caches.evaluation.put(state_hash, total_eval)
     
     return total_eval
 
+def probe_tablebase_score(game_state):
+    """Điểm chính xác (theo bên trắng) từ bảng tàn cuộc, hoặc None nếu thế cờ không có trong bảng"""
+    if len(game_state['board']) > TABLEBASE_MAX_PIECES:
+        return None
+    result = probe_position(game_state)
+    if result is None:
+        return None
+    
+    outcome, plies = result
+    if outcome == 'draw':
+        return 0
+    score = TABLEBASE_WIN_SCORE - plies
+    if outcome == 'loss':
+        score = -score
+    return score if game_state['turn'] == 'white' else -score
+
+def find_tablebase_move(game_state):
+    """
+    Chọn nước đi tốt nhất theo bảng tàn cuộc: thắng nhanh nhất, hoặc thua chậm nhất.
+    Trả về None nếu có thế cờ con không tra được.
+    """
+    if len(game_state['board']) > TABLEBASE_MAX_PIECES or probe_position(game_state) is None:
+        return None
+    
+    color = game_state['turn']
+    sign = 1 if color == 'white' else -1
+    best_move = None
+    best_score = None
+    for start, end in get_all_valid_moves(game_state['board'], game_state, color):
+        new_state = make_hypothetical_move(game_state, start, end)
+        score = probe_tablebase_score(new_state)
+        if score is None:
+            return None
+        if best_score is None or score * sign > best_score:
+            best_score = score * sign
+            best_move = (start, end)
+    return best_move
+
 def get_all_valid_moves(board, game_state, color):
     """Lấy tất cả các nước đi hợp lệ cho một bên"""
     # Kiểm tra cache trước
-    state_key = get_state_key(game_state) + f"|{color}"
-    if state_key in valid_moves_cache:
-        return valid_moves_cache[state_key]
+    state_key = get_state_hash(game_state) << 1 | (color == 'black')
+    cached = active_caches.valid_moves.get(state_key)
+    if cached is not None:
+        return cached
     
     moves = []
     for pos, piece in board.items():
@@ -152,22 +555,146 @@ def get_all_valid_moves(board, game_state, color):
                 moves.append((pos, move))
     
     # Lưu vào cache
-    valid_moves_cache[state_key] = moves
+    active_caches.valid_moves.put(state_key, moves)
     
     return moves
 
+# Mức độ khó theo ngân sách số nút thay vì thời gian, để sức mạnh và chi phí CPU mỗi nước
+# không phụ thuộc vào máy: nodes = số nút tối đa, max_depth = độ sâu tối đa,
+# noise = biên độ nhiễu (centipawn) cộng vào đánh giá ở nút lá
+DIFFICULTY_PROFILES = {
+    2: {'nodes': 1000, 'max_depth': 2, 'noise': 40},  # Dễ
+    3: {'nodes': 5000, 'max_depth': 4, 'noise': 10},  # Trung bình
+    4: {'nodes': 15000, 'max_depth': 5, 'noise': 0}  # Khó
+}
+
+# Giới hạn của lần tìm kiếm hiện tại: số nút tối đa (theo search_stats['nodes']) và biên độ nhiễu
+search_limits = {
+    'node_limit': None,
+    'noise': 0,
+    'tablebase': True,  # Có tra bảng tàn cuộc trong cây tìm kiếm hay không
+    'stop': False,  # Yêu cầu dừng từ luồng khác (UCI stop); người gọi đặt lại False trước lần tìm kiếm mới
+    'on_iteration': None,  # Hàm được gọi với kết quả của mỗi độ sâu (UCI info)
+    'table': default_caches.transposition  # Bảng chuyển vị của lần tìm kiếm hiện tại (theo biên độ nhiễu)
+}
+
+def stop_search():
+    """Yêu cầu lần tìm kiếm đang chạy (ở luồng khác) dừng lại càng sớm càng tốt"""
+    search_limits['stop'] = True
+
+def budget_exhausted(max_time, start_time, fraction=1.0):
+    """Hết thời gian (theo tỉ lệ fraction của max_time), hết ngân sách số nút hoặc có yêu cầu dừng"""
+    if search_limits['stop']:
+        return True
+    node_limit = search_limits['node_limit']
+    if node_limit is not None and search_stats['nodes'] >= node_limit:
+        return True
+    return time.time() - start_time > max_time * fraction
+
+def evaluation_noise(key):
+    """Nhiễu xác định theo khóa thế cờ, trong khoảng [-noise, noise]"""
+    noise = search_limits['noise']
+    if not noise or key is None:
+        return 0
+    mixed = (key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    return (mixed >> 32) % (2 * noise + 1) - noise
+
+# Khóa Zobrist của các thế cờ từ gốc tìm kiếm đến nút đang xét (không gồm chính nút đó)
+search_path = []
+
+# Các thế cờ đã xuất hiện trong ván đấu từ sau nước không thể đảo ngược gần nhất (khóa -> số lần)
+game_positions = {}
+
+def is_search_draw(game_state):
+    """
+    Hòa do lặp lại thế cờ (so với đường tìm kiếm và lịch sử ván đấu), do luật 50 nước
+    hoặc do không đủ quân để chiếu hết.
+    Chỉ cần so với các thế cờ từ sau nước đi tốt/bắt quân gần nhất, cùng bên đi.
+    """
+    if game_state.get('material_key') in INSUFFICIENT_MATERIAL_KEYS:
+        return True
+    
+    halfmove_clock = game_state.get('halfmove_clock')
+    key = game_state.get('hash')
+    if halfmove_clock is None or key is None:
+        return False
+    if halfmove_clock >= 100:
+        return True
+    if key in game_positions:
+        return True
+    
+    depth = min(halfmove_clock, len(search_path))
+    for back in range(2, depth + 1, 2):
+        if search_path[-back] == key:
+            return True
+    return False
+
+def forced_win_from_root(value, ply):
+    """Đổi điểm thắng bắt buộc tại nút cách gốc ply nửa nước thành điểm nhìn từ gốc (ply âm: chiều ngược lại)"""
+    if value > FORCED_WIN_BOUND:
+        return value - ply
+    if value < -FORCED_WIN_BOUND:
+        return value + ply
+    return value
+
+def mate_distance(value):
+    """
+    Số nửa nước tới chiếu hết của một điểm tại gốc (dương: trắng thắng, âm: đen thắng),
+    hoặc None nếu điểm không phải thắng bắt buộc
+    """
+    if abs(value) <= FORCED_WIN_BOUND:
+        return None
+    base = MATE_SCORE if abs(value) > (MATE_SCORE + TABLEBASE_WIN_SCORE) // 2 else TABLEBASE_WIN_SCORE
+    plies = base - abs(value)
+    return plies if value > 0 else -plies
+
 def minimax_alpha_beta(game_state, depth, alpha, beta, maximizing_player, max_time, start_time):
     """
     Thuật toán Minimax với cắt tỉa Alpha-Beta và giới hạn thời gian
     """
-    # Kiểm tra thời gian
-    if time.time() - start_time > max_time:
-        # Nếu đã vượt quá thời gian, trả về giá trị hiện tại
-        return evaluate_board(game_state['board'], game_state)
+    search_stats['nodes'] += 1
+    # Số nửa nước từ gốc tới nút này
+    ply = len(search_path)
+    
+    # Bảng tàn cuộc cho kết quả chính xác, không cần tìm kiếm tiếp
+    tablebase_score = probe_tablebase_score(game_state) if search_limits['tablebase'] else None
+    if tablebase_score is not None:
+        search_stats['tablebase_hits'] += 1
+        return forced_win_from_root(tablebase_score, ply)
+    
+    # Lặp lại thế cờ hoặc luật 50 nước: hòa, không cần tìm kiếm tiếp
+    if is_search_draw(game_state):
+        search_stats['repetitions'] += 1
+        return 0
+    
+    # Kiểm tra thời gian và ngân sách số nút
+    if budget_exhausted(max_time, start_time):
+        # Nếu đã vượt quá giới hạn, trả về giá trị hiện tại
+        return forced_win_from_root(evaluate_board(game_state['board'], game_state), ply)
     
     # Trường hợp cơ bản: đạt độ sâu 0 hoặc kết thúc ván đấu
     if depth == 0:
-        return evaluate_board(game_state['board'], game_state)
+        value = evaluate_board(game_state['board'], game_state, alpha, beta)
+        if abs(value) < TABLEBASE_WIN_SCORE:
+            value += evaluation_noise(game_state.get('hash'))
+        return forced_win_from_root(value, ply)
+    
+    # Tra bảng chuyển vị: dùng lại kết quả đủ sâu, hoặc ít nhất là nước đi tốt nhất đã biết
+    key = game_state.get('hash')
+    tt_move = None
+    if key is not None:
+        search_stats['tt_probes'] += 1
+        entry = search_limits['table'].get(key)
+        if entry is not None:
+            entry_depth, entry_value, entry_flag, tt_move = entry
+            # Bảng lưu điểm thắng bắt buộc tính từ nút, không phụ thuộc vào đường đi tới nút
+            entry_value = forced_win_from_root(entry_value, ply)
+            if entry_depth >= depth:
+                if (entry_flag == TT_EXACT
+                        or (entry_flag == TT_LOWER and entry_value >= beta)
+                        or (entry_flag == TT_UPPER and entry_value <= alpha)):
+                    search_stats['tt_hits'] += 1
+                    return entry_value
     
     board = game_state['board']
     current_color = 'white' if maximizing_player else 'black'
@@ -178,35 +705,56 @@ def minimax_alpha_beta(game_state, depth, alpha, beta, maximizing_player, max_ti
     # Nếu không có nước đi nào, có thể là chiếu hết hoặc hòa cờ
     if not possible_moves:
         # Kiểm tra trong hàm đánh giá
-        return evaluate_board(game_state['board'], game_state)
+        return forced_win_from_root(evaluate_board(game_state['board'], game_state), ply)
     
-    # Sắp xếp nước đi để tối ưu cắt tỉa
+    # Sắp xếp nước đi để tối ưu cắt tỉa, nước đi từ bảng chuyển vị được xét đầu tiên
     possible_moves = order_moves(game_state, possible_moves)
+    if tt_move in possible_moves:
+        possible_moves.remove(tt_move)
+        possible_moves.insert(0, tt_move)
     
+    alpha_orig, beta_orig = alpha, beta
+    best_move = None
+    search_path.append(key)
     if maximizing_player:
-        max_eval = float('-inf')
+        best_value = float('-inf')
         for start, end in possible_moves:
             # Thực hiện nước đi thử nghiệm
             new_state = make_hypothetical_move(game_state, start, end)
             # Đệ quy Minimax với độ sâu giảm 1
             eval = minimax_alpha_beta(new_state, depth - 1, alpha, beta, False, max_time, start_time)
-            max_eval = max(max_eval, eval)
+            if eval > best_value:
+                best_value = eval
+                best_move = (start, end)
             alpha = max(alpha, eval)
             if beta <= alpha:
                 break  # Cắt tỉa Beta
-        return max_eval
     else:
-        min_eval = float('inf')
+        best_value = float('inf')
         for start, end in possible_moves:
             # Thực hiện nước đi thử nghiệm
             new_state = make_hypothetical_move(game_state, start, end)
             # Đệ quy Minimax với độ sâu giảm 1
             eval = minimax_alpha_beta(new_state, depth - 1, alpha, beta, True, max_time, start_time)
-            min_eval = min(min_eval, eval)
+            if eval < best_value:
+                best_value = eval
+                best_move = (start, end)
             beta = min(beta, eval)
             if beta <= alpha:
                 break  # Cắt tỉa Alpha
-        return min_eval
+    search_path.pop()
+    
+    # Không lưu kết quả của lần tìm kiếm bị cắt ngang vì hết thời gian
+    if key is not None and not budget_exhausted(max_time, start_time):
+        if best_value <= alpha_orig:
+            flag = TT_UPPER
+        elif best_value >= beta_orig:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        search_limits['table'].put(key, (depth, forced_win_from_root(best_value, -ply), flag, best_move))
+    
+    return best_value
 
 def order_moves(game_state, moves):
     """
@@ -246,51 +794,54 @@ def order_moves(game_state, moves):
     move_scores.sort(reverse=True, key=lambda x: x[0])
     return [move for _, move in move_scores]
 
-def find_best_move(game_state, depth=3):
-    """
-    Tìm nước đi tốt nhất cho AI sử dụng Minimax với cắt tỉa Alpha-Beta
-    """
-    # Xóa cache khi bắt đầu tính toán mới
-    if len(evaluation_cache) > 10000:
-        evaluation_cache.clear()
-    if len(valid_moves_cache) > 10000:
-        valid_moves_cache.clear()
-    
-    # Thiết lập thời gian tối đa cho mỗi nước đi dựa vào độ khó
+def get_max_time(depth):
+    """Thời gian tối đa cho mỗi nước đi dựa vào độ khó"""
     max_time = 1.0  # 1 giây cho độ khó dễ
     if depth == 3:
         max_time = 2.0  # 2 giây cho độ khó trung bình
     elif depth == 4:
         max_time = 3.0  # 3 giây cho độ khó khó
-    
-    start_time = time.time()
+    return max_time
+
+def search_root(game_state, depth, max_time, start_time, excluded=(), max_nodes=None, noise=0, use_tablebase=True):
+    """
+    Tìm kiếm tại gốc bằng Iterative Deepening, bỏ qua các nước đi trong excluded.
+    max_nodes giới hạn số nút của lần tìm kiếm, noise là biên độ nhiễu đánh giá.
+    Trả về (nước đi tốt nhất, điểm theo bên trắng), hoặc (None, None) nếu không còn nước đi.
+    """
+    search_limits['node_limit'] = search_stats['nodes'] + max_nodes if max_nodes is not None else None
+    search_limits['noise'] = noise
+    search_limits['table'] = active_caches.transposition_for_noise(noise)
+    search_limits['tablebase'] = use_tablebase
     
     board = game_state['board']
     current_color = game_state['turn']
     maximizing_player = (current_color == 'white')
     
-    best_move = None
-    alpha = float('-inf')
-    beta = float('inf')
-    
-    if maximizing_player:
-        best_value = float('-inf')
-    else:
-        best_value = float('inf')
-    
     # Tìm tất cả các nước đi hợp lệ
-    possible_moves = get_all_valid_moves(board, game_state, current_color)
+    possible_moves = [move for move in get_all_valid_moves(board, game_state, current_color) if move not in excluded]
+    if not possible_moves:
+        return None, None
     
     # Sắp xếp nước đi để tối ưu cắt tỉa
     possible_moves = order_moves(game_state, possible_moves)
     
-    # Thử Iterative Deepening - tăng dần độ sâu
-    current_depth = 1
-    iterative_best_move = None
+    # Đường tìm kiếm bắt đầu tại thế cờ gốc; các thế cờ trước đó của ván lấy từ position_history
+    search_path[:] = [game_state.get('hash')]
+    game_positions.clear()
+    game_positions.update(game_state.get('position_history') or {})
+    
+    best_move = None
+    best_value = None
     
-    while current_depth <= depth and time.time() - start_time < max_time * 0.8:
+    # Iterative Deepening - tăng dần độ sâu
+    current_depth = 1
+    while current_depth <= depth and not budget_exhausted(max_time, start_time, 0.8):
+        alpha = float('-inf')
+        beta = float('inf')
         temp_best_value = float('-inf') if maximizing_player else float('inf')
         temp_best_move = None
+        complete = False
         
         # Đánh giá từng nước đi
         for start, end in possible_moves:
@@ -298,6 +849,9 @@ def find_best_move(game_state, depth=3):
             new_state = make_hypothetical_move(game_state, start, end)
             # Tính giá trị bằng Minimax với Alpha-Beta
             value = minimax_alpha_beta(new_state, current_depth - 1, alpha, beta, not maximizing_player, max_time, start_time)
+            # Hết ngân sách giữa chừng: giá trị của nước này chưa được tìm kiếm trọn vẹn, bỏ đi
+            if budget_exhausted(max_time, start_time):
+                break
             
             # Cập nhật nước đi tốt nhất
             if maximizing_player and value > temp_best_value:
@@ -308,46 +862,167 @@ def find_best_move(game_state, depth=3):
                 temp_best_value = value
                 temp_best_move = (start, end)
                 beta = min(beta, temp_best_value)
-                
-            # Kiểm tra thời gian sau mỗi nước đi
-            if time.time() - start_time > max_time * 0.9:
+            
+            # Kiểm tra thời gian và số nút sau mỗi nước đi
+            if budget_exhausted(max_time, start_time, 0.9):
                 break
+        else:
+            # Độ sâu này được tìm kiếm trọn vẹn, không bị cắt ngang vì hết thời gian hoặc số nút
+            if not budget_exhausted(max_time, start_time):
+                search_stats['depth'] = current_depth
+                complete = True
         
-        # Lưu kết quả của độ sâu hiện tại
+        # Lưu kết quả của độ sâu hiện tại, nước tốt nhất được xét đầu tiên ở độ sâu sau.
+        # Lần lặp bị cắt ngang chỉ được dùng khi nước đầu tiên (biến chính của độ sâu trước)
+        # đã được tìm kiếm trọn vẹn, tức là khi temp_best_move có giá trị
         if temp_best_move:
-            iterative_best_move = temp_best_move
+            best_move = temp_best_move
             best_value = temp_best_value
+            possible_moves.remove(best_move)
+            possible_moves.insert(0, best_move)
+            search_iterations.append({
+                'depth': current_depth,
+                'move': best_move,
+                'score': best_value,
+                'complete': complete,
+                'nodes': search_stats['nodes'],
+                'time': time.time() - start_time
+            })
+            if search_limits['on_iteration']:
+                search_limits['on_iteration'](search_iterations[-1])
         
         # Tăng độ sâu cho lần lặp tiếp theo
         current_depth += 1
-        
-        # Nếu gần hết thời gian, thoát vòng lặp
-        if time.time() - start_time > max_time * 0.8:
+    
+    # Nếu không tìm được nước đi (hiếm khi xảy ra), chọn nước đầu tiên
+    if best_move is None:
+        best_move = possible_moves[0]
+    
+    return best_move, best_value
+
+def get_principal_variation(game_state, first_move, max_length):
+    """
+    Dựng biến chính bắt đầu từ first_move bằng cách đi theo nước tốt nhất lưu trong
+    bảng chuyển vị của lần tìm kiếm gần nhất
+    """
+    table = search_limits['table']
+    pv = [first_move]
+    state = make_hypothetical_move(game_state, *first_move)
+    seen = {state.get('hash')}
+    while len(pv) < max_length:
+        entry = table.get(state.get('hash'))
+        if entry is None or entry[3] is None:
+            break
+        move = entry[3]
+        # Kiểm tra lại tính hợp lệ để tránh trùng khóa
+        if move not in get_all_valid_moves(state['board'], state, state['turn']):
             break
+        pv.append(move)
+        state = make_hypothetical_move(state, *move)
+        # Dừng khi biến chính lặp lại thế cờ
+        if state.get('hash') in seen:
+            break
+        seen.add(state.get('hash'))
+    return pv
+
+@contextmanager
+def use_caches(caches=None):
+    """Dùng bộ cache caches (None: bộ mặc định) trong khối with, sau đó trả lại bộ cache trước đó"""
+    global active_caches
+    previous = active_caches
+    active_caches = caches if caches is not None else default_caches
+    try:
+        yield active_caches
+    finally:
+        active_caches = previous
+
+def find_best_move(game_state, depth=3, profile=None, caches=None):
+    """
+    Tìm nước đi tốt nhất cho AI sử dụng Minimax với cắt tỉa Alpha-Beta.
+    depth là độ khó; nếu có hồ sơ trong DIFFICULTY_PROFILES (hoặc truyền profile),
+    tìm kiếm bị giới hạn theo số nút thay vì thời gian ('nodes': None là không giới hạn).
+    Hồ sơ có thể tắt sách khai cuộc, bảng tàn cuộc và tệp kinh nghiệm bằng
+    'book', 'tablebase', 'experience' = False (ví dụ khi đo hiệu năng),
+    và giới hạn thêm thời gian tìm kiếm bằng 'time' (giây).
+    caches là bộ SearchCaches riêng của engine (None: bộ cache mặc định của tiến trình).
+    """
+    with use_caches(caches):
+        return _find_best_move(game_state, depth, profile)
+
+def _find_best_move(game_state, depth, profile):
+    if profile is None:
+        profile = DIFFICULTY_PROFILES.get(depth)
+    search_depth = profile['max_depth'] if profile else depth
+    options = profile or {}
+    use_tablebase = options.get('tablebase', True)
+    use_experience = options.get('experience', True)
+    # Sức mạnh của hồ sơ giới hạn số nút hoặc có nhiễu do chính giới hạn đó quyết định:
+    # không dùng lại nước đi đã được tìm kiếm sâu hơn bởi hồ sơ khác
+    probe_stored = use_experience and options.get('nodes') is None and not options.get('noise')
     
-    # Nếu đã tìm được nước đi tốt nhất trong Iterative Deepening
-    if iterative_best_move:
-        return iterative_best_move
+    reset_search_stats()
     
-    # Nếu không có kết quả từ Iterative Deepening (hiếm khi xảy ra), thì xử lý như trước
-    for start, end in possible_moves:
-        # Thực hiện nước đi thử nghiệm
-        new_state = make_hypothetical_move(game_state, start, end)
-        # Tính giá trị bằng Minimax với Alpha-Beta
-        value = minimax_alpha_beta(new_state, depth - 1, alpha, beta, not maximizing_player, max_time, start_time)
-        
-        # Cập nhật nước đi tốt nhất
-        if maximizing_player and value > best_value:
-            best_value = value
-            best_move = (start, end)
-            alpha = max(alpha, best_value)
-        elif not maximizing_player and value < best_value:
-            best_value = value
-            best_move = (start, end)
-            beta = min(beta, best_value)
+    # Tra sách khai cuộc trước: nước đi lý thuyết không cần tìm kiếm
+    book_move = probe_book(game_state, depth) if options.get('book', True) else None
+    if book_move:
+        start, end, promotion = book_move
+        # Nước đi trả về không mang quân phong cấp (người gọi phong hậu): bỏ qua nước phong cấp non
+        if promotion in (None, 'Q'):
+            return start, end
     
-    # Nếu không tìm được nước đi (hiếm khi xảy ra), chọn nước đầu tiên
-    if not best_move and possible_moves:
-        best_move = possible_moves[0]
+    # Tàn cuộc ít quân: chơi hoàn hảo theo bảng tàn cuộc
+    tablebase_move = find_tablebase_move(game_state) if use_tablebase else None
+    if tablebase_move:
+        return tablebase_move
+    
+    # Kinh nghiệm từ các lần chạy trước: dùng lại kết quả đã tìm kiếm đủ sâu
+    experience_move = probe_experience(game_state, search_depth) if probe_stored else None
+    if experience_move:
+        return experience_move
     
-    return best_move
\ No newline at end of file
+    # Các cache được giữ lại giữa các nước đi; LRU tự loại bỏ mục cũ khi vượt ngân sách bộ nhớ
+    if profile:
+        best_move, best_value = search_root(game_state, search_depth, profile.get('time') or float('inf'), time.time(),
+                                            max_nodes=profile.get('nodes'), noise=profile.get('noise', 0),
+                                            use_tablebase=use_tablebase)
+    else:
+        best_move, best_value = search_root(game_state, depth, get_max_time(depth), time.time())
+    
+    # Ghi lại kết quả để lần sau không phải tìm kiếm lại (trừ kết quả có nhiễu),
+    # chỉ với lần lặp cuối cùng đã tìm kiếm trọn vẹn
+    finished = [iteration for iteration in search_iterations if iteration['complete']]
+    if finished and use_experience and not options.get('noise'):
+        record_experience(game_state, finished[-1]['depth'], finished[-1]['score'], finished[-1]['move'])
+    
+    return best_move
+
+def find_best_moves(game_state, depth=3, multipv=3, max_time=None, caches=None, max_nodes=None):
+    """
+    Chế độ phân tích nhiều biến (multi-PV): trả về tối đa multipv nước đi tốt nhất, xếp từ tốt đến kém
+    cho bên đang đi, dạng [{'move': (start, end), 'score': điểm theo bên trắng, 'pv': [(start, end), ...]}].
+    Mỗi lượt tìm kiếm bỏ qua các nước đã tìm được và dùng chung bảng chuyển vị,
+    nên các lượt sau rẻ hơn nhiều so với tìm kiếm độc lập.
+    max_time và max_nodes là giới hạn thời gian và số nút cho mỗi lượt (None: không giới hạn).
+    caches như ở find_best_move.
+    """
+    with use_caches(caches):
+        reset_search_stats()
+        
+        if max_time is None:
+            max_time = float('inf')
+        
+        results = []
+        excluded = set()
+        for _ in range(multipv):
+            move, score = search_root(game_state, depth, max_time, time.time(), excluded, max_nodes)
+            # Lượt bị dừng trước khi xong độ sâu 1 không có điểm; chỉ giữ lại nếu là lượt đầu
+            if move is None or (score is None and results):
+                break
+            excluded.add(move)
+            results.append({
+                'move': move,
+                'score': score,
+                'pv': get_principal_variation(game_state, move, depth)
+            })
+        
+        return results
@@ -0,0 +1,203 @@
+"""
+Bulk position analysis on warm worker engines
+
+analyze_positions() streams positions to long-lived worker processes and
+yields each result as soon as it is ready. Workers keep their caches between
+positions, and positions of the same game are always sent to the same
+worker, so transposition-table entries from one move help with the next.
+
+    for result in analyze_positions(fens, {'time': 0.5}, workers=8):
+        print(result['fen'], result['san'], result['score'])
+
+    python -m src.analysis games.pgn --nodes 20000 --workers 8 > analysis.jsonl
+    python -m src.analysis positions.epd --time 0.5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Process, Queue
+from src import ai
+from src.board import move_piece
+from src.epd import parse_epd
+from src.fen import parse_fen, to_fen
+from src.pgn import move_to_san, parse_san, read_games, square_name, start_state
+
+MAX_DEPTH = 64
+DEFAULT_TIME = 1.0
+# Số vị trí đang chờ trên mỗi tiến trình: đủ để tiến trình không phải đợi việc,
+# nhưng không đọc trước toàn bộ đầu vào
+PREFETCH = 4
+
+def search_profile(limits=None):
+    """
+    find_best_move profile from analysis limits {'time', 'nodes', 'depth', 'book'}.
+    Without any limit the search is limited to DEFAULT_TIME seconds.
+    """
+    limits = limits or {}
+    search_time = limits.get('time')
+    if search_time is None and limits.get('nodes') is None and limits.get('depth') is None:
+        search_time = DEFAULT_TIME
+    return {'nodes': limits.get('nodes'), 'time': search_time, 'max_depth': limits.get('depth') or MAX_DEPTH,
+            'noise': 0, 'book': limits.get('book', False), 'experience': False}
+
+def search_position(fen, profile):
+    """
+    Search one FEN with a find_best_move profile and return
+    {'move', 'san', 'score', 'pv', 'depth', 'nodes', 'time'} (move is None if the game is over).
+    Caches are kept between calls, so a long-lived process stays warm.
+    """
+    game_state = parse_fen(fen)
+    start = time.perf_counter()
+    move = ai.find_best_move(game_state, profile['max_depth'], profile)
+    elapsed = time.perf_counter() - start
+    stats = ai.get_search_stats()
+    # Nước đi từ sách khai cuộc hoặc bảng tàn cuộc không có điểm tìm kiếm
+    score = ai.search_iterations[-1]['score'] if ai.search_iterations else None
+    pv = ai.get_principal_variation(game_state, move, max(stats['depth'], 1)) if move else []
+    return {
+        'move': square_name(move[0]) + square_name(move[1]) if move else None,
+        'san': move_to_san(game_state, *move) if move else None,
+        'score': score,
+        'pv': [square_name(start) + square_name(end) for start, end in pv],
+        'depth': stats['depth'],
+        'nodes': stats['nodes'],
+        'time': elapsed
+    }
+
+def _normalize(item, index):
+    """Đưa đầu vào (chuỗi FEN hoặc dict có 'fen') về dict có 'id' và 'game'"""
+    if isinstance(item, str):
+        return {'id': index, 'fen': item, 'game': None}
+    return {'id': item.get('id', index), 'fen': item['fen'], 'game': item.get('game')}
+
+def _analyze(position, profile, worker=None):
+    try:
+        result = search_position(position['fen'], profile)
+    except Exception as error:
+        result = {'error': f"{type(error).__name__}: {error}"}
+    return dict(position, worker=worker, **result)
+
+def _worker_loop(index, tasks, results, profile):
+    """Vòng lặp của tiến trình con: phân tích cho tới khi nhận None"""
+    while True:
+        position = tasks.get()
+        if position is None:
+            break
+        results.put(_analyze(position, profile, index))
+
+def analyze_positions(positions, limits=None, workers=None, group_by_game=True):
+    """
+    Analyse an iterable of positions and yield a result dict for each as soon as it finishes
+    (so not in input order). Positions are FEN strings or dicts {'fen', 'id', 'game'};
+    results are the input dict plus search_position()'s fields, 'worker', or 'error'.
+    The input is consumed lazily. With group_by_game, positions sharing a 'game' value
+    always go to the same worker for cache locality; others go to the least busy worker.
+    workers=1 analyses in this process.
+    """
+    profile = search_profile(limits)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for index, item in enumerate(positions):
+            yield _analyze(_normalize(item, index), profile, 0)
+        return
+
+    results = Queue()
+    task_queues = [Queue() for _ in range(workers)]
+    processes = [Process(target=_worker_loop, args=(index, task_queues[index], results, profile), daemon=True)
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+    
+    outstanding = [0] * workers
+    game_workers = {}
+    source = enumerate(positions)
+    exhausted = False
+    try:
+        while True:
+            # Nạp thêm việc cho tới khi mỗi tiến trình có PREFETCH vị trí đang chờ
+            while not exhausted and sum(outstanding) < workers * PREFETCH:
+                try:
+                    index, item = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                position = _normalize(item, index)
+                game = position['game'] if group_by_game else None
+                if game is not None and game in game_workers:
+                    worker = game_workers[game]
+                else:
+                    worker = outstanding.index(min(outstanding))
+                    if game is not None:
+                        game_workers[game] = worker
+                task_queues[worker].put(position)
+                outstanding[worker] += 1
+            
+            if not any(outstanding):
+                break
+            result = results.get()
+            outstanding[result['worker']] -= 1
+            yield result
+    finally:
+        for task_queue in task_queues:
+            task_queue.put(None)
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+def read_positions(path, plies=None):
+    """
+    Positions to analyse from a file: every position of every game of a PGN file
+    (grouped by game), or one FEN/EPD per line of a text file ('-' for stdin).
+    """
+    if path.endswith('.pgn'):
+        for game_index, game in enumerate(read_games(path)):
+            game_state = start_state(game['headers'])
+            for ply, san in enumerate(game['moves'][:plies]):
+                yield {'id': f"{game_index}:{ply}", 'fen': to_fen(game_state), 'game': game_index}
+                try:
+                    start, end, promotion = parse_san(game_state, san)
+                except ValueError:
+                    break
+                game_state = move_piece(game_state, start, end, promotion or 'Q')
+        return
+
+    source = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line in source:
+            fields = line.split()
+            if not fields or line.startswith('#'):
+                continue
+            if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+                yield ' '.join(fields[:6])
+            else:
+                yield parse_epd(line)['fen']
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse many positions on a pool of warm engines (JSON lines output)")
+    parser.add_argument('input', help="PGN file, FEN/EPD file, or '-' for FENs on stdin")
+    parser.add_argument('--time', type=float, help="seconds per position")
+    parser.add_argument('--nodes', type=int, help="nodes per position")
+    parser.add_argument('--depth', type=int, help="maximum search depth")
+    parser.add_argument('--workers', type=int, help="number of engine processes (default: all CPUs)")
+    parser.add_argument('--plies', type=int, help="only the first N positions of each PGN game")
+    parser.add_argument('--no-grouping', action='store_true', help="do not keep positions of a game on one worker")
+    args = parser.parse_args(argv)
+    
+    limits = {'time': args.time, 'nodes': args.nodes, 'depth': args.depth}
+    start = time.perf_counter()
+    count = 0
+    for result in analyze_positions(read_positions(args.input, args.plies), limits, args.workers, not args.no_grouping):
+        print(json.dumps(result), flush=True)
+        count += 1
+    elapsed = time.perf_counter() - start
+    print(f"Analysed {count} positions in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f}/s)", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
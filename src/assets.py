@@ -4,11 +4,19 @@ Asset loading and management
 
 import pygame
 import os
+import threading
 from src.constants import PIECE_IMAGES, SQUARE_SIZE
 
 # Dictionary to cache loaded images
 _piece_surfaces = {}
 
+# Luồng nạp trước ảnh quân cờ (chạy trong lúc menu chính hiển thị)
+_preload_thread = None
+
+# Ảnh đã giải mã và thu nhỏ bởi luồng nạp trước, chờ luồng chính chuyển đổi và đưa vào bộ đệm
+_decoded_images = {}
+_decoded_lock = threading.Lock()
+
 def load_piece_image(piece_type, color):
     """Load a piece image from file or cache"""
     key = (piece_type, color)
@@ -32,14 +40,16 @@ def load_piece_image(piece_type, color):
     
     # Load the image from file
     try:
-        # Load and scale the image to fit the square
-        original = pygame.image.load(image_path).convert_alpha()
-        scaled = pygame.transform.scale(original, (SQUARE_SIZE - 10, SQUARE_SIZE - 10))
+        # Use the image decoded by the preload thread if it is ready
+        with _decoded_lock:
+            scaled = _decoded_images.pop(key, None)
+        if scaled is None:
+            scaled = _decode_piece_image(image_path)
         
         # Create a surface with proper padding
         surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
         # Center the piece image on the square
-        surface.blit(scaled, (5, 5))
+        surface.blit(scaled.convert_alpha(), (5, 5))
         
         # Cache and return
         _piece_surfaces[key] = surface
@@ -56,6 +66,45 @@ def load_piece_image(piece_type, color):
         _piece_surfaces[key] = surface
         return surface
 
+def _decode_piece_image(image_path):
+    """Load and scale an image file to fit the square; does not touch the display"""
+    original = pygame.image.load(image_path)
+    return pygame.transform.scale(original, (SQUARE_SIZE - 10, SQUARE_SIZE - 10))
+
 def clear_cache():
     """Clear the image cache"""
-    _piece_surfaces.clear()
\ No newline at end of file
+    _piece_surfaces.clear()
+
+def preload_piece_images():
+    """
+    Decode and scale every piece image on a background thread. Converting the images
+    for the display and filling the cache happen on the main thread, in load_piece_image.
+    """
+    global _preload_thread
+    if _preload_thread is None:
+        _preload_thread = threading.Thread(target=_load_all_piece_images, daemon=True)
+        _preload_thread.start()
+    return _preload_thread
+
+def _load_all_piece_images():
+    # Chỉ giải mã tệp ảnh: convert_alpha, phông chữ và bộ đệm chỉ dùng trên luồng chính
+    for key, image_path in PIECE_IMAGES.items():
+        if not image_path or not os.path.exists(image_path):
+            continue
+        try:
+            scaled = _decode_piece_image(image_path)
+        except pygame.error:
+            # Luồng chính sẽ thử lại và dùng ảnh thay thế
+            continue
+        with _decoded_lock:
+            _decoded_images[key] = scaled
+
+def wait_for_piece_images():
+    """
+    Block until the background preload (if any) has finished, then convert and cache
+    the preloaded images. Must be called on the main thread after the display mode is set.
+    """
+    if _preload_thread is not None:
+        _preload_thread.join()
+        for piece_type, color in PIECE_IMAGES:
+            load_piece_image(piece_type, color)
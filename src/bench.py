@@ -0,0 +1,141 @@
+"""
+Deterministic search benchmark
+
+Runs find_best_move to a fixed depth over a built-in set of positions, with
+caches reset between positions and the book, tablebases and experience file
+disabled. The total node count is a signature of the search: it only changes
+when the search itself changes. Nodes per second measures speed. The bench also
+measures how long a fresh interpreter takes to import the engine core, which
+must not load pygame.
+
+    python -m src.bench [--depth 3] [--json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from src import ai
+from src.fen import parse_fen
+from src.pgn import square_name
+
+DEFAULT_DEPTH = 3
+
+# Các module lõi (luật cờ và AI) phải import được chỉ với thư viện chuẩn
+CORE_MODULES = ('src.pieces', 'src.endgame', 'src.board', 'src.ai')
+
+# Khai cuộc, trung cuộc, thế cờ chiến thuật và tàn cuộc
+BENCH_POSITIONS = [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+    'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    'r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4',
+    'r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10',
+    'rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5',
+    'r1bq1rk1/ppp2ppp/2np1n2/2b1p3/2B1P3/2PP1N2/PP3PPP/RNBQ1RK1 w - - 0 7',
+    'r1bqk2r/pp1nbppp/2p1pn2/3p4/2PP4/2N1PN2/PPQ2PPP/R1B1KB1R w KQkq - 0 7',
+    'rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 2',
+    'rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2',
+    'r1b1kb1r/pppp1ppp/5q2/4n3/3KP3/2N3PN/PPP4P/R1BQ1B1R b kq - 0 1',
+    '3r1rk1/p4ppp/1q2p3/2n1P3/1p6/3B1N2/PPQ2PPP/3R1RK1 w - - 0 1',
+    '2r3k1/5ppp/p3p3/1p1nP3/3P4/P2B4/1q3PPP/2RQ2K1 w - - 0 1',
+    'r3r1k1/pp3ppp/2p5/3q4/3P4/2PQ4/P4PPP/R3R1K1 w - - 0 1',
+    '5rk1/1b3ppp/p7/1p1Np3/4P3/1P4P1/P4P1P/3R2K1 w - - 0 1',
+    '3q2k1/pb3p1p/4pbp1/2r5/PpN2N2/1P2P2P/5PP1/Q2R2K1 b - - 0 1',
+    '2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1',
+    'r5rk/5p1p/5R2/4B3/8/8/7P/7K w - - 0 1',
+    '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1',
+    '6k1/6p1/6Pp/ppp5/3pn2P/1P3K2/1PP2P2/3N4 b - - 0 1',
+    '8/pp3pk1/2p3p1/3p3p/3P3P/2P3P1/PP3PK1/8 w - - 0 1',
+    '8/8/1p2k1p1/p1p2p1p/P1P2P1P/1P2K1P1/8/8 w - - 0 1',
+    '8/8/3k4/1p1p1p2/1P1P1P2/3K4/8/8 w - - 0 1',
+    '8/5k2/8/3r4/8/3R4/2K5/8 w - - 0 1',
+    '4k3/8/8/8/8/8/4P3/4K3 w - - 0 1',
+    '8/8/8/4k3/8/8/8/4K2R w K - 0 1',
+    '8/8/8/8/8/2k5/8/2K2Q2 w - - 0 1'
+]
+
+def bench_profile(depth):
+    """Search profile for the bench: fixed depth, no node limit, no noise, no external knowledge"""
+    return {'nodes': None, 'max_depth': depth, 'noise': 0, 'book': False, 'tablebase': False, 'experience': False}
+
+def run_bench(depth=DEFAULT_DEPTH, positions=BENCH_POSITIONS, verbose=False):
+    """
+    Search every position to `depth` and return
+    {'depth', 'positions', 'nodes', 'time', 'nps', 'results': [per-position dicts]}.
+    """
+    profile = bench_profile(depth)
+    results = []
+    total_nodes = 0
+    total_time = 0.0
+    for index, fen in enumerate(positions, 1):
+        game_state = parse_fen(fen)
+        # Mỗi thế cờ bắt đầu với cache rỗng để số nút không phụ thuộc thứ tự
+        ai.reset_caches()
+        start = time.perf_counter()
+        move = ai.find_best_move(game_state, depth, profile)
+        elapsed = time.perf_counter() - start
+        nodes = ai.get_search_stats()['nodes']
+        total_nodes += nodes
+        total_time += elapsed
+        move_text = square_name(move[0]) + square_name(move[1]) if move else None
+        results.append({'fen': fen, 'move': move_text, 'nodes': nodes, 'time': elapsed})
+        if verbose:
+            print(f"Position {index:2d}/{len(positions)}: {nodes:8d} nodes  {elapsed:6.2f}s  {fen}")
+    return {
+        'depth': depth,
+        'positions': len(positions),
+        'nodes': total_nodes,
+        'time': total_time,
+        'nps': int(total_nodes / total_time) if total_time else 0,
+        'results': results
+    }
+
+def measure_import_time(modules=CORE_MODULES, runs=3):
+    """
+    Import `modules` in fresh interpreters and return {'import_time': best seconds,
+    'pygame_loaded': whether pygame was imported as a side effect}.
+    """
+    script = ("import sys, time\n"
+              "start = time.perf_counter()\n"
+              f"for name in {list(modules)!r}:\n"
+              "    __import__(name)\n"
+              "print(time.perf_counter() - start, 'pygame' in sys.modules)")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    pygame_loaded = False
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.split()
+        elapsed = float(output[-2])
+        pygame_loaded = pygame_loaded or output[-1] == 'True'
+        best = elapsed if best is None else min(best, elapsed)
+    return {'import_time': best, 'pygame_loaded': pygame_loaded}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the deterministic search benchmark")
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help="search depth for every position")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print one line per position")
+    args = parser.parse_args(argv)
+    
+    report = run_bench(args.depth, verbose=args.verbose and not args.json)
+    report.update(measure_import_time())
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("===========================")
+        print(f"Depth          : {report['depth']}")
+        print(f"Positions      : {report['positions']}")
+        print(f"Total time (s) : {report['time']:.2f}")
+        print(f"Nodes searched : {report['nodes']}")
+        print(f"Nodes/second   : {report['nps']}")
+        print(f"Import (ms)    : {report['import_time'] * 1000:.1f}{' (pygame loaded!)' if report['pygame_loaded'] else ''}")
+
+if __name__ == '__main__':
+    main()
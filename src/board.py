@@ -2,10 +2,25 @@
 Chess board representation using logical programming approach
 """
 
-import pygame
-from src.constants import BOARD_SIZE, SQUARE_SIZE, LIGHT_SQUARE, DARK_SQUARE, HIGHLIGHT, MOVE_HIGHLIGHT, WIDTH
-from src.endgame import get_position_key
-from src.pieces import is_empty, is_check, is_checkmate, is_stalemate, get_valid_moves_considering_check
+from src.constants import BOARD_SIZE
+from collections import Counter
+from src.endgame import compute_material_key, material_delta
+from src.pieces import is_empty, get_valid_moves_considering_check
+from src.zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS, en_passant_capturable, compute_pawn_key, compute_hash
+
+# Trọng số giai đoạn ván cờ: 24 khi đủ quân (trung cuộc), 0 khi chỉ còn vua và tốt (tàn cuộc)
+PHASE_WEIGHTS = {'P': 0, 'N': 1, 'B': 1, 'R': 2, 'Q': 4, 'K': 0}
+MAX_PHASE = 24
+
+# Quyền nhập thành gắn với ô xuất phát của vua và xe: đi từ hoặc đến các ô này sẽ mất quyền tương ứng
+CASTLING_SQUARES = {
+    (7, 4): ('white_king_side', 'white_queen_side'),
+    (7, 7): ('white_king_side',),
+    (7, 0): ('white_queen_side',),
+    (0, 4): ('black_king_side', 'black_queen_side'),
+    (0, 7): ('black_king_side',),
+    (0, 0): ('black_queen_side',)
+}
 
 
 # Biểu diễn bàn cờ như một tập hợp các facts
@@ -46,31 +61,49 @@ def create_board():
     
     return board
 
+def get_game_phase(board):
+    """Compute the game phase from the pieces on the board (may exceed MAX_PHASE after promotions)"""
+    phase = 0
+    for piece_type, _ in board.values():
+        phase += PHASE_WEIGHTS[piece_type]
+    return phase
+
 # Game state dưới dạng facts
 def create_game_state():
     """Create initial game state facts"""
+    castling_rights = {
+        'white_king_side': True,
+        'white_queen_side': True,
+        'black_king_side': True,
+        'black_queen_side': True
+    }
+    return build_game_state(create_board(), 'white', castling_rights)
+
+def build_game_state(board, turn, castling_rights, en_passant_target=None, halfmove_clock=0, fullmove_number=1):
+    """Create game state facts for an arbitrary position (used for the initial board and FEN import)"""
+    king_positions = {color: pos for pos, (piece_type, color) in board.items() if piece_type == 'K'}
     state = {
-        'board': create_board(),
-        'turn': 'white',
-        'white_king_pos': (7, 4),
-        'black_king_pos': (0, 4),
-        'castling_rights': {
-            'white_king_side': True,
-            'white_queen_side': True,
-            'black_king_side': True,
-            'black_queen_side': True
-        },
-        'en_passant_target': None,
-        'move_history': [],
+        'board': board,
+        'turn': turn,
+        'white_king_pos': king_positions.get('white'),
+        'black_king_pos': king_positions.get('black'),
+        'castling_rights': castling_rights,
+        'en_passant_target': en_passant_target,
+        'move_history': [],  # (start, end, quân đi, quân phong cấp hoặc None)
         'selected_piece': None,
         'valid_moves': [],
-        'halfmove_clock': 0,  # Đếm số nước đi không ăn quân hoặc di chuyển tốt
-        'fullmove_number': 1,  # Số lượt đi đầy đủ
-        'position_history': []  # Lưu lịch sử các trạng thái bàn cờ để kiểm tra lặp lại
+        'halfmove_clock': halfmove_clock,  # Đếm số nước đi không ăn quân hoặc di chuyển tốt
+        'fullmove_number': fullmove_number,  # Số lượt đi đầy đủ
+        'position_history': Counter(),  # Số lần xuất hiện của mỗi khóa Zobrist từ sau nước không thể đảo ngược gần nhất
+        'phase': get_game_phase(board),  # Giai đoạn ván cờ, cập nhật dần theo nước đi
+        'pawn_key': compute_pawn_key(board),  # Khóa Zobrist chỉ gồm các quân tốt
+        'material_key': compute_material_key(board),  # Chữ ký vật chất (số lượng quân theo màu, tượng theo màu ô)
+        'hash': 0  # Khóa Zobrist của toàn bộ trạng thái
     }
+    state['hash'] = compute_hash(state)
     
     # Lưu trạng thái ban đầu
-    state['position_history'].append(get_position_key(state['board']))
+    state['position_history'][state['hash']] += 1
     
     return state
 
@@ -113,6 +146,7 @@ def move_piece(game_state, start_pos, end_pos, promotion_piece='Q'):
     
     # QUAN TRỌNG: Xóa en passant target cũ trước khi xử lý nước đi mới
     game_state['en_passant_target'] = None
+    previous_castling_rights = dict(game_state['castling_rights'])
     
     # Check if this move resets the halfmove clock (capture or pawn move)
     is_capture = end_pos in board  # Destination has an opponent piece
@@ -213,18 +247,52 @@ def move_piece(game_state, start_pos, end_pos, promotion_piece='Q'):
             elif start_pos == (0, 7):  # King-side rook
                 game_state['castling_rights']['black_king_side'] = False
     
+    # Xe bị bắt tại góc cũng làm mất quyền nhập thành về phía đó
+    for right in CASTLING_SQUARES.get(end_pos, ()):
+        game_state['castling_rights'][right] = False
+    
+    # Cập nhật dần giai đoạn, chữ ký vật chất và khóa tốt theo quân bị bắt (kể cả bắt qua đường) và phong cấp
+    captured_pos = end_pos
+    captured = board.get(end_pos)
+    if piece_type == 'P' and start_col != end_col and captured is None:
+        captured_pos = (start_row, end_col)
+        captured = board.get(captured_pos)
+    promoted = new_board[end_pos] if piece_type == 'P' and end_row in (0, 7) else None
+    phase = game_state['phase']
+    material_key = game_state['material_key']
+    pawn_key = game_state['pawn_key']
+    if captured:
+        phase -= PHASE_WEIGHTS[captured[0]]
+        material_key -= material_delta(captured, captured_pos)
+        if captured[0] == 'P':
+            pawn_key ^= PIECE_KEYS[captured][captured_pos[0] * 8 + captured_pos[1]]
+    if piece_type == 'P':
+        pawn_key ^= PIECE_KEYS[piece][start_row * 8 + start_col]
+        if promoted:
+            phase += PHASE_WEIGHTS[promoted[0]]
+            material_key += material_delta(promoted, end_pos) - material_delta(piece, start_pos)
+        else:
+            pawn_key ^= PIECE_KEYS[piece][end_row * 8 + end_col]
+    
     # Update the board
     game_state['board'] = new_board
+    game_state['phase'] = phase
+    game_state['pawn_key'] = pawn_key
+    game_state['material_key'] = material_key
     
     # Log the move
-    game_state['move_history'].append((start_pos, end_pos, piece))
-    
-    # Lưu trạng thái mới vào position_history
-    from src.endgame import get_position_key
-    game_state['position_history'].append(get_position_key(new_board))
+    promotion = new_board[end_pos][0] if piece_type == 'P' and end_row in (0, 7) else None
+    game_state['move_history'].append((start_pos, end_pos, piece, promotion))
     
     # Switch turns
     game_state['turn'] = 'black' if game_state['turn'] == 'white' else 'white'
+    game_state['hash'] = compute_hash(game_state)
+    
+    # Lưu trạng thái mới vào position_history. Sau nước không thể đảo ngược (đi tốt, bắt quân,
+    # mất quyền nhập thành) các thế cờ cũ không thể lặp lại nên được bỏ đi
+    if game_state['halfmove_clock'] == 0 or game_state['castling_rights'] != previous_castling_rights:
+        game_state['position_history'].clear()
+    game_state['position_history'][game_state['hash']] += 1
     
     # Clear selection
     game_state['selected_piece'] = None
@@ -232,88 +300,6 @@ def move_piece(game_state, start_pos, end_pos, promotion_piece='Q'):
     
     return game_state
 
-def draw_board(screen, game_state):
-    """Draw the chess board and pieces"""
-    board = game_state['board']
-    selected = game_state['selected_piece']
-    valid_moves = game_state['valid_moves']
-    
-    # Draw the board squares
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            # Determine square color
-            color = LIGHT_SQUARE if (row + col) % 2 == 0 else DARK_SQUARE
-            
-            # Draw the square
-            pygame.draw.rect(
-                screen,
-                color,
-                pygame.Rect(
-                    col * SQUARE_SIZE,
-                    row * SQUARE_SIZE,
-                    SQUARE_SIZE,
-                    SQUARE_SIZE
-                )
-            )
-    
-    # Highlight valid moves
-    for move in valid_moves:
-        row, col = move
-        pygame.draw.rect(
-            screen,
-            MOVE_HIGHLIGHT,
-            pygame.Rect(
-                col * SQUARE_SIZE,
-                row * SQUARE_SIZE,
-                SQUARE_SIZE,
-                SQUARE_SIZE
-            )
-        )
-    
-    # Highlight selected piece
-    if selected:
-        row, col = selected
-        pygame.draw.rect(
-            screen,
-            HIGHLIGHT,
-            pygame.Rect(
-                col * SQUARE_SIZE,
-                row * SQUARE_SIZE,
-                SQUARE_SIZE,
-                SQUARE_SIZE
-            )
-        )
-    
-    # Draw pieces placeholder
-    for pos, piece in board.items():
-        row, col = pos
-        piece_type, color = piece
-        
-        # Simple representation of pieces
-        font = pygame.font.SysFont('Arial', 36)
-        text_color = (255, 255, 255) if color == 'black' else (0, 0, 0)
-        text = font.render(piece_type, True, text_color)
-        
-        # Center the text in the square
-        text_rect = text.get_rect(center=(col * SQUARE_SIZE + SQUARE_SIZE // 2, 
-                                          row * SQUARE_SIZE + SQUARE_SIZE // 2))
-        screen.blit(text, text_rect)
-    
-    # Check for check, checkmate, or stalemate
-    current_color = game_state['turn']
-    font = pygame.font.SysFont('Arial', 24)
-    
-    if is_checkmate(board, game_state, current_color):
-        winner = 'Black' if current_color == 'white' else 'White'
-        text = font.render(f"{winner} wins by checkmate!", True, (255, 0, 0))
-        screen.blit(text, (WIDTH // 2 - 100, 20))
-    elif is_stalemate(board, game_state, current_color):
-        text = font.render("Game drawn by stalemate!", True, (255, 0, 0))
-        screen.blit(text, (WIDTH // 2 - 100, 20))
-    elif is_check(board, game_state, current_color):
-        text = font.render(f"{current_color.capitalize()} is in check!", True, (255, 0, 0))
-        screen.blit(text, (WIDTH // 2 - 100, 20))
-
 def make_hypothetical_move(game_state, start_pos, end_pos):
     """Make a hypothetical move and return the new game state"""
     # Create a copy of the game state
@@ -340,6 +326,61 @@ def make_hypothetical_move(game_state, start_pos, end_pos):
     start_row, start_col = start_pos
     end_row, end_col = end_pos
     
+    captured = board.get(end_pos)
+    
+    # Cập nhật giai đoạn ván cờ theo quân bị bắt và phong cấp
+    phase = game_state.get('phase')
+    if phase is not None:
+        if captured:
+            phase -= PHASE_WEIGHTS[captured[0]]
+        if piece_type == 'P' and end_row in (0, 7):
+            phase += PHASE_WEIGHTS['Q']
+        new_state['phase'] = phase
+    
+    # Cập nhật chữ ký vật chất: quân bị bắt (kể cả tốt bị bắt qua đường) và phong cấp
+    material_key = game_state.get('material_key')
+    if material_key is not None:
+        if captured:
+            material_key -= material_delta(captured, end_pos)
+        elif piece_type == 'P' and start_col != end_col:
+            en_passant_pawn = board.get((start_row, end_col))
+            if en_passant_pawn:
+                material_key -= material_delta(en_passant_pawn, (start_row, end_col))
+        if piece_type == 'P' and end_row in (0, 7):
+            material_key += material_delta(('Q', color), end_pos) - material_delta(piece, start_pos)
+        new_state['material_key'] = material_key
+    
+    # Cập nhật khóa tốt: chỉ thay đổi khi tốt di chuyển hoặc bị bắt
+    pawn_key = game_state.get('pawn_key')
+    if pawn_key is not None:
+        if piece_type == 'P':
+            pawn_key ^= PIECE_KEYS[piece][start_row * 8 + start_col]
+            if end_row not in (0, 7):
+                pawn_key ^= PIECE_KEYS[piece][end_row * 8 + end_col]
+            if start_col != end_col and not captured:
+                # Bắt tốt qua đường: tốt bị bắt nằm cùng hàng với ô xuất phát
+                en_passant_pawn = board.get((start_row, end_col))
+                if en_passant_pawn and en_passant_pawn[0] == 'P':
+                    pawn_key ^= PIECE_KEYS[en_passant_pawn][start_row * 8 + end_col]
+        if captured and captured[0] == 'P':
+            pawn_key ^= PIECE_KEYS[captured][end_row * 8 + end_col]
+        new_state['pawn_key'] = pawn_key
+    
+    # Đồng hồ 50 nước: về 0 khi đi tốt hoặc bắt quân
+    halfmove_clock = game_state.get('halfmove_clock')
+    if halfmove_clock is not None:
+        new_state['halfmove_clock'] = 0 if piece_type == 'P' or captured else halfmove_clock + 1
+    
+    # Khóa Zobrist: cập nhật dần theo các quân thay đổi vị trí
+    key = game_state.get('hash')
+    if key is not None:
+        key ^= SIDE_KEY ^ PIECE_KEYS[piece][start_row * 8 + start_col]
+        if captured:
+            key ^= PIECE_KEYS[captured][end_row * 8 + end_col]
+    
+    # Nước đi mới xóa ô bắt tốt qua đường cũ
+    new_state['en_passant_target'] = None
+    
     # Handle special moves like en passant, castling, promotion
     if piece_type == 'P':
         # En passant capture
@@ -347,6 +388,8 @@ def make_hypothetical_move(game_state, start_pos, end_pos):
             # This must be an en passant move
             capture_pos = (start_row, end_col)
             if capture_pos in board:
+                if key is not None:
+                    key ^= PIECE_KEYS[board[capture_pos]][start_row * 8 + end_col]
                 del board[capture_pos]
         
         # Promotion (automatically to Queen for now)
@@ -354,6 +397,10 @@ def make_hypothetical_move(game_state, start_pos, end_pos):
             board[end_pos] = ('Q', color)
         else:
             board[end_pos] = piece
+        
+        # Tốt đi 2 bước: đặt ô bắt tốt qua đường
+        if abs(start_row - end_row) == 2:
+            new_state['en_passant_target'] = ((start_row + end_row) // 2, start_col)
     
     # Castling
     elif piece_type == 'K' and abs(start_col - end_col) == 2:
@@ -371,6 +418,8 @@ def make_hypothetical_move(game_state, start_pos, end_pos):
         if rook:
             board[rook_end] = rook
             del board[rook_start]
+            if key is not None:
+                key ^= PIECE_KEYS[rook][rook_start[0] * 8 + rook_start[1]] ^ PIECE_KEYS[rook][rook_end[0] * 8 + rook_end[1]]
     else:
         # Regular move
         board[end_pos] = piece
@@ -386,7 +435,27 @@ def make_hypothetical_move(game_state, start_pos, end_pos):
         else:
             new_state['black_king_pos'] = end_pos
     
+    # Đi từ hoặc đến ô của vua/xe ban đầu làm mất quyền nhập thành
+    castling_rights = new_state['castling_rights']
+    for square in (start_pos, end_pos):
+        for right in CASTLING_SQUARES.get(square, ()):
+            if castling_rights[right]:
+                castling_rights[right] = False
+                if key is not None:
+                    key ^= CASTLING_KEYS[right]
+    
+    if key is not None:
+        key ^= PIECE_KEYS[board[end_pos]][end_row * 8 + end_col]
+        # Cột bắt tốt qua đường chỉ nằm trong khóa khi có tốt đối phương bắt được
+        old_target = game_state['en_passant_target']
+        if old_target and en_passant_capturable(game_state['board'], old_target, color):
+            key ^= EN_PASSANT_KEYS[old_target[1]]
+        new_target = new_state['en_passant_target']
+        if new_target and en_passant_capturable(board, new_target, 'black' if color == 'white' else 'white'):
+            key ^= EN_PASSANT_KEYS[new_target[1]]
+        new_state['hash'] = key
+    
     # Switch turn
     new_state['turn'] = 'black' if new_state['turn'] == 'white' else 'white'
     
-    return new_state
\ No newline at end of file
+    return new_state
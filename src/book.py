@@ -0,0 +1,197 @@
+"""
+Opening book stored as a sorted binary file and probed through mmap
+
+File layout follows the Polyglot entry format: 16-byte big-endian records
+(key: u64, move: u16, weight: u16, learn: u32) sorted by key. Keys are
+Polyglot keys (src/polyglot.py), so Polyglot books from other programs can be
+used and books built here can be read by other tools.
+
+Build a book from PGN games:
+    python -m src.book games.pgn [more.pgn ...] -o assets/book.bin
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+from src.constants import BOOK_PATH
+from src.pieces import get_valid_moves_considering_check
+from src.polyglot import polyglot_key
+
+ENTRY = struct.Struct('>QHHI')
+ENTRY_SIZE = ENTRY.size
+
+# Mã phong cấp theo Polyglot
+PROMOTION_CODES = {None: 0, 'N': 1, 'B': 2, 'R': 3, 'Q': 4}
+PROMOTION_PIECES = {code: piece for piece, code in PROMOTION_CODES.items()}
+
+# Số mũ áp lên trọng số khi chọn nước theo độ khó:
+# độ khó thấp chọn ngẫu nhiên hơn, độ khó cao ưu tiên nước được chơi nhiều/thắng nhiều
+BOOK_WEIGHT_EXPONENT = {2: 0.5, 3: 1.0, 4: 2.0}
+
+def encode_move(start, end, promotion=None, piece_type=None):
+    """Encode a move as a Polyglot 16-bit move (castling is written as king-takes-rook)"""
+    start_row, start_col = start
+    end_row, end_col = end
+    if piece_type == 'K' and abs(start_col - end_col) == 2:
+        end_col = 7 if end_col > start_col else 0
+    return (end_col
+            | (7 - end_row) << 3
+            | start_col << 6
+            | (7 - start_row) << 9
+            | PROMOTION_CODES[promotion] << 12)
+
+def decode_move(move, board):
+    """Decode a Polyglot 16-bit move into (start, end, promotion) for the given board"""
+    end_col = move & 7
+    end_row = 7 - ((move >> 3) & 7)
+    start_col = (move >> 6) & 7
+    start_row = 7 - ((move >> 9) & 7)
+    promotion = PROMOTION_PIECES.get((move >> 12) & 7)
+    
+    start = (start_row, start_col)
+    piece = board.get(start)
+    # Nhập thành được ghi là vua bắt xe của mình
+    if piece and piece[0] == 'K' and board.get((end_row, end_col)) == ('R', piece[1]) and start_col == 4:
+        end_col = 6 if end_col == 7 else 2
+    return start, (end_row, end_col), promotion
+
+class OpeningBook:
+    """Read-only opening book; the file is memory-mapped and searched with binary search"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self.entry_count = size // ENTRY_SIZE
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def close(self):
+        """Release the memory map and the file"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _key_at(self, index):
+        return struct.unpack_from('>Q', self._map, index * ENTRY_SIZE)[0]
+
+    def get_entries(self, key):
+        """Return the list of (move, weight) stored for a position key"""
+        if self._map is None:
+            return []
+        
+        # Tìm vị trí đầu tiên có khóa >= key
+        low, high = 0, self.entry_count
+        while low < high:
+            mid = (low + high) // 2
+            if self._key_at(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        
+        entries = []
+        index = low
+        while index < self.entry_count:
+            entry_key, move, weight, _ = ENTRY.unpack_from(self._map, index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            entries.append((move, weight))
+            index += 1
+        return entries
+
+    def get_moves(self, game_state):
+        """Return the legal book moves for a position as [((start, end, promotion), weight), ...]"""
+        board = game_state['board']
+        moves = []
+        for move, weight in self.get_entries(polyglot_key(game_state)):
+            start, end, promotion = decode_move(move, board)
+            piece = board.get(start)
+            # Kiểm tra lại tính hợp lệ để tránh trùng khóa
+            if piece and piece[1] == game_state['turn'] and end in get_valid_moves_considering_check(board, game_state, start):
+                moves.append(((start, end, promotion), weight))
+        return moves
+
+    def choose_move(self, game_state, difficulty=3, rng=random):
+        """Pick a book move by weighted random selection, or None if the position is not in the book"""
+        moves = [(move, weight) for move, weight in self.get_moves(game_state) if weight > 0]
+        if not moves:
+            return None
+        exponent = BOOK_WEIGHT_EXPONENT.get(difficulty, 1.0)
+        weights = [weight ** exponent for _, weight in moves]
+        return rng.choices([move for move, _ in moves], weights=weights)[0]
+
+# Sách khai cuộc mặc định, mở khi cần lần đầu
+_default_book = None
+_default_book_loaded = False
+
+def get_default_book():
+    """Open the default book at BOOK_PATH once; returns None if there is no book file"""
+    global _default_book, _default_book_loaded
+    if not _default_book_loaded:
+        _default_book_loaded = True
+        if os.path.exists(BOOK_PATH):
+            try:
+                _default_book = OpeningBook(BOOK_PATH)
+            except (OSError, ValueError):
+                _default_book = None
+    return _default_book
+
+def probe_book(game_state, difficulty=3):
+    """Return a (start, end, promotion) book move for the position, or None"""
+    book = get_default_book()
+    if book is None:
+        return None
+    return book.choose_move(game_state, difficulty)
+
+def build_book(pgn_paths, output_path, max_ply=20, min_games=1):
+    """
+    Build a book file from PGN games.
+    Each (position, move) is weighted 2 per win and 1 per draw for the side that played it.
+    Returns the number of entries written.
+    """
+    from src.pgn import read_games, iter_game_states
+    
+    weights = {}
+    counts = {}
+    for path in pgn_paths:
+        for game in read_games(path):
+            result = game['result']
+            for game_state, (start, end, promotion) in iter_game_states(game, max_ply):
+                color = game_state['turn']
+                if result == '1/2-1/2':
+                    score = 1
+                elif result == ('1-0' if color == 'white' else '0-1'):
+                    score = 2
+                else:
+                    score = 0
+                piece_type = game_state['board'][start][0]
+                entry = (polyglot_key(game_state), encode_move(start, end, promotion, piece_type))
+                weights[entry] = weights.get(entry, 0) + score
+                counts[entry] = counts.get(entry, 0) + 1
+    
+    entries = [(key, move, weights[(key, move)]) for key, move in sorted(weights) if counts[(key, move)] >= min_games]
+    
+    # Trọng số được lưu bằng 16 bit: chia tỉ lệ nếu vượt quá
+    max_weight = max((weight for _, _, weight in entries), default=0)
+    scale = 65535 / max_weight if max_weight > 65535 else 1
+    
+    with open(output_path, 'wb') as book_file:
+        for key, move, weight in entries:
+            book_file.write(ENTRY.pack(key, move, int(weight * scale), 0))
+    return len(entries)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN files")
+    parser.add_argument('pgn', nargs='+', help="PGN files to read")
+    parser.add_argument('-o', '--output', default=BOOK_PATH, help="output book file")
+    parser.add_argument('--max-ply', type=int, default=20, help="number of plies per game to include")
+    parser.add_argument('--min-games', type=int, default=1, help="minimum games a move must appear in")
+    args = parser.parse_args(argv)
+    
+    count = build_book(args.pgn, args.output, args.max_ply, args.min_games)
+    print(f"Wrote {count} entries to {args.output}")
+
+if __name__ == '__main__':
+    main()
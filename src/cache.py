@@ -0,0 +1,84 @@
+"""
+Bounded LRU cache sized by an approximate memory budget
+"""
+
+import sys
+from collections import OrderedDict
+
+# Chi phí ước tính của một mục (nút OrderedDict, ô băm và tuple (giá trị, kích thước)),
+# chưa tính khóa và giá trị
+ENTRY_OVERHEAD = 160
+
+class LRUCache:
+    """
+    Mapping with least-recently-used eviction.
+    The size of each entry is estimated as ENTRY_OVERHEAD + sizeof(key) + sizeof(value);
+    the oldest entries are evicted whenever the total exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes, sizeof=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or sys.getsizeof
+        self._entries = OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Return the cached value and mark it as recently used"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries if over budget"""
+        size = ENTRY_OVERHEAD + sys.getsizeof(key) + self.sizeof(value)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes_used -= old[1]
+        self._entries[key] = (value, size)
+        self.bytes_used += size
+        self._evict()
+
+    def _evict(self):
+        while self.bytes_used > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.bytes_used -= size
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        """Change the memory budget, evicting entries if needed"""
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        self._entries.clear()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """Return entry count, memory use and hit/miss/eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes_used,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
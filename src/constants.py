@@ -36,6 +36,15 @@ FPS = 60
 ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets')
 PIECES_DIR = os.path.join(ASSETS_DIR, 'images')
 
+# Sách khai cuộc (tạo bằng: python -m src.book games.pgn -o assets/book.bin)
+BOOK_PATH = os.path.join(ASSETS_DIR, 'book.bin')
+
+# Bảng tàn cuộc (tạo bằng: python -m src.tablebase KQvK KRvK KPvK KBNvK)
+TABLEBASE_DIR = os.path.join(ASSETS_DIR, 'tablebases')
+
+# Tệp kinh nghiệm tìm kiếm, chỉ dùng khi tệp tồn tại (tạo bằng: python -m src.experience create)
+EXPERIENCE_PATH = os.path.join(ASSETS_DIR, 'experience.bin')
+
 # Mapping piece codes to image filenames
 PIECE_IMAGES = {
     ('K', 'white'): os.path.join(PIECES_DIR, 'white_king.png'),
@@ -2,84 +2,94 @@
 Endgame rules and detection
 """
 
-def get_position_key(board):
+# Thứ tự quân trong chữ ký vật chất
+MATERIAL_ORDER = 'KQRBNP'
+
+def get_material_signature(board):
     """
-    Tạo khóa duy nhất cho trạng thái bàn cờ hiện tại
-    Sử dụng để kiểm tra trùng lặp vị trí (Threefold Repetition)
+    Tạo chữ ký vật chất dạng 'KBNvK' (quân trắng trước, quân đen sau)
+    Dùng để chọn bảng tàn cuộc phù hợp với thế cờ
     """
-    # Sắp xếp các vị trí quân cờ để tạo khóa nhất quán
-    pieces = []
-    for pos, piece in sorted(board.items()):
-        pieces.append(f"{pos}:{piece[0]}{piece[1][0]}")  # Ví dụ: (0,0):Rb (Xe đen ở 0,0)
+    white_pieces = []
+    black_pieces = []
+    for piece_type, color in board.values():
+        if color == 'white':
+            white_pieces.append(piece_type)
+        else:
+            black_pieces.append(piece_type)
     
-    return ":".join(pieces)
+    white_pieces.sort(key=MATERIAL_ORDER.index)
+    black_pieces.sort(key=MATERIAL_ORDER.index)
+    return ''.join(white_pieces) + 'v' + ''.join(black_pieces)
+
+# Chữ ký vật chất dạng số nguyên: mỗi (màu, loại quân) giữ MATERIAL_BITS bit số lượng, không tính vua.
+# Tượng được tách theo màu ô (sáng/tối) để nhận biết các thế hòa do thiếu quân
+MATERIAL_FIELDS = ('P', 'N', 'BL', 'BD', 'R', 'Q')
+MATERIAL_BITS = 4
+
+def _build_material_units():
+    units = {}
+    for color_index, color in enumerate(('white', 'black')):
+        for square_color in (0, 1):
+            for piece_type in 'PNBRQ':
+                field = piece_type
+                if piece_type == 'B':
+                    field = 'BL' if square_color == 0 else 'BD'
+                index = color_index * len(MATERIAL_FIELDS) + MATERIAL_FIELDS.index(field)
+                units[(piece_type, color, square_color)] = 1 << (index * MATERIAL_BITS)
+            units[('K', color, square_color)] = 0
+    return units
+
+# (loại quân, màu, màu ô) -> giá trị cộng vào chữ ký vật chất
+MATERIAL_UNITS = _build_material_units()
 
-def is_insufficient_material(board):
+def material_delta(piece, pos):
+    """Giá trị cộng vào (hoặc trừ khỏi) chữ ký vật chất khi quân piece đứng tại ô pos"""
+    return MATERIAL_UNITS[(piece[0], piece[1], (pos[0] + pos[1]) % 2)]
+
+def compute_material_key(board):
+    """Tính chữ ký vật chất của bàn cờ từ đầu"""
+    key = 0
+    for pos, piece in board.items():
+        key += material_delta(piece, pos)
+    return key
+
+def _build_insufficient_material_keys():
     """
-    Kiểm tra xem có đủ quân mạnh để chiếu hết không
-    Các trường hợp không đủ quân mạnh:
+    Các chữ ký vật chất không đủ quân để chiếu hết:
     - Vua vs Vua
     - Vua vs Vua + Mã
     - Vua vs Vua + Tượng
     - Vua + Tượng vs Vua + Tượng (cùng màu ô)
     """
-    # Đếm số quân và loại quân
-    white_pieces = {'K': 0, 'Q': 0, 'R': 0, 'B': 0, 'N': 0, 'P': 0}
-    black_pieces = {'K': 0, 'Q': 0, 'R': 0, 'B': 0, 'N': 0, 'P': 0}
-    white_bishop_square_color = None
-    black_bishop_square_color = None
-    
-    for pos, piece in board.items():
-        piece_type, color = piece
-        row, col = pos
-        
-        if color == 'white':
-            white_pieces[piece_type] += 1
-            # Lưu màu ô của Tượng trắng (đen/trắng)
-            if piece_type == 'B' and white_bishop_square_color is None:
-                white_bishop_square_color = (row + col) % 2
-        else:
-            black_pieces[piece_type] += 1
-            # Lưu màu ô của Tượng đen
-            if piece_type == 'B' and black_bishop_square_color is None:
-                black_bishop_square_color = (row + col) % 2
-    
-    # Xóa Vua ra khỏi danh sách để dễ đếm
-    white_pieces['K'] -= 1
-    black_pieces['K'] -= 1
-    
-    # Tính tổng quân của mỗi bên (trừ Vua)
-    white_total = sum(white_pieces.values())
-    black_total = sum(black_pieces.values())
-    
-    # Trường hợp 1: Vua vs Vua
-    if white_total == 0 and black_total == 0:
-        return True
-    
-    # Trường hợp 2: Vua vs Vua + Mã
-    if (white_total == 0 and black_total == 1 and black_pieces['N'] == 1) or \
-       (black_total == 0 and white_total == 1 and white_pieces['N'] == 1):
-        return True
-    
-    # Trường hợp 3: Vua vs Vua + Tượng
-    if (white_total == 0 and black_total == 1 and black_pieces['B'] == 1) or \
-       (black_total == 0 and white_total == 1 and white_pieces['B'] == 1):
-        return True
-    
-    # Trường hợp 4: Vua + Tượng vs Vua + Tượng (cùng màu ô)
-    if white_total == 1 and black_total == 1 and \
-       white_pieces['B'] == 1 and black_pieces['B'] == 1 and \
-       white_bishop_square_color == black_bishop_square_color:
-        return True
-    
-    return False
+    keys = {0}
+    for color in ('white', 'black'):
+        keys.add(MATERIAL_UNITS[('N', color, 0)])
+        for square_color in (0, 1):
+            keys.add(MATERIAL_UNITS[('B', color, square_color)])
+    for square_color in (0, 1):
+        keys.add(MATERIAL_UNITS[('B', 'white', square_color)] + MATERIAL_UNITS[('B', 'black', square_color)])
+    return frozenset(keys)
+
+INSUFFICIENT_MATERIAL_KEYS = _build_insufficient_material_keys()
+
+def is_insufficient_material(game_state):
+    """
+    Kiểm tra xem có đủ quân mạnh để chiếu hết không.
+    Chữ ký vật chất được cập nhật dần trong game_state nên chỉ cần tra bảng.
+    """
+    material_key = game_state.get('material_key')
+    if material_key is None:
+        material_key = compute_material_key(game_state['board'])
+    return material_key in INSUFFICIENT_MATERIAL_KEYS
 
 def is_threefold_repetition(game_state):
     """
-    Kiểm tra xem vị trí hiện tại đã xuất hiện 3 lần chưa
+    Kiểm tra xem vị trí hiện tại đã xuất hiện 3 lần chưa.
+    position_history đếm số lần xuất hiện theo khóa Zobrist (gồm bên đi, quyền nhập thành
+    và bắt tốt qua đường), nên chỉ cần một lần tra.
     """
-    current_position = get_position_key(game_state['board'])
-    return game_state['position_history'].count(current_position) >= 3
+    return game_state['position_history'][game_state['hash']] >= 3
 
 def is_fifty_move_rule(game_state):
     """
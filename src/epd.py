@@ -0,0 +1,220 @@
+"""
+EPD test-suite runner
+
+Reads EPD files with best-move (bm) and avoid-move (am) operations, runs
+find_best_move on every position with a fixed time or node budget, and reports
+how many positions were solved. Positions are spread over a process pool;
+each one starts from empty caches so the results do not depend on scheduling.
+
+    python -m src.epd wac.epd --time 3 --workers 8 --json results.json
+    python -m src.epd wac.epd --nodes 200000
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from multiprocessing import Pool
+from src import ai
+from src.fen import parse_fen
+from src.pgn import move_to_san, parse_san
+
+# Độ sâu tối đa khi chỉ giới hạn theo thời gian hoặc số nút
+DEFAULT_MAX_DEPTH = 64
+
+_OPERATION_RE = re.compile(r'\s*([A-Za-z]\w*)((?:\s*(?:"[^"]*"|[^\s;"]+))*)\s*;')
+_OPERAND_RE = re.compile(r'"([^"]*)"|([^\s;"]+)')
+
+def parse_epd(line):
+    """
+    Parse one EPD record into {'fen': str, 'operations': {opcode: [operands]}}.
+    The halfmove clock and fullmove number come from the hmvc/fmvn operations if present.
+    Raises ValueError for malformed records.
+    """
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"Invalid EPD (expected at least 4 fields): {line.strip()}")
+    
+    operations = {}
+    for opcode, operands in _OPERATION_RE.findall(fields[4] if len(fields) > 4 else ''):
+        operations[opcode] = [quoted or bare for quoted, bare in _OPERAND_RE.findall(operands)]
+    
+    halfmove_clock = operations.get('hmvc', ['0'])[0]
+    fullmove_number = operations.get('fmvn', ['1'])[0]
+    fen = ' '.join(fields[:4] + [halfmove_clock, fullmove_number])
+    return {'fen': fen, 'operations': operations}
+
+def read_epd(source):
+    """
+    Yield parsed EPD records from a file path or an open text file, skipping blank lines and comments.
+    A malformed line is yielded as {'fen': None, 'operations': {}, 'error': message}
+    so that a suite reports it instead of stopping.
+    """
+    if isinstance(source, str):
+        with open(source, encoding='utf-8') as epd_file:
+            yield from read_epd(epd_file)
+        return
+    
+    for number, line in enumerate(source, 1):
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        try:
+            yield parse_epd(stripped)
+        except ValueError as error:
+            yield {'fen': None, 'operations': {}, 'error': f"line {number}: {error}"}
+
+def search_profile(max_time=None, max_nodes=None, max_depth=DEFAULT_MAX_DEPTH):
+    """Search profile for test positions: no book, no experience file, no noise"""
+    return {'nodes': max_nodes, 'time': max_time, 'max_depth': max_depth, 'noise': 0,
+            'book': False, 'experience': False}
+
+def solve_position(task):
+    """
+    Search one EPD position (task = (record, profile)) and return a result dict:
+    id, fen, best/avoid moves, the move played, whether it solves the position,
+    the time and nodes at which the final solving move was first found, and totals.
+    A malformed record (see read_epd) or one with an invalid FEN or bm/am move
+    is reported with 'error' instead of being searched.
+    """
+    record, profile = task
+    operations = record['operations']
+    try:
+        if record.get('error'):
+            raise ValueError(record['error'])
+        return _solve(record, profile)
+    except ValueError as error:
+        return {
+            'id': (operations.get('id') or [None])[0],
+            'fen': record['fen'],
+            'bm': operations.get('bm', []),
+            'am': operations.get('am', []),
+            'move': None,
+            'solved': False,
+            'solve_time': None,
+            'solve_nodes': None,
+            'depth': 0,
+            'nodes': 0,
+            'time': 0.0,
+            'error': str(error)
+        }
+
+def _parse_moves(game_state, operations, opcode):
+    """Tập (ô đi, ô đến) của các nước trong thao tác opcode; báo rõ nước nào không hợp lệ"""
+    moves = set()
+    for san in operations.get(opcode, []):
+        try:
+            moves.add(parse_san(game_state, san)[:2])
+        except ValueError as error:
+            raise ValueError(f"{opcode} {san} is not a legal move in this position ({error})") from None
+    return moves
+
+def _solve(record, profile):
+    operations = record['operations']
+    game_state = parse_fen(record['fen'])
+    
+    # Nước đi đáp án được so sánh dưới dạng (ô đi, ô đến)
+    best_moves = _parse_moves(game_state, operations, 'bm')
+    avoid_moves = _parse_moves(game_state, operations, 'am')
+    
+    ai.reset_caches()
+    start = time.perf_counter()
+    move = ai.find_best_move(game_state, profile['max_depth'], profile)
+    elapsed = time.perf_counter() - start
+    stats = ai.get_search_stats()
+    
+    def solves(candidate):
+        if best_moves and candidate not in best_moves:
+            return False
+        return candidate not in avoid_moves
+    
+    solved = move is not None and solves(move)
+    
+    # Thời gian tới lời giải: độ sâu đầu tiên mà từ đó trở đi nước tốt nhất luôn là lời giải
+    solve_time = solve_nodes = None
+    if solved:
+        solve_time, solve_nodes = elapsed, stats['nodes']
+        for iteration in reversed(ai.search_iterations):
+            if not solves(iteration['move']):
+                break
+            solve_time, solve_nodes = iteration['time'], iteration['nodes']
+    
+    return {
+        'id': (operations.get('id') or [None])[0],
+        'fen': record['fen'],
+        'bm': operations.get('bm', []),
+        'am': operations.get('am', []),
+        'move': move_to_san(game_state, *move) if move else None,
+        'solved': solved,
+        'solve_time': solve_time,
+        'solve_nodes': solve_nodes,
+        'depth': stats['depth'],
+        'nodes': stats['nodes'],
+        'time': elapsed,
+        'error': None
+    }
+
+def run_suite(records, profile, workers=None):
+    """
+    Run every EPD record through solve_position on a process pool (workers=1 runs in-process).
+    Returns {'positions', 'solved', 'errors', 'time', 'nodes', 'results': [...]} with results in input order.
+    """
+    tasks = [(record, profile) for record in records]
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = [solve_position(task) for task in tasks]
+    else:
+        with Pool(min(workers, max(1, len(tasks)))) as pool:
+            results = pool.map(solve_position, tasks, chunksize=1)
+    return {
+        'positions': len(results),
+        'solved': sum(result['solved'] for result in results),
+        'errors': sum(result['error'] is not None for result in results),
+        'time': time.perf_counter() - start,
+        'nodes': sum(result['nodes'] for result in results),
+        'results': results
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an EPD test suite (bm/am operations)")
+    parser.add_argument('epd', nargs='+', help="EPD files to read")
+    parser.add_argument('--time', type=float, help="seconds per position")
+    parser.add_argument('--nodes', type=int, help="nodes per position")
+    parser.add_argument('--depth', type=int, default=DEFAULT_MAX_DEPTH, help="maximum search depth")
+    parser.add_argument('--workers', type=int, help="number of processes (default: all CPUs)")
+    parser.add_argument('--json', help="write the results as JSON to this file ('-' for stdout)")
+    args = parser.parse_args(argv)
+    if args.time is None and args.nodes is None and args.depth == DEFAULT_MAX_DEPTH:
+        parser.error("set a budget with --time, --nodes or --depth")
+    
+    records = [record for path in args.epd for record in read_epd(path)]
+    profile = search_profile(args.time, args.nodes, args.depth)
+    report = run_suite(records, profile, args.workers)
+    report['limits'] = {'time': args.time, 'nodes': args.nodes, 'depth': args.depth}
+    
+    if args.json == '-':
+        print(json.dumps(report, indent=2))
+        return
+    for index, result in enumerate(report['results'], 1):
+        if result['error']:
+            print(f"!! {result['id'] or f'#{index}':12s} error: {result['error']}")
+            continue
+        status = 'ok' if result['solved'] else '--'
+        solve_time = f"{result['solve_time']:6.2f}s" if result['solved'] else '       '
+        name = result['id'] or f"#{index}"
+        expected = ' '.join(result['bm']) or 'not ' + ' '.join(result['am'])
+        print(f"{status} {name:12s} {str(result['move']):8s} {expected:12s} {solve_time} {result['nodes']:9d} nodes  depth {result['depth']}")
+    print("===========================")
+    print(f"Solved         : {report['solved']}/{report['positions']}")
+    if report['errors']:
+        print(f"Errors         : {report['errors']}")
+    print(f"Total time (s) : {report['time']:.2f}")
+    print(f"Nodes searched : {report['nodes']}")
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+Persistent search experience stored in a memory-mapped file
+
+The file is a fixed-size open-addressing hash table of 16-byte records
+(Zobrist key: u64, score: i32, move: u16, depth: u8, padding) after a 16-byte
+header, so its size is capped when it is created. find_best_move consults it
+before searching and records the result afterwards; deeper results replace
+shallower ones.
+
+    python -m src.experience create --slots 65536
+    python -m src.experience stats
+    python -m src.experience compact --slots 32768 --min-depth 3
+"""
+
+import argparse
+import atexit
+import mmap
+import os
+import struct
+from src.book import encode_move, decode_move
+from src.constants import EXPERIENCE_PATH
+from src.pieces import get_valid_moves_considering_check
+from src.zobrist import compute_hash
+
+HEADER = struct.Struct('<4sIQ')
+MAGIC = b'CEXP'
+VERSION = 1
+RECORD = struct.Struct('<QiHBx')
+RECORD_SIZE = RECORD.size
+
+DEFAULT_SLOTS = 1 << 16
+
+# Số ô liên tiếp được dò cho mỗi khóa
+PROBE_LIMIT = 8
+
+class ExperienceFile:
+    """Read/write view of an experience file; depth 0 marks an empty slot"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'r+b')
+        header = self._file.read(HEADER.size)
+        if len(header) != HEADER.size:
+            self._file.close()
+            raise ValueError(f"{path}: not an experience file")
+        magic, version, slots = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or slots == 0:
+            self._file.close()
+            raise ValueError(f"{path}: not an experience file")
+        if os.fstat(self._file.fileno()).st_size != HEADER.size + slots * RECORD_SIZE:
+            self._file.close()
+            raise ValueError(f"{path}: truncated experience file")
+        self.slots = slots
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def close(self):
+        """Flush pending writes and release the memory map and the file"""
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+            self._file.close()
+
+    def _offset(self, slot):
+        return HEADER.size + slot * RECORD_SIZE
+
+    def _probe(self, key):
+        first = key % self.slots
+        for step in range(min(PROBE_LIMIT, self.slots)):
+            slot = (first + step) % self.slots
+            yield slot, RECORD.unpack_from(self._map, self._offset(slot))
+
+    def lookup(self, key):
+        """Return (depth, score, move) stored for a key, or None"""
+        for _, (entry_key, score, move, depth) in self._probe(key):
+            if depth == 0:
+                return None
+            if entry_key == key:
+                return depth, score, move
+        return None
+
+    def store(self, key, depth, score, move):
+        """Store a search result; keeps the deeper result when the key is already present"""
+        depth = max(1, min(depth, 255))
+        target = None
+        target_depth = None
+        for slot, (entry_key, _, _, entry_depth) in self._probe(key):
+            if entry_depth == 0 or entry_key == key:
+                if entry_key == key and entry_depth > depth:
+                    return False
+                target = slot
+                break
+            # Bảng đầy trong vùng dò: thay mục nông nhất
+            if target is None or entry_depth < target_depth:
+                target = slot
+                target_depth = entry_depth
+        else:
+            if target_depth > depth:
+                return False
+        RECORD.pack_into(self._map, self._offset(target), key, score, move, depth)
+        return True
+
+    def entries(self):
+        """Yield (key, depth, score, move) for every occupied slot"""
+        for slot in range(self.slots):
+            key, score, move, depth = RECORD.unpack_from(self._map, self._offset(slot))
+            if depth:
+                yield key, depth, score, move
+
+    def stats(self):
+        """Return slot usage and the number of entries per depth"""
+        depths = {}
+        for _, depth, _, _ in self.entries():
+            depths[depth] = depths.get(depth, 0) + 1
+        used = sum(depths.values())
+        return {
+            'slots': self.slots,
+            'used': used,
+            'fill': used / self.slots,
+            'bytes': HEADER.size + self.slots * RECORD_SIZE,
+            'depths': dict(sorted(depths.items()))
+        }
+
+def create_experience_file(path, slots=DEFAULT_SLOTS):
+    """Create an empty experience file with a fixed number of slots"""
+    with open(path, 'wb') as experience_file:
+        experience_file.write(HEADER.pack(MAGIC, VERSION, slots))
+        experience_file.truncate(HEADER.size + slots * RECORD_SIZE)
+
+def compact_experience_file(path, slots=None, min_depth=1):
+    """
+    Rewrite an experience file, dropping entries shallower than min_depth and
+    optionally changing the number of slots. Deeper entries are inserted first
+    so they survive when the new file is smaller. Returns (kept, dropped).
+    """
+    source = ExperienceFile(path)
+    try:
+        entries = sorted((entry for entry in source.entries() if entry[1] >= min_depth),
+                         key=lambda entry: entry[1], reverse=True)
+        total = source.stats()['used']
+        slots = slots or source.slots
+    finally:
+        source.close()
+    
+    temp_path = path + '.tmp'
+    create_experience_file(temp_path, slots)
+    target = ExperienceFile(temp_path)
+    kept = 0
+    try:
+        for key, depth, score, move in entries:
+            if target.store(key, depth, score, move):
+                kept += 1
+    finally:
+        target.close()
+    os.replace(temp_path, path)
+    return kept, total - kept
+
+# Tệp kinh nghiệm mặc định, mở khi cần lần đầu
+_default_experience = None
+_default_experience_loaded = False
+
+def get_default_experience():
+    """Open the experience file at EXPERIENCE_PATH once; returns None if there is no such file"""
+    global _default_experience, _default_experience_loaded
+    if not _default_experience_loaded:
+        _default_experience_loaded = True
+        if os.path.exists(EXPERIENCE_PATH):
+            try:
+                _default_experience = ExperienceFile(EXPERIENCE_PATH)
+                atexit.register(_default_experience.close)
+            except (OSError, ValueError):
+                _default_experience = None
+    return _default_experience
+
+def probe_experience(game_state, depth):
+    """Return a stored (start, end) move searched at least `depth` plies deep, or None"""
+    experience = get_default_experience()
+    if experience is None:
+        return None
+    entry = experience.lookup(game_state.get('hash') or compute_hash(game_state))
+    if entry is None or entry[0] < depth:
+        return None
+    
+    board = game_state['board']
+    start, end, _ = decode_move(entry[2], board)
+    piece = board.get(start)
+    # Kiểm tra lại tính hợp lệ để tránh trùng khóa
+    if piece and piece[1] == game_state['turn'] and end in get_valid_moves_considering_check(board, game_state, start):
+        return start, end
+    return None
+
+def record_experience(game_state, depth, score, move):
+    """Store the result of a completed search in the default experience file, if there is one"""
+    experience = get_default_experience()
+    if experience is None:
+        return False
+    start, end = move
+    piece_type = game_state['board'][start][0]
+    encoded = encode_move(start, end, None, piece_type)
+    return experience.store(game_state.get('hash') or compute_hash(game_state), depth, score, encoded)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the search experience file")
+    parser.add_argument('command', choices=('create', 'stats', 'compact'))
+    parser.add_argument('-f', '--file', default=EXPERIENCE_PATH, help="experience file")
+    parser.add_argument('--slots', type=int, help=f"number of 16-byte slots (default {DEFAULT_SLOTS} for create)")
+    parser.add_argument('--min-depth', type=int, default=1, help="drop shallower entries when compacting")
+    args = parser.parse_args(argv)
+    
+    if args.command == 'create':
+        create_experience_file(args.file, args.slots or DEFAULT_SLOTS)
+        print(f"Created {args.file} with {args.slots or DEFAULT_SLOTS} slots")
+    elif args.command == 'stats':
+        experience = ExperienceFile(args.file)
+        try:
+            stats = experience.stats()
+        finally:
+            experience.close()
+        print(f"{stats['used']}/{stats['slots']} slots used ({stats['fill']:.1%}), {stats['bytes']} bytes")
+        for depth, count in stats['depths'].items():
+            print(f"  depth {depth}: {count}")
+    else:
+        kept, dropped = compact_experience_file(args.file, args.slots, args.min_depth)
+        print(f"Kept {kept} entries, dropped {dropped}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+FEN (Forsyth-Edwards Notation) import and export for game states
+"""
+
+from src.board import CASTLING_SQUARES, build_game_state
+from src.pgn import parse_square, square_name
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+CASTLING_FLAGS = {
+    'K': 'white_king_side',
+    'Q': 'white_queen_side',
+    'k': 'black_king_side',
+    'q': 'black_queen_side'
+}
+
+# Ký tự FEN -> (loại quân, màu) và ngược lại
+FEN_PIECES = {ch: (ch.upper(), 'white' if ch.isupper() else 'black') for ch in 'PNBRQKpnbrqk'}
+PIECE_CHARS = {piece: ch for ch, piece in FEN_PIECES.items()}
+
+def parse_fen(fen):
+    """
+    Create a game state from a FEN string. The halfmove clock and fullmove number
+    may be omitted (as in EPD). Raises ValueError for malformed FEN, including a board
+    without exactly one king per side or an en passant square on the wrong rank.
+    Castling rights whose king or rook is not on its starting square are dropped.
+    """
+    fields = fen.split()
+    if len(fields) < 4:
+        raise ValueError(f"Invalid FEN (expected at least 4 fields): {fen}")
+    
+    ranks = fields[0].split('/')
+    if len(ranks) != 8:
+        raise ValueError(f"Invalid FEN board: {fields[0]}")
+    board = {}
+    for row, rank in enumerate(ranks):
+        col = 0
+        for ch in rank:
+            piece = FEN_PIECES.get(ch)
+            if piece is not None:
+                if col > 7:
+                    raise ValueError(f"Invalid FEN rank: {rank}")
+                board[(row, col)] = piece
+                col += 1
+            elif '1' <= ch <= '8':
+                col += ord(ch) - 48
+            else:
+                raise ValueError(f"Invalid FEN piece: {ch}")
+        if col != 8:
+            raise ValueError(f"Invalid FEN rank: {rank}")
+    kings = sorted(color for piece_type, color in board.values() if piece_type == 'K')
+    if kings != ['black', 'white']:
+        raise ValueError(f"Invalid FEN board (expected one king per side): {fields[0]}")
+    
+    if fields[1] not in ('w', 'b'):
+        raise ValueError(f"Invalid FEN side to move: {fields[1]}")
+    turn = 'white' if fields[1] == 'w' else 'black'
+    
+    if fields[2] != '-' and not set(fields[2]) <= CASTLING_FLAGS.keys():
+        raise ValueError(f"Invalid FEN castling rights: {fields[2]}")
+    castling_rights = {right: flag in fields[2] for flag, right in CASTLING_FLAGS.items()}
+    # Bỏ quyền nhập thành khi vua hoặc xe không còn ở ô ban đầu
+    for (row, col), rights in CASTLING_SQUARES.items():
+        if board.get((row, col)) != ('K' if col == 4 else 'R', 'white' if row == 7 else 'black'):
+            for right in rights:
+                castling_rights[right] = False
+    
+    # Ô bắt tốt qua đường nằm sau con tốt vừa đi hai ô: hàng 6 khi trắng đi, hàng 3 khi đen đi
+    en_passant_target = None
+    if fields[3] != '-':
+        if len(fields[3]) != 2 or fields[3][0] not in 'abcdefgh' or fields[3][1] != ('6' if turn == 'white' else '3'):
+            raise ValueError(f"Invalid FEN en passant square: {fields[3]}")
+        en_passant_target = parse_square(fields[3])
+    
+    halfmove_clock = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+    fullmove_number = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+    
+    return build_game_state(board, turn, castling_rights, en_passant_target, halfmove_clock, fullmove_number)
+
+def to_fen(game_state):
+    """Serialize a game state to a FEN string"""
+    board = game_state['board']
+    ranks = []
+    for row in range(8):
+        rank = ''
+        empty = 0
+        for col in range(8):
+            piece = board.get((row, col))
+            if piece is None:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += PIECE_CHARS[piece]
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+    
+    rights = game_state['castling_rights']
+    castling = ''.join(flag for flag, right in CASTLING_FLAGS.items() if rights.get(right)) or '-'
+    en_passant_target = game_state.get('en_passant_target')
+    en_passant = square_name(en_passant_target) if en_passant_target else '-'
+    
+    return ' '.join([
+        '/'.join(ranks),
+        'w' if game_state['turn'] == 'white' else 'b',
+        castling,
+        en_passant,
+        str(game_state.get('halfmove_clock', 0)),
+        str(game_state.get('fullmove_number', 1))
+    ])
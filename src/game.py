@@ -5,18 +5,22 @@ Game management using logical programming approach
 import pygame
 import time
 from src.constants import DARK_SQUARE, FPS, HEADER_HEIGHT, HIGHLIGHT, LIGHT_SQUARE, MOVE_HIGHLIGHT, WIDTH, HEIGHT, BLACK, WHITE, SQUARE_SIZE
-from src.board import create_game_state, draw_board, select_piece, move_piece
-from src.ai import find_best_move
+from src.board import create_game_state, select_piece, move_piece
 from src.pieces import is_check, is_checkmate, is_stalemate
 from src.menu import MainMenu, PauseMenu, PromotionMenu, GameOverMenu
-from src.assets import load_piece_image
+from src.assets import load_piece_image, wait_for_piece_images
 
 class Game:
     """Main game class to manage the chess game"""
     
-    def __init__(self, screen):
-        """Initialize the game"""
+    def __init__(self, screen, start_fen=None, on_first_frame=None):
+        """
+        Initialize the game; start_fen optionally sets the starting position and
+        on_first_frame is called once the main menu has been drawn for the first time
+        """
         self.screen = screen
+        self.start_fen = start_fen
+        self.on_first_frame = on_first_frame
         self.clock = pygame.time.Clock()
         self.running = True
         self.game_active = False
@@ -37,7 +41,8 @@ class Game:
         
     def show_main_menu(self):
         """Show the main menu to select options"""
-        main_menu = MainMenu(self.screen)
+        main_menu = MainMenu(self.screen, self.on_first_frame)
+        self.on_first_frame = None
         result = main_menu.run()
         
         if result['action'] == 'quit':
@@ -49,14 +54,20 @@ class Game:
             
     def start_new_game(self):
         """Start a new game with current settings"""
-        self.game_state = create_game_state()
+        # AI và FEN được import khi cần để menu chính hiện ra nhanh hơn
+        from src.ai import reset_caches
+        from src.fen import parse_fen
+        
+        self.game_state = parse_fen(self.start_fen) if self.start_fen else create_game_state()
+        reset_caches()  # Cache của AI chỉ dùng lại giữa các nước trong cùng một ván
+        wait_for_piece_images()
         self.game_active = True
         self.game_over = False
         self.promotion_pending = False
         self.pending_move = None
         
-        # If player is black, let AI make the first move
-        if self.player_color == 'black':
+        # If it is not the player's turn, let AI make the first move
+        if self.game_state['turn'] != self.player_color:
             self.ai_thinking = True
         
     def show_pause_menu(self):
@@ -185,7 +196,7 @@ class Game:
             return True
         
         # Check for insufficient material
-        if is_insufficient_material(board):
+        if is_insufficient_material(self.game_state):
             self.game_over = True
             self.show_game_over_menu('draw_insufficient')
             return True
@@ -207,6 +218,8 @@ class Game:
     def make_ai_move(self):
         """Let the AI make a move"""
         if self.ai_thinking and self.game_state and self.game_state['turn'] != self.player_color:
+            from src.ai import find_best_move
+            
             # Add a slight delay to create the feeling of "thinking"
             time.sleep(0.5)
             
@@ -0,0 +1,308 @@
+"""
+Headless self-play matches between two engine configurations
+
+Both engines are find_best_move with different search profiles (see
+ai.DIFFICULTY_PROFILES). Every opening is played twice with colours swapped,
+and only once: the engines are deterministic, so replaying an opening would
+repeat the same games. Games run concurrently on a process pool, and all draw
+rules from src/endgame.py are applied. The match reports the Elo difference of engine 1
+over engine 2 and stops early once a sequential probability ratio test (SPRT)
+accepts one of its hypotheses.
+
+    python -m src.match --engine1 nodes=5000,max_depth=4 --engine2 depth=3 \\
+        --games 400 --sprt 0 10 --workers 8 --pgn match.pgn
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from multiprocessing import Pool
+from src import ai
+from src.bench import BENCH_POSITIONS
+from src.board import move_piece
+from src.endgame import is_insufficient_material, is_threefold_repetition, is_fifty_move_rule
+from src.epd import parse_epd
+from src.fen import START_FEN, parse_fen, to_fen
+from src.pgn import move_to_san, parse_san, read_games, start_state, write_games
+from src.pieces import is_check
+from src.records import GameRecordWriter
+
+# Thế cờ khai cuộc mặc định: các thế khai cuộc và trung cuộc của bộ bench
+DEFAULT_OPENINGS = BENCH_POSITIONS[:13]
+
+# Số nửa nước tối đa của một ván, sau đó xử hòa
+DEFAULT_MAX_PLIES = 300
+
+def parse_engine(text):
+    """
+    Parse an engine configuration such as 'depth=3,noise=0' or 'nodes=20000,max_depth=5'.
+    'depth=N' starts from DIFFICULTY_PROFILES[N]; other keys override profile fields.
+    The opening book and the experience file are always disabled.
+    """
+    options = {}
+    for item in filter(None, text.split(',')):
+        key, _, value = item.partition('=')
+        if value in ('none', 'None'):
+            options[key] = None
+        elif value in ('true', 'false'):
+            options[key] = value == 'true'
+        else:
+            try:
+                options[key] = int(value)
+            except ValueError:
+                options[key] = float(value)
+    
+    depth = options.pop('depth', None)
+    if depth is not None and depth not in ai.DIFFICULTY_PROFILES:
+        raise ValueError(f"Unknown difficulty level: {depth}")
+    profile = dict(ai.DIFFICULTY_PROFILES[depth]) if depth is not None else {'nodes': None, 'max_depth': 3, 'noise': 0}
+    profile.update(options)
+    profile['book'] = False
+    profile['experience'] = False
+    return profile
+
+def load_openings(path, plies=8):
+    """Opening positions from a file: one FEN/EPD per line, or a PGN file cut after `plies` plies"""
+    openings = []
+    if path.endswith('.pgn'):
+        for game in read_games(path):
+            game_state = start_state(game['headers'])
+            for san in game['moves'][:plies]:
+                try:
+                    start, end, promotion = parse_san(game_state, san)
+                except ValueError:
+                    break
+                game_state = move_piece(game_state, start, end, promotion or 'Q')
+            openings.append(to_fen(game_state))
+        return openings
+    
+    with open(path, encoding='utf-8') as opening_file:
+        for line in opening_file:
+            fields = line.split()
+            if not fields or line.startswith('#'):
+                continue
+            if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+                openings.append(' '.join(fields[:6]))
+            else:
+                openings.append(parse_epd(line)['fen'])
+    return openings
+
+def game_over(game_state, legal_moves):
+    """Return (result, reason) if the game has ended, otherwise None"""
+    color = game_state['turn']
+    if not legal_moves:
+        if is_check(game_state['board'], game_state, color):
+            return ('0-1' if color == 'white' else '1-0'), 'checkmate'
+        return '1/2-1/2', 'stalemate'
+    if is_insufficient_material(game_state):
+        return '1/2-1/2', 'insufficient material'
+    if is_threefold_repetition(game_state):
+        return '1/2-1/2', 'threefold repetition'
+    if is_fifty_move_rule(game_state):
+        return '1/2-1/2', 'fifty-move rule'
+    return None
+
+def play_game(task):
+    """
+    Play one game (task = (index, opening_fen, white_profile, black_profile, max_plies)).
+    Returns {'index', 'opening', 'result', 'reason', 'plies', 'moves': [SAN, ...], 'history'}
+    where 'history' is the game's move_history.
+    """
+    index, opening, white_profile, black_profile, max_plies = task
+    game_state = parse_fen(opening)
+    profiles = {'white': white_profile, 'black': black_profile}
+    
+    # Mỗi engine có bộ cache riêng, giữ lại giữa các nước của nó như khi chơi một ván bình thường
+    engines = {color: ai.SearchCaches() for color in profiles}
+    
+    moves = []
+    result, reason = '1/2-1/2', 'max plies'
+    for _ in range(max_plies):
+        color = game_state['turn']
+        legal_moves = ai.get_all_valid_moves(game_state['board'], game_state, color)
+        ended = game_over(game_state, legal_moves)
+        if ended:
+            result, reason = ended
+            break
+        
+        move = ai.find_best_move(game_state, profiles[color]['max_depth'], profiles[color], engines[color])
+        if move not in legal_moves:
+            # Không thể xảy ra với engine đúng; xử thua để không làm hỏng trận đấu
+            result, reason = ('0-1' if color == 'white' else '1-0'), 'illegal move'
+            break
+        moves.append(move_to_san(game_state, *move))
+        game_state = move_piece(game_state, *move)
+    
+    return {'index': index, 'opening': opening, 'result': result, 'reason': reason,
+            'plies': len(moves), 'moves': moves, 'history': game_state['move_history']}
+
+def score_to_elo(score):
+    """Elo difference corresponding to an expected score in (0, 1)"""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+def elo_to_score(elo):
+    """Expected score for an Elo difference"""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def elo_estimate(wins, draws, losses):
+    """Return (elo, error) where error is the 95% confidence half-width, from engine 1's point of view"""
+    games = wins + draws + losses
+    if not games:
+        return 0.0, float('inf')
+    score = (wins + draws / 2) / games
+    variance = (wins + draws / 4) / games - score ** 2
+    margin = 1.96 * math.sqrt(max(variance, 0) / games)
+    low = score_to_elo(score - margin)
+    high = score_to_elo(score + margin)
+    return score_to_elo(score), (high - low) / 2
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """
+    Log-likelihood ratio of H1 (elo = elo1) against H0 (elo = elo0) for a
+    win/draw/loss record, using the normal approximation of the trinomial model.
+    """
+    if not wins + draws + losses:
+        return 0.0
+    if wins + losses == 0 or wins + draws == 0 or draws + losses == 0:
+        # Mọi ván cùng một kết quả: phương sai bằng 0, thêm nửa ván thắng và nửa ván thua để ước lượng được
+        wins += 0.5
+        losses += 0.5
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins + draws / 4) / games - score ** 2
+    score0 = elo_to_score(elo0)
+    score1 = elo_to_score(elo1)
+    return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance / games)
+
+def sprt_bounds(alpha=0.05, beta=0.05):
+    """(lower, upper) LLR bounds: below lower accept H0, above upper accept H1"""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+def run_match(engine1, engine2, openings=DEFAULT_OPENINGS, games=100, workers=None,
+              max_plies=DEFAULT_MAX_PLIES, sprt=None, callback=None):
+    """
+    Play up to `games` games between two profiles, each opening with both colours.
+    At most 2 * len(openings) games are played, since a replayed opening gives the same game.
+    sprt = (elo0, elo1, alpha, beta) stops the match once the LLR leaves its bounds.
+    callback(report) is called after every finished game.
+    Returns {'wins', 'draws', 'losses', 'games', 'elo', 'error', 'llr', 'sprt', 'time', 'results'}
+    from engine 1's point of view; 'sprt' is 'H0', 'H1' or None.
+    """
+    # Engine tất định: chơi lại một khai cuộc cho ra đúng ván cũ, không phải mẫu độc lập
+    games = min(games, 2 * len(openings))
+    tasks = []
+    for index in range(games):
+        opening = openings[index // 2]
+        # Ván chẵn: engine 1 cầm trắng, ván lẻ: đổi màu với cùng khai cuộc
+        if index % 2 == 0:
+            tasks.append((index, opening, engine1, engine2, max_plies))
+        else:
+            tasks.append((index, opening, engine2, engine1, max_plies))
+    
+    report = {'wins': 0, 'draws': 0, 'losses': 0, 'games': 0, 'elo': 0.0, 'error': float('inf'),
+              'llr': 0.0, 'sprt': None, 'time': 0.0, 'results': []}
+    bounds = sprt_bounds(*sprt[2:]) if sprt else None
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    pool = Pool(min(workers, games)) if workers > 1 else None
+    try:
+        results = pool.imap_unordered(play_game, tasks) if pool else map(play_game, tasks)
+        for result in results:
+            engine1_white = result['index'] % 2 == 0
+            if result['result'] == '1/2-1/2':
+                report['draws'] += 1
+            elif (result['result'] == '1-0') == engine1_white:
+                report['wins'] += 1
+            else:
+                report['losses'] += 1
+            report['games'] += 1
+            report['results'].append(result)
+            report['elo'], report['error'] = elo_estimate(report['wins'], report['draws'], report['losses'])
+            report['time'] = time.perf_counter() - start
+            if sprt:
+                report['llr'] = sprt_llr(report['wins'], report['draws'], report['losses'], sprt[0], sprt[1])
+                if report['llr'] <= bounds[0]:
+                    report['sprt'] = 'H0'
+                elif report['llr'] >= bounds[1]:
+                    report['sprt'] = 'H1'
+            if callback:
+                callback(report)
+            if report['sprt']:
+                break
+    finally:
+        if pool:
+            pool.terminate()
+    
+    report['results'].sort(key=lambda result: result['index'])
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a headless match between two engine configurations")
+    parser.add_argument('--engine1', default='depth=3', help="profile of the engine under test, e.g. nodes=5000,max_depth=4")
+    parser.add_argument('--engine2', default='depth=3', help="profile of the reference engine")
+    parser.add_argument('--games', type=int, default=100, help="maximum number of games")
+    parser.add_argument('--openings', help="FEN/EPD file (one position per line) or PGN file")
+    parser.add_argument('--opening-plies', type=int, default=8, help="plies taken from each PGN opening")
+    parser.add_argument('--max-plies', type=int, default=DEFAULT_MAX_PLIES, help="adjudicate a draw after this many plies")
+    parser.add_argument('--workers', type=int, help="number of processes (default: all CPUs)")
+    parser.add_argument('--sprt', nargs=2, type=float, metavar=('ELO0', 'ELO1'), help="stop with an SPRT of H0: elo0 against H1: elo1")
+    parser.add_argument('--alpha', type=float, default=0.05, help="SPRT false positive rate")
+    parser.add_argument('--beta', type=float, default=0.05, help="SPRT false negative rate")
+    parser.add_argument('--pgn', help="write the games to this PGN file")
+    parser.add_argument('--records', help="append the games to this binary game record file")
+    args = parser.parse_args(argv)
+    
+    try:
+        engine1 = parse_engine(args.engine1)
+        engine2 = parse_engine(args.engine2)
+    except ValueError as error:
+        parser.error(str(error))
+    openings = load_openings(args.openings, args.opening_plies) if args.openings else DEFAULT_OPENINGS
+    sprt = (args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+    if args.games > 2 * len(openings):
+        print(f"Warning: only {2 * len(openings)} distinct games from {len(openings)} openings;"
+              f" use --openings with more positions to play {args.games}", file=sys.stderr)
+
+    def progress(report):
+        line = (f"Games {report['games']:4d}  +{report['wins']} ={report['draws']} -{report['losses']}"
+                f"  Elo {report['elo']:+.1f} +/- {report['error']:.1f}")
+        if sprt:
+            lower, upper = sprt_bounds(args.alpha, args.beta)
+            line += f"  LLR {report['llr']:.2f} [{lower:.2f}, {upper:.2f}]"
+        print(line, flush=True)
+    
+    report = run_match(engine1, engine2, openings, args.games, args.workers, args.max_plies, sprt, progress)
+    print("===========================")
+    print(f"Score          : +{report['wins']} ={report['draws']} -{report['losses']} ({report['games']} games)")
+    print(f"Elo            : {report['elo']:+.1f} +/- {report['error']:.1f}")
+    if sprt:
+        verdict = {'H1': 'H1 accepted (engine 1 is stronger)', 'H0': 'H0 accepted', None: 'inconclusive'}[report['sprt']]
+        print(f"SPRT           : {verdict}")
+    print(f"Time (s)       : {report['time']:.1f}")
+    
+    if args.pgn:
+        games = []
+        for result in report['results']:
+            engine1_white = result['index'] % 2 == 0
+            headers = {
+                'Event': 'Self-play match',
+                'Round': str(result['index'] + 1),
+                'White': 'engine1' if engine1_white else 'engine2',
+                'Black': 'engine2' if engine1_white else 'engine1',
+                'Termination': result['reason']
+            }
+            if result['opening'] != START_FEN:
+                headers['SetUp'] = '1'
+                headers['FEN'] = result['opening']
+            games.append({'headers': headers, 'moves': result['moves'], 'result': result['result']})
+        write_games(args.pgn, games)
+    if args.records:
+        with GameRecordWriter(args.records) as writer:
+            for result in report['results']:
+                writer.append(result['history'], result['result'], result['opening'])
+
+if __name__ == '__main__':
+    main()
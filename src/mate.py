@@ -0,0 +1,253 @@
+"""
+Mate solver using depth-first proof-number search (df-pn)
+
+Answers "can a side force mate within N moves?" and returns the mating line.
+The search runs on the legal move generator in src/pieces.py and keeps its
+proof/disproof numbers in its own bounded node table keyed by
+(Zobrist key, attacker moves left). Mate lengths are tried from 1 to N, so
+the first proof found is the shortest mate.
+
+    solver = MateSolver()
+    result = solver.solve(game_state, 5, max_nodes=100000, max_time=10)
+    result['status']  # 'mate', 'no_mate' or 'unknown' (budget exhausted)
+"""
+
+import time
+from src.board import make_hypothetical_move
+from src.pieces import get_valid_moves_considering_check, is_king_in_check_simple
+from src.zobrist import compute_hash
+
+# Số chứng minh/phản chứng vô hạn
+INFINITY = 10 ** 9
+
+# Số mục tối đa của bảng nút
+MATE_TABLE_SIZE = 1 << 18
+
+class BudgetExceeded(Exception):
+    """Raised inside the search when the node or time budget runs out"""
+
+class MateSolver:
+    """
+    df-pn mate solver with a bounded node table.
+    Table entries are (phi, delta) from the point of view of the side to move:
+    phi = 0 means the side to move wins, delta = 0 means it loses.
+    """
+
+    def __init__(self, max_entries=MATE_TABLE_SIZE):
+        self.max_entries = max_entries
+        self.table = {}
+        self.nodes = 0
+        self._max_nodes = None
+        self._deadline = None
+
+    def clear(self):
+        """Forget all stored proof numbers"""
+        self.table.clear()
+
+    def _lookup(self, key):
+        return self.table.get(key, (1, 1))
+
+    def _store(self, key, phi, delta):
+        table = self.table
+        if key not in table and len(table) >= self.max_entries:
+            # Bảng đầy: bỏ một phần tư số mục cũ nhất, ưu tiên các mục chưa giải xong
+            count = max(1, self.max_entries // 4)
+            stale = [k for k, (p, d) in table.items() if p and d][:count]
+            if not stale:
+                stale = list(table)[:count]
+            for k in stale:
+                del table[k]
+        table[key] = (phi, delta)
+
+    def _legal_moves(self, state):
+        board = state['board']
+        color = state['turn']
+        moves = []
+        for pos, piece in list(board.items()):
+            if piece[1] == color:
+                for end in get_valid_moves_considering_check(board, state, pos):
+                    moves.append((pos, end))
+        return moves
+
+    def _in_check(self, state):
+        color = state['turn']
+        king_pos = state['white_king_pos'] if color == 'white' else state['black_king_pos']
+        opponent = 'black' if color == 'white' else 'white'
+        return is_king_in_check_simple(state['board'], king_pos, opponent)
+
+    def _expand(self, state, moves_left, attacker):
+        """
+        Generate the children of a node as [(move, child_state, child_key)],
+        or return the terminal (phi, delta) if the node is decided without search.
+        """
+        attacker_to_move = state['turn'] == attacker
+        if not attacker_to_move and moves_left == 0 and not self._in_check(state):
+            # Bên tấn công đã hết nước mà đối phương chưa bị chiếu: không chiếu hết được
+            return None, (0, INFINITY)
+
+        moves = self._legal_moves(state)
+        if not moves:
+            if attacker_to_move or not self._in_check(state):
+                # Bên tấn công hết nước đi, hoặc bên phòng thủ bị hết nước (hòa)
+                return None, (INFINITY, 0) if attacker_to_move else (0, INFINITY)
+            # Chiếu hết
+            return None, (INFINITY, 0)
+        if not attacker_to_move and moves_left == 0:
+            # Bị chiếu nhưng vẫn còn nước thoát
+            return None, (0, INFINITY)
+
+        child_moves_left = moves_left - 1 if attacker_to_move else moves_left
+        children = []
+        for move in moves:
+            child = make_hypothetical_move(state, *move)
+            children.append((move, child, (child['hash'], child_moves_left)))
+        return children, None
+
+    def _check_budget(self):
+        self.nodes += 1
+        if self._max_nodes is not None and self.nodes > self._max_nodes:
+            raise BudgetExceeded()
+        if self._deadline is not None and self.nodes % 64 == 0 and time.time() > self._deadline:
+            raise BudgetExceeded()
+
+    def _mid(self, state, key, moves_left, attacker, threshold_phi, threshold_delta):
+        """Multiple iterative deepening: search a node until its phi or delta reaches the thresholds"""
+        phi, delta = self._lookup(key)
+        if phi >= threshold_phi or delta >= threshold_delta:
+            return
+
+        self._check_budget()
+        children, terminal = self._expand(state, moves_left, attacker)
+        if children is None:
+            self._store(key, *terminal)
+            return
+
+        while True:
+            # phi của nút = delta nhỏ nhất của con, delta của nút = tổng phi của con
+            phi = INFINITY
+            delta = 0
+            best = None
+            best_phi = 0
+            second_delta = INFINITY
+            for index, (_, _, child_key) in enumerate(children):
+                child_phi, child_delta = self._lookup(child_key)
+                delta += child_phi
+                if child_delta < phi:
+                    second_delta = phi
+                    phi = child_delta
+                    best = index
+                    best_phi = child_phi
+                elif child_delta < second_delta:
+                    second_delta = child_delta
+            delta = min(delta, INFINITY)
+            self._store(key, phi, delta)
+
+            if phi >= threshold_phi or delta >= threshold_delta:
+                return
+
+            _, child, child_key = children[best]
+            child_threshold_phi = min(INFINITY, threshold_delta + best_phi - delta)
+            child_threshold_delta = min(threshold_phi, second_delta + 1)
+            self._mid(child, child_key, child_key[1], attacker, child_threshold_phi, child_threshold_delta)
+
+    def _attacker_wins(self, key, attacker_to_move):
+        entry = self.table.get(key)
+        if entry is None:
+            return False
+        return entry[0] == 0 if attacker_to_move else entry[1] == 0
+
+    def _mate_length(self, state, max_moves, attacker):
+        """Shortest forced mate (in attacker moves, at most max_moves) from a position, or None"""
+        attacker_to_move = state['turn'] == attacker
+        for moves_left in range(1 if attacker_to_move else 0, max_moves + 1):
+            key = (state['hash'], moves_left)
+            self._mid(state, key, moves_left, attacker, INFINITY, INFINITY)
+            if self._attacker_wins(key, attacker_to_move):
+                return moves_left
+        return None
+
+    def _principal_line(self, state, moves_left, attacker):
+        """
+        Follow the proof tree: fastest mate for the attacker, longest resistance for the defender.
+        If the budget runs out while the line is rebuilt, the part found so far is returned.
+        """
+        line = []
+        try:
+            self._follow_line(state, moves_left, attacker, line)
+        except BudgetExceeded:
+            # Chiếu hết đã được chứng minh, chỉ có đường đi là chưa trọn vẹn
+            pass
+        return line
+
+    def _follow_line(self, state, moves_left, attacker, line):
+        while True:
+            children, _ = self._expand(state, moves_left, attacker)
+            if not children:
+                break
+            attacker_to_move = state['turn'] == attacker
+            child_moves_left = moves_left - 1 if attacker_to_move else moves_left
+
+            chosen = None
+            chosen_length = None
+            for move, child, child_key in children:
+                # Với bên tấn công chỉ xét các nước đã được chứng minh
+                if attacker_to_move and not self._attacker_wins(child_key, False):
+                    continue
+                length = self._mate_length(child, child_moves_left, attacker)
+                if length is None:
+                    continue
+                if chosen is None or (length < chosen_length if attacker_to_move else length > chosen_length):
+                    chosen = (move, child, length)
+                    chosen_length = length
+            if chosen is None:
+                # Mục của bảng đã bị thay thế: dừng ở đây
+                break
+
+            move, state, moves_left = chosen
+            line.append(move)
+
+    def solve(self, game_state, max_moves, color=None, max_nodes=None, max_time=None):
+        """
+        Search for a forced mate by `color` (default: the side to move) within max_moves moves.
+        Returns {'status': 'mate'|'no_mate'|'unknown', 'moves': n or None,
+        'line': [(start, end), ...], 'nodes': int, 'time': seconds}.
+        'unknown' means the node/time budget ran out first; a 'mate' line can be
+        shorter than the mate if the budget ran out while it was being rebuilt.
+        """
+        attacker = color or game_state['turn']
+        if game_state.get('hash') is None:
+            game_state = dict(game_state, hash=compute_hash(game_state))
+        attacker_to_move = game_state['turn'] == attacker
+
+        start_time = time.time()
+        self.nodes = 0
+        self._max_nodes = max_nodes
+        self._deadline = start_time + max_time if max_time is not None else None
+
+        status = 'no_mate'
+        mate_moves = None
+        line = []
+        try:
+            # Thử lần lượt chiếu hết sau 1, 2, ... nước để tìm đường ngắn nhất
+            for moves in range(1, max_moves + 1):
+                key = (game_state['hash'], moves)
+                self._mid(game_state, key, moves, attacker, INFINITY, INFINITY)
+                if self._attacker_wins(key, attacker_to_move):
+                    status = 'mate'
+                    mate_moves = moves
+                    line = self._principal_line(game_state, moves, attacker)
+                    break
+        except BudgetExceeded:
+            status = 'unknown'
+
+        return {
+            'status': status,
+            'moves': mate_moves,
+            'line': line,
+            'nodes': self.nodes,
+            'time': time.time() - start_time
+        }
+
+def find_mate(game_state, max_moves, color=None, max_nodes=200000, max_time=None):
+    """Convenience wrapper: solve one position with a fresh solver"""
+    return MateSolver().solve(game_state, max_moves, color, max_nodes, max_time)
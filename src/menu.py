@@ -53,8 +53,9 @@ class Button:
 
 class MainMenu:
     """Main menu screen with options to select side and difficulty"""
-    def __init__(self, screen):
+    def __init__(self, screen, on_first_frame=None):
         self.screen = screen
+        self.on_first_frame = on_first_frame  # Gọi một lần sau khi khung hình đầu tiên được hiển thị
         self.clock = pygame.time.Clock()
         self.running = True
         self.player_color = 'white'
@@ -198,6 +199,9 @@ class MainMenu:
                     return result
             
             self.draw()
+            if self.on_first_frame:
+                self.on_first_frame()
+                self.on_first_frame = None
         
         return result
 
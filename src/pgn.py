@@ -0,0 +1,384 @@
+"""
+PGN reading and writing, SAN move parsing and generation
+
+Games are streamed one at a time in both directions, so multi-gigabyte files
+can be processed in constant memory:
+
+    games = read_games('in.pgn')
+    write_games('out.pgn', games)
+    
+    python -m src.pgn games.pgn   # reading/writing speed in games/second
+"""
+
+import argparse
+import re
+import time
+from src.board import create_game_state, make_hypothetical_move, move_piece
+from src import pieces
+from src.pieces import get_valid_moves, get_valid_moves_considering_check, is_check, is_checkmate, is_king_in_check_simple
+
+FILES = 'abcdefgh'
+
+# Token của phần nước đi: chú thích, biến, NAG, số nước, kết quả và nước đi SAN
+_TOKEN_RE = re.compile(r'\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|\d+\.+|1-0|0-1|1/2-1/2|\*|[^\s(){};]+')
+_HEADER_RE = re.compile(r'\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]')
+_MOVE_NUMBER_RE = re.compile(r'^\d+\.+$')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+# Bảy header bắt buộc theo chuẩn PGN, theo đúng thứ tự
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+LINE_LENGTH = 79
+
+def square_name(pos):
+    """Convert a (row, col) position to algebraic notation, e.g. (7, 4) -> 'e1'"""
+    row, col = pos
+    return f"{FILES[col]}{8 - row}"
+
+def parse_square(name):
+    """Convert algebraic notation to a (row, col) position, e.g. 'e1' -> (7, 4). Raises ValueError for an invalid square"""
+    if len(name) != 2 or name[0] not in FILES or name[1] not in '12345678':
+        raise ValueError(f"Invalid square: {name}")
+    return (8 - int(name[1]), FILES.index(name[0]))
+
+def read_games(source):
+    """
+    Stream games from a PGN file path or an open text file.
+    Yields dicts {'headers': {...}, 'moves': [SAN, ...], 'result': str} one game at a time,
+    without loading the whole file into memory.
+    """
+    if isinstance(source, str):
+        with open(source, encoding='utf-8', errors='replace') as pgn_file:
+            yield from read_games(source=pgn_file)
+        return
+    
+    headers = {}
+    movetext = []
+    for line in source:
+        stripped = line.strip()
+        if stripped.startswith('['):
+            # Gặp header mới sau phần nước đi: kết thúc ván trước
+            if movetext:
+                yield _make_game(headers, movetext)
+                headers = {}
+                movetext = []
+            match = _HEADER_RE.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2)
+        elif stripped and not stripped.startswith('%'):
+            movetext.append(line)
+    
+    if headers or movetext:
+        yield _make_game(headers, movetext)
+
+def _make_game(headers, movetext):
+    """Tách phần nước đi thành danh sách SAN, bỏ chú thích, biến phụ và NAG"""
+    moves = []
+    result = headers.get('Result', '*')
+    variation_depth = 0
+    for token in _TOKEN_RE.findall(''.join(movetext)):
+        if token == '(':
+            variation_depth += 1
+        elif token == ')':
+            variation_depth = max(0, variation_depth - 1)
+        elif variation_depth or token[0] in '{;$' or _MOVE_NUMBER_RE.match(token):
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return {'headers': headers, 'moves': moves, 'result': result}
+
+def parse_san(game_state, san):
+    """
+    Convert a SAN move (e.g. 'Nf3', 'exd5', 'O-O', 'e8=Q+') to (start, end, promotion_piece)
+    using the legal move generator. Raises ValueError if the move is illegal or ambiguous.
+    """
+    board = game_state['board']
+    color = game_state['turn']
+    text = san.rstrip('+#!?')
+    
+    # Nhập thành
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        row = 7 if color == 'white' else 0
+        start = (row, 4)
+        end = (row, 6) if len(text) == 3 else (row, 2)
+        if board.get(start) == ('K', color) and end in get_valid_moves_considering_check(board, game_state, start):
+            return start, end, None
+        raise ValueError(f"Illegal castling move: {san}")
+    
+    promotion = None
+    if '=' in text:
+        text, promotion = text.split('=')
+        promotion = promotion[:1].upper()
+    elif len(text) > 2 and text[-1] in 'QRBN' and text[-2] in '18':
+        # Một số file PGN viết phong cấp không có dấu '=' (e8Q)
+        text, promotion = text[:-1], text[-1]
+    
+    piece_type = text[0] if text[0] in 'KQRBN' else 'P'
+    if piece_type != 'P':
+        text = text[1:]
+    text = text.replace('x', '').replace('-', '')
+    if len(text) < 2:
+        raise ValueError(f"Invalid SAN move: {san}")
+    
+    try:
+        end = parse_square(text[-2:])
+    except ValueError:
+        raise ValueError(f"Invalid SAN move: {san}") from None
+    disambiguation = text[:-2]
+    
+    candidates = []
+    for pos, piece in board.items():
+        if piece != (piece_type, color):
+            continue
+        if disambiguation:
+            name = square_name(pos)
+            if any(ch not in name for ch in disambiguation):
+                continue
+        if _is_legal(game_state, pos, end):
+            candidates.append(pos)
+    
+    if len(candidates) != 1:
+        reason = 'Illegal' if not candidates else 'Ambiguous'
+        raise ValueError(f"{reason} SAN move: {san}")
+    
+    if piece_type == 'P' and end[0] in (0, 7) and promotion is None:
+        promotion = 'Q'
+    return candidates[0], end, promotion
+
+def _is_legal(game_state, start, end):
+    """
+    Kiểm tra một nước đi cụ thể: sinh nước giả hợp lệ của quân rồi chỉ thử nước đó,
+    nhanh hơn sinh toàn bộ nước hợp lệ của quân bằng get_valid_moves_considering_check
+    """
+    board = game_state['board']
+    if end not in get_valid_moves(board, game_state, start):
+        return False
+    new_state = pieces.make_hypothetical_move(game_state, start, end)
+    return not is_check(new_state['board'], new_state, board[start][1])
+
+def start_state(headers):
+    """Starting position of a game: the FEN header if present, otherwise the initial position"""
+    fen = headers.get('FEN')
+    if fen:
+        from src.fen import parse_fen
+        return parse_fen(fen)
+    return create_game_state()
+
+def iter_game_states(game, max_ply=None):
+    """
+    Replay a game read by read_games from its starting position.
+    Yields (game_state, (start, end, promotion)) before each move is played;
+    stops at the first illegal move.
+    """
+    game_state = start_state(game['headers'])
+    for ply, san in enumerate(game['moves']):
+        if max_ply is not None and ply >= max_ply:
+            break
+        try:
+            move = parse_san(game_state, san)
+        except ValueError:
+            break
+        yield game_state, move
+        start, end, promotion = move
+        game_state = move_piece(game_state, start, end, promotion or 'Q')
+
+def move_to_san(game_state, start, end, promotion=None):
+    """
+    Convert a legal move to SAN (e.g. 'Nbd7', 'exd5', 'O-O', 'e8=Q+') in the position
+    before it is played.
+    """
+    board = game_state['board']
+    piece_type, color = board[start]
+    opponent = 'black' if color == 'white' else 'white'
+    
+    if piece_type == 'K' and abs(start[1] - end[1]) == 2:
+        san = 'O-O' if end[1] > start[1] else 'O-O-O'
+    elif piece_type == 'P':
+        san = square_name(end)
+        if start[1] != end[1]:
+            # Bắt quân (kể cả bắt tốt qua đường)
+            san = f"{FILES[start[1]]}x{san}"
+        if end[0] in (0, 7):
+            san += '=' + (promotion or 'Q')
+    else:
+        # Chỉ cần phân biệt với các quân cùng loại cũng đi được tới ô đích
+        rivals = [pos for pos, piece in board.items()
+                  if piece == (piece_type, color) and pos != start and _is_legal(game_state, pos, end)]
+        disambiguation = ''
+        if rivals:
+            if all(pos[1] != start[1] for pos in rivals):
+                disambiguation = FILES[start[1]]
+            elif all(pos[0] != start[0] for pos in rivals):
+                disambiguation = str(8 - start[0])
+            else:
+                disambiguation = square_name(start)
+        capture = 'x' if end in board else ''
+        san = f"{piece_type}{disambiguation}{capture}{square_name(end)}"
+    
+    # Chiếu / chiếu hết: chỉ sinh nước đi của đối phương khi nước này là nước chiếu
+    new_state = make_hypothetical_move(game_state, start, end)
+    if promotion and promotion != 'Q' and piece_type == 'P' and end[0] in (0, 7):
+        new_state['board'][end] = (promotion, color)
+    new_board = new_state['board']
+    king_pos = new_state['white_king_pos'] if opponent == 'white' else new_state['black_king_pos']
+    if is_king_in_check_simple(new_board, king_pos, color):
+        san += '#' if is_checkmate(new_board, new_state, opponent) else '+'
+    return san
+
+def history_to_san(move_history, game_state=None):
+    """
+    Convert a move_history list to SAN moves by replaying it from game_state
+    (default: the initial position). Entries are (start, end, piece, promotion).
+    """
+    game_state = game_state or create_game_state()
+    moves = []
+    for start, end, _, promotion in move_history:
+        moves.append(move_to_san(game_state, start, end, promotion))
+        game_state = move_piece(game_state, start, end, promotion or 'Q')
+    return moves
+
+def game_from_state(game_state, headers=None, result='*', start_fen=None):
+    """
+    Build a game dict ({'headers', 'moves', 'result'}, as yielded by read_games) from a
+    played game state. start_fen is the starting position if it was not the initial one.
+    """
+    headers = dict(headers or {})
+    headers['Result'] = result
+    start = None
+    if start_fen:
+        from src.fen import parse_fen
+        start = parse_fen(start_fen)
+        headers['SetUp'] = '1'
+        headers['FEN'] = start_fen
+    return {'headers': headers, 'moves': history_to_san(game_state['move_history'], start), 'result': result}
+
+def format_game(game):
+    """Format a game dict as PGN text: headers, then movetext wrapped to LINE_LENGTH columns"""
+    headers = game['headers']
+    result = game.get('result') or headers.get('Result', '*')
+    lines = []
+    for tag in SEVEN_TAG_ROSTER:
+        value = result if tag == 'Result' else headers.get(tag, '?')
+        lines.append(f'[{tag} "{_escape(value)}"]')
+    for tag, value in headers.items():
+        if tag not in SEVEN_TAG_ROSTER:
+            lines.append(f'[{tag} "{_escape(value)}"]')
+    lines.append('')
+    
+    # Số nước và bên đi trước lấy từ FEN nếu ván bắt đầu từ một thế cờ
+    move_number = 1
+    white_to_move = True
+    fen = headers.get('FEN')
+    if fen:
+        fields = fen.split()
+        white_to_move = len(fields) < 2 or fields[1] == 'w'
+        if len(fields) > 5 and fields[5].isdigit():
+            move_number = int(fields[5])
+    
+    tokens = []
+    for ply, san in enumerate(game['moves']):
+        if white_to_move:
+            tokens.append(f"{move_number}. {san}")
+        elif ply == 0:
+            tokens.append(f"{move_number}... {san}")
+        else:
+            tokens.append(san)
+        if not white_to_move:
+            move_number += 1
+        white_to_move = not white_to_move
+    tokens.append(result)
+    
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+def write_games(destination, games):
+    """
+    Write game dicts to a PGN file path or an open text file, one game at a time.
+    Returns the number of games written.
+    """
+    if isinstance(destination, str):
+        with open(destination, 'w', encoding='utf-8') as pgn_file:
+            return write_games(pgn_file, games)
+    
+    count = 0
+    for game in games:
+        if count:
+            destination.write('\n')
+        destination.write(format_game(game))
+        count += 1
+    return count
+
+def benchmark(paths, max_games=None):
+    """
+    Measure reading (parsing and replaying every SAN move) and writing (generating SAN
+    from move_history and formatting PGN) speed. Returns a dict with games/second for each.
+    """
+    read_time = 0.0
+    write_time = 0.0
+    games = 0
+    plies = 0
+    san_differences = 0
+    for path in paths:
+        for game in read_games(path):
+            if max_games is not None and games >= max_games:
+                break
+            start = time.perf_counter()
+            game_state = start_state(game['headers'])
+            for game_state, _ in _replay(game):
+                pass
+            read_time += time.perf_counter() - start
+            
+            start = time.perf_counter()
+            written = game_from_state(game_state, game['headers'], game['result'], game['headers'].get('FEN'))
+            format_game(written)
+            write_time += time.perf_counter() - start
+            
+            games += 1
+            plies += len(written['moves'])
+            if written['moves'] != [san.rstrip('!?') for san in game['moves']]:
+                san_differences += 1
+    return {
+        'games': games,
+        'plies': plies,
+        'read_games_per_second': games / read_time if read_time else 0.0,
+        'write_games_per_second': games / write_time if write_time else 0.0,
+        'san_differences': san_differences
+    }
+
+def _replay(game):
+    """Như iter_game_states nhưng trả về trạng thái sau mỗi nước, kể cả trạng thái cuối"""
+    game_state = start_state(game['headers'])
+    for san in game['moves']:
+        try:
+            start, end, promotion = parse_san(game_state, san)
+        except ValueError:
+            break
+        game_state = move_piece(game_state, start, end, promotion or 'Q')
+        yield game_state, (start, end, promotion)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PGN reading and writing")
+    parser.add_argument('pgn', nargs='+', help="PGN files to read")
+    parser.add_argument('--max-games', type=int, help="stop after this many games")
+    args = parser.parse_args(argv)
+    
+    report = benchmark(args.pgn, args.max_games)
+    print(f"Games          : {report['games']} ({report['plies']} plies)")
+    print(f"Read games/s   : {report['read_games_per_second']:.1f}")
+    print(f"Write games/s  : {report['write_games_per_second']:.1f}")
+    if report['san_differences']:
+        print(f"SAN differences: {report['san_differences']}")
+
+if __name__ == '__main__':
+    main()
@@ -20,6 +20,11 @@ KNIGHT_MOVES = [
     (1, -2), (1, 2), (2, -1), (2, 1)
 ]
 
+# Hướng di chuyển của các quân trượt
+ROOK_DIRECTIONS = [NORTH, SOUTH, EAST, WEST]
+BISHOP_DIRECTIONS = [NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST]
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
 def is_valid_position(pos):
     """Check if position is within board boundaries"""
     row, col = pos
@@ -333,6 +338,75 @@ def is_king_in_check_simple(board, king_pos, attacking_color):
     
     return False
 
+def get_piece_attacks(board, pos, piece):
+    """
+    Get the squares attacked by a piece, including squares of friendly pieces it defends.
+    Castling and pawn pushes are not attacks.
+    """
+    piece_type, color = piece
+    row, col = pos
+    attacks = []
+    
+    if piece_type == 'P':
+        target_row = row - 1 if color == 'white' else row + 1
+        if 0 <= target_row < BOARD_SIZE:
+            for target_col in (col - 1, col + 1):
+                if 0 <= target_col < BOARD_SIZE:
+                    attacks.append((target_row, target_col))
+    elif piece_type == 'N' or piece_type == 'K':
+        offsets = KNIGHT_MOVES if piece_type == 'N' else QUEEN_DIRECTIONS
+        for d_row, d_col in offsets:
+            target_row = row + d_row
+            target_col = col + d_col
+            if 0 <= target_row < BOARD_SIZE and 0 <= target_col < BOARD_SIZE:
+                attacks.append((target_row, target_col))
+    else:
+        if piece_type == 'R':
+            directions = ROOK_DIRECTIONS
+        elif piece_type == 'B':
+            directions = BISHOP_DIRECTIONS
+        else:
+            directions = QUEEN_DIRECTIONS
+        for d_row, d_col in directions:
+            target_row = row + d_row
+            target_col = col + d_col
+            while 0 <= target_row < BOARD_SIZE and 0 <= target_col < BOARD_SIZE:
+                target = (target_row, target_col)
+                attacks.append(target)
+                if target in board:
+                    break
+                target_row += d_row
+                target_col += d_col
+    
+    return attacks
+
+def get_attack_map(board):
+    """
+    Build the attack map of both sides in a single pass over the board.
+    Returns {color: {'attacks': {square: number of attackers}, 'mobility': {pos: count}}},
+    where mobility counts the attacked squares not occupied by a friendly piece
+    (pawns and kings are not included).
+    """
+    attack_map = {
+        'white': {'attacks': {}, 'mobility': {}},
+        'black': {'attacks': {}, 'mobility': {}}
+    }
+    
+    for pos, piece in board.items():
+        piece_type, color = piece
+        side = attack_map[color]
+        attacked = side['attacks']
+        mobility = 0
+        for target in get_piece_attacks(board, pos, piece):
+            attacked[target] = attacked.get(target, 0) + 1
+            occupant = board.get(target)
+            if occupant is None or occupant[1] != color:
+                mobility += 1
+        if piece_type != 'P' and piece_type != 'K':
+            side['mobility'][pos] = mobility
+    
+    return attack_map
+
 def get_valid_moves(board, game_state, pos):
     """Get all valid moves for a piece at the given position"""
     piece = get_piece_at(board, pos)
@@ -0,0 +1,256 @@
+"""
+Compact binary game records read through mmap
+
+A record file starts with the 4-byte MAGIC and holds games appended one after
+another. Each game is a little-endian header (start position Zobrist key: u64,
+plies: u16, result: u8, FEN length: u8), the starting FEN when the game does
+not start from the initial position, then one 16-bit move per ply in the
+opening book encoding (src/book.py: from, to and promotion).
+A side file '<path>.idx' holds the u64 offset of every game for random access;
+it is rebuilt from the game headers when missing, damaged or behind the data
+file, and the writer repairs both files before appending.
+
+    python -m src.records convert games.pgn [more.pgn ...] -o games.bin
+    python -m src.records info games.bin --replay 1000
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from src.board import move_piece
+from src.book import decode_move, encode_move
+from src.fen import START_FEN, parse_fen
+from src.pgn import iter_game_states, read_games
+from src.zobrist import compute_hash
+
+MAGIC = b'CGR\x01'
+GAME_HEADER = struct.Struct('<QHBB')
+OFFSET = struct.Struct('<Q')
+
+# Mã kết quả ván đấu: chỉ số trong bộ này
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+RESULT_CODES = {result: code for code, result in enumerate(RESULTS)}
+
+MAX_PLIES = 0xFFFF
+
+def encode_history(move_history):
+    """Encode a move_history list ((start, end, piece, promotion) entries) as 16-bit moves"""
+    return [encode_move(start, end, promotion, piece[0]) for start, end, piece, promotion in move_history]
+
+class GameRecordWriter:
+    """Append-only writer; games are added to the end of the file and of its index"""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path):
+            self._repair()
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._index = open(path + '.idx', 'ab')
+
+    def _repair(self):
+        """Cắt ván ghi dở ở cuối tệp và ghi lại chỉ mục nếu nó không khớp với tệp dữ liệu"""
+        reader = GameRecordReader(self.path)
+        try:
+            offsets = reader.offsets
+            end = reader._game_end(offsets[-1]) if offsets else len(MAGIC)
+        finally:
+            reader.close()
+        if os.path.getsize(self.path) > end:
+            os.truncate(self.path, end)
+        index = b''.join(OFFSET.pack(offset) for offset in offsets)
+        index_path = self.path + '.idx'
+        current = None
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as index_file:
+                current = index_file.read()
+        if current != index:
+            with open(index_path, 'wb') as index_file:
+                index_file.write(index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Flush and close the data and index files"""
+        self._file.close()
+        self._index.close()
+
+    def append(self, move_history, result='*', start_fen=None):
+        """
+        Append one game: its move_history (as recorded by move_piece), the result string
+        and the starting FEN (None or START_FEN for the initial position).
+        """
+        if len(move_history) > MAX_PLIES:
+            raise ValueError(f"game too long ({len(move_history)} plies)")
+        if start_fen == START_FEN:
+            start_fen = None
+        fen_bytes = start_fen.encode('ascii') if start_fen else b''
+        if len(fen_bytes) > 0xFF:
+            raise ValueError(f"FEN too long: {start_fen}")
+        start_hash = compute_hash(parse_fen(start_fen or START_FEN))
+        moves = encode_history(move_history)
+        
+        self._index.write(OFFSET.pack(self._file.tell()))
+        self._file.write(GAME_HEADER.pack(start_hash, len(moves), RESULT_CODES.get(result, 0), len(fen_bytes)))
+        self._file.write(fen_bytes)
+        self._file.write(struct.pack(f'<{len(moves)}H', *moves))
+
+class GameRecordReader:
+    """Read-only access to a record file; any game can be read or replayed by its index"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if self._map is not None and self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a game record file")
+        self.offsets = self._load_index(size)
+
+    def close(self):
+        """Release the memory map and the file"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _game_end(self, offset):
+        _, plies, _, fen_length = GAME_HEADER.unpack_from(self._map, offset)
+        return offset + GAME_HEADER.size + fen_length + 2 * plies
+
+    def _load_index(self, size):
+        """Offsets from the index file, completed by scanning the game headers that follow"""
+        offsets = []
+        if self._map is None:
+            return offsets
+        index_path = self.path + '.idx'
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as index_file:
+                data = index_file.read()
+            offsets = [offset for (offset,) in OFFSET.iter_unpack(data[:len(data) - len(data) % OFFSET.size])]
+            # Chỉ mục không bắt đầu từ ván đầu tiên hoặc không tăng dần (ví dụ bị xóa rồi ghi tiếp):
+            # bỏ đi và quét lại toàn bộ tệp
+            if offsets and (offsets[0] != len(MAGIC) or any(a >= b for a, b in zip(offsets, offsets[1:]))):
+                offsets = []
+            # Bỏ các mục trỏ ra ngoài tệp dữ liệu (ghi dở)
+            while offsets and (offsets[-1] + GAME_HEADER.size > size or self._game_end(offsets[-1]) > size):
+                offsets.pop()
+        
+        # Quét tiếp các ván chưa có trong chỉ mục; ván ghi dở ở cuối tệp bị bỏ qua
+        offset = self._game_end(offsets[-1]) if offsets else len(MAGIC)
+        while offset + GAME_HEADER.size <= size and self._game_end(offset) <= size:
+            offsets.append(offset)
+            offset = self._game_end(offset)
+        return offsets
+
+    def header(self, index):
+        """Return {'start_hash', 'plies', 'result', 'start_fen'} for a game"""
+        offset = self.offsets[index]
+        start_hash, plies, result, fen_length = GAME_HEADER.unpack_from(self._map, offset)
+        fen_start = offset + GAME_HEADER.size
+        start_fen = self._map[fen_start:fen_start + fen_length].decode('ascii') if fen_length else START_FEN
+        return {'start_hash': start_hash, 'plies': plies, 'result': RESULTS[result], 'start_fen': start_fen}
+
+    def moves(self, index):
+        """Return the raw 16-bit moves of a game without replaying it"""
+        offset = self.offsets[index]
+        _, plies, _, fen_length = GAME_HEADER.unpack_from(self._map, offset)
+        return struct.unpack_from(f'<{plies}H', self._map, offset + GAME_HEADER.size + fen_length)
+
+    def replay(self, index):
+        """
+        Replay a game with move_piece. Yields (game_state, (start, end, promotion)) before
+        each move is played, like pgn.iter_game_states; the game state is updated in place.
+        """
+        game_state = parse_fen(self.header(index)['start_fen'])
+        for ply, move in enumerate(self.moves(index)):
+            start, end, promotion = decode_move(move, game_state['board'])
+            yield game_state, (start, end, promotion)
+            game_state = move_piece(game_state, start, end, promotion or 'Q')
+            if len(game_state['move_history']) == ply:
+                raise ValueError(f"game {index}: illegal move at ply {ply + 1}")
+
+    def final_state(self, index):
+        """Game state after the last move of a game"""
+        game_state = parse_fen(self.header(index)['start_fen'])
+        for move in self.moves(index):
+            start, end, promotion = decode_move(move, game_state['board'])
+            game_state = move_piece(game_state, start, end, promotion or 'Q')
+        return game_state
+
+def convert_pgn(pgn_paths, output_path):
+    """
+    Append the games of PGN files to a record file. A game whose moves cannot all be
+    replayed is stored up to the first bad move with result '*', since its result does
+    not belong to the stored moves. Returns (games written, games cut short).
+    """
+    count = truncated = 0
+    with GameRecordWriter(output_path) as writer:
+        for path in pgn_paths:
+            for game in read_games(path):
+                history = []
+                for game_state, (start, end, promotion) in iter_game_states(game):
+                    history.append((start, end, game_state['board'][start], promotion))
+                result = game['result']
+                if len(history) < len(game['moves']):
+                    result = '*'
+                    truncated += 1
+                writer.append(history, result, game['headers'].get('FEN'))
+                count += 1
+    return count, truncated
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert and inspect binary game record files")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help="append PGN games to a record file")
+    convert.add_argument('pgn', nargs='+', help="PGN files to read")
+    convert.add_argument('-o', '--output', required=True, help="record file to append to")
+    info = commands.add_parser('info', help="summarise a record file")
+    info.add_argument('records', help="record file")
+    info.add_argument('--replay', type=int, default=0, help="also replay the first N games and time it")
+    args = parser.parse_args(argv)
+    
+    if args.command == 'convert':
+        start = time.perf_counter()
+        count, truncated = convert_pgn(args.pgn, args.output)
+        print(f"Wrote {count} games to {args.output} in {time.perf_counter() - start:.1f}s")
+        if truncated:
+            print(f"{truncated} games stop at an illegal move and were stored without a result")
+        return
+    
+    reader = GameRecordReader(args.records)
+    try:
+        start = time.perf_counter()
+        results = dict.fromkeys(RESULTS, 0)
+        plies = 0
+        for index in range(len(reader)):
+            header = reader.header(index)
+            results[header['result']] += 1
+            plies += header['plies']
+        scan_time = time.perf_counter() - start
+        print(f"Games          : {len(reader)}")
+        print(f"Plies          : {plies}")
+        print("Results        : " + '  '.join(f"{result} {count}" for result, count in results.items()))
+        print(f"File size      : {os.path.getsize(args.records)} bytes")
+        print(f"Header scan (s): {scan_time:.3f}")
+        if args.replay:
+            start = time.perf_counter()
+            replayed = sum(1 for index in range(min(args.replay, len(reader))) for _ in reader.replay(index))
+            elapsed = time.perf_counter() - start
+            print(f"Replay         : {replayed} plies in {elapsed:.2f}s ({replayed / elapsed if elapsed else 0:.0f} plies/s)")
+    finally:
+        reader.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Board rendering with pygame
+
+Kept apart from src/board.py so that the rules and the engine
+(board, pieces, endgame, ai) import with only the standard library.
+"""
+
+import pygame
+from src.constants import BOARD_SIZE, SQUARE_SIZE, LIGHT_SQUARE, DARK_SQUARE, HIGHLIGHT, MOVE_HIGHLIGHT, WIDTH
+from src.pieces import is_check, is_checkmate, is_stalemate
+
+def draw_board(screen, game_state):
+    """Draw the chess board and pieces"""
+    board = game_state['board']
+    selected = game_state['selected_piece']
+    valid_moves = game_state['valid_moves']
+    
+    # Draw the board squares
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            # Determine square color
+            color = LIGHT_SQUARE if (row + col) % 2 == 0 else DARK_SQUARE
+            
+            # Draw the square
+            pygame.draw.rect(
+                screen,
+                color,
+                pygame.Rect(
+                    col * SQUARE_SIZE,
+                    row * SQUARE_SIZE,
+                    SQUARE_SIZE,
+                    SQUARE_SIZE
+                )
+            )
+    
+    # Highlight valid moves
+    for move in valid_moves:
+        row, col = move
+        pygame.draw.rect(
+            screen,
+            MOVE_HIGHLIGHT,
+            pygame.Rect(
+                col * SQUARE_SIZE,
+                row * SQUARE_SIZE,
+                SQUARE_SIZE,
+                SQUARE_SIZE
+            )
+        )
+    
+    # Highlight selected piece
+    if selected:
+        row, col = selected
+        pygame.draw.rect(
+            screen,
+            HIGHLIGHT,
+            pygame.Rect(
+                col * SQUARE_SIZE,
+                row * SQUARE_SIZE,
+                SQUARE_SIZE,
+                SQUARE_SIZE
+            )
+        )
+    
+    # Draw pieces placeholder
+    for pos, piece in board.items():
+        row, col = pos
+        piece_type, color = piece
+        
+        # Simple representation of pieces
+        font = pygame.font.SysFont('Arial', 36)
+        text_color = (255, 255, 255) if color == 'black' else (0, 0, 0)
+        text = font.render(piece_type, True, text_color)
+        
+        # Center the text in the square
+        text_rect = text.get_rect(center=(col * SQUARE_SIZE + SQUARE_SIZE // 2, 
+                                          row * SQUARE_SIZE + SQUARE_SIZE // 2))
+        screen.blit(text, text_rect)
+    
+    # Check for check, checkmate, or stalemate
+    current_color = game_state['turn']
+    font = pygame.font.SysFont('Arial', 24)
+    
+    if is_checkmate(board, game_state, current_color):
+        winner = 'Black' if current_color == 'white' else 'White'
+        text = font.render(f"{winner} wins by checkmate!", True, (255, 0, 0))
+        screen.blit(text, (WIDTH // 2 - 100, 20))
+    elif is_stalemate(board, game_state, current_color):
+        text = font.render("Game drawn by stalemate!", True, (255, 0, 0))
+        screen.blit(text, (WIDTH // 2 - 100, 20))
+    elif is_check(board, game_state, current_color):
+        text = font.render(f"{current_color.capitalize()} is in check!", True, (255, 0, 0))
+        screen.blit(text, (WIDTH // 2 - 100, 20))
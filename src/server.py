@@ -0,0 +1,272 @@
+"""
+Local HTTP/JSON analysis service
+
+An asyncio HTTP server (standard library only) that queues analysis requests
+and dispatches them to a pool of engine worker processes running
+find_best_move. The queue is bounded: when it is full new requests are
+rejected at once with 503 instead of piling up.
+
+    python -m src.server --port 8765 --workers 4
+
+    POST /analyze  {"fen": "...", "time": 1.0, "nodes": null, "depth": null, "deadline": 5.0}
+        -> {"move": "e2e4", "san": "e4", "score": 35, "pv": ["e2e4", ...], "depth": 4, "nodes": 5120, "time": 0.98}
+    GET /metrics   queue depth, request counters and latency percentiles
+    GET /health
+
+Scores are centipawns from white's point of view, as everywhere in the engine.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from src.analysis import search_position
+from src.fen import parse_fen
+
+DEFAULT_TIME = 1.0
+MAX_TIME = 30.0
+MAX_DEPTH = 64
+DEFAULT_QUEUE_SIZE = 64
+# Thời gian chờ thêm ngoài giới hạn tìm kiếm trước khi trả 504 (giây)
+DEADLINE_GRACE = 0.5
+# Số mẫu độ trễ giữ lại để tính phân vị
+LATENCY_SAMPLES = 1000
+MAX_BODY_BYTES = 64 * 1024
+# Cách tạo tiến trình tìm kiếm: không dùng fork (xem AnalysisServer.start)
+WORKER_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+               504: 'Gateway Timeout'}
+
+class RequestError(Exception):
+    """Invalid request; carries the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def parse_limits(request):
+    """Validate an /analyze body and return (fen, profile, deadline in seconds)"""
+    fen = request.get('fen')
+    if not isinstance(fen, str):
+        raise RequestError(400, "'fen' is required")
+    try:
+        parse_fen(fen)
+    except ValueError as error:
+        raise RequestError(400, str(error))
+    
+    try:
+        nodes = request.get('nodes')
+        nodes = int(nodes) if nodes is not None else None
+        depth = int(request.get('depth') or MAX_DEPTH)
+        search_time = request.get('time')
+        # Không giới hạn số nút hay độ sâu thì mặc định giới hạn thời gian
+        if search_time is None and nodes is None and depth == MAX_DEPTH:
+            search_time = DEFAULT_TIME
+        search_time = min(float(search_time), MAX_TIME) if search_time is not None else None
+        deadline = float(request.get('deadline') or (search_time or MAX_TIME) * 2 + 1)
+    except (TypeError, ValueError):
+        raise RequestError(400, "'time', 'nodes', 'depth' and 'deadline' must be numbers")
+    if (nodes is not None and nodes <= 0) or depth <= 0 or deadline <= 0 or (search_time is not None and search_time <= 0):
+        raise RequestError(400, "limits must be positive")
+    
+    profile = {'nodes': nodes, 'time': search_time, 'max_depth': min(depth, MAX_DEPTH), 'noise': 0,
+               'book': bool(request.get('book', True)), 'experience': False}
+    return fen, profile, deadline
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not samples:
+        return None
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+class AnalysisServer:
+    """HTTP front end, bounded request queue and dispatchers feeding a process pool"""
+
+    def __init__(self, workers=None, queue_size=DEFAULT_QUEUE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.queue = None
+        self.executor = None
+        self.dispatchers = []
+        self.in_flight = 0
+        self.counters = {'requests': 0, 'completed': 0, 'rejected': 0, 'timeouts': 0, 'errors': 0}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    async def start(self, host, port):
+        """Start the worker pool, the dispatchers and the listening socket; returns the asyncio server"""
+        self.queue = asyncio.Queue(self.queue_size)
+        # Các tiến trình con được tạo dần khi có việc, lúc đã có kết nối đang mở: với fork chúng
+        # thừa hưởng socket của khách và khách không bao giờ nhận được EOF, nên dùng forkserver/spawn
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(WORKER_START_METHOD))
+        # Mỗi bộ điều phối giữ tối đa một việc trong pool, nên pool không bao giờ bị dồn việc
+        self.dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            fen, profile, expires, future = await self.queue.get()
+            remaining = expires - time.monotonic()
+            if future.cancelled():
+                continue
+            if remaining <= 0:
+                # Hết hạn trong lúc chờ trong hàng đợi: không cần tìm kiếm
+                future.set_exception(RequestError(504, "deadline expired while queued"))
+                continue
+            
+            # Thời gian tìm kiếm không vượt quá thời hạn còn lại của yêu cầu
+            profile = dict(profile, time=min(profile['time'] or remaining, remaining))
+            self.in_flight += 1
+            try:
+                job = loop.run_in_executor(self.executor, search_position, fen, profile)
+                result = await asyncio.wait_for(job, remaining + DEADLINE_GRACE)
+            except asyncio.TimeoutError:
+                if not future.done():
+                    future.set_exception(RequestError(504, "deadline exceeded"))
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.in_flight -= 1
+
+    async def analyze(self, request):
+        """Queue one analysis request and wait for its result"""
+        fen, profile, deadline = parse_limits(request)
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((fen, profile, time.monotonic() + deadline, future))
+        except asyncio.QueueFull:
+            self.counters['rejected'] += 1
+            raise RequestError(503, "queue is full")
+        return await future
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue.qsize(),
+            'queue_size': self.queue_size,
+            'in_flight': self.in_flight,
+            **self.counters,
+            'latency_ms': {
+                'p50': percentile(latencies, 0.50),
+                'p90': percentile(latencies, 0.90),
+                'p99': percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else None
+            }
+        }
+
+    async def handle_connection(self, reader, writer):
+        status, body = 500, {'error': 'internal error'}
+        headers = {}
+        try:
+            method, path, body_bytes = await self.read_request(reader)
+            if path == '/analyze':
+                if method != 'POST':
+                    raise RequestError(405, "use POST")
+                try:
+                    request = json.loads(body_bytes or b'{}')
+                except ValueError:
+                    raise RequestError(400, "body must be JSON")
+                if not isinstance(request, dict):
+                    raise RequestError(400, "body must be a JSON object")
+                self.counters['requests'] += 1
+                start = time.monotonic()
+                body = await self.analyze(request)
+                self.latencies.append(round((time.monotonic() - start) * 1000, 1))
+                self.counters['completed'] += 1
+                status = 200
+            elif path == '/metrics' and method == 'GET':
+                status, body = 200, self.metrics()
+            elif path == '/health' and method == 'GET':
+                status, body = 200, {'status': 'ok'}
+            else:
+                raise RequestError(404, "not found")
+        except RequestError as error:
+            status, body = error.status, {'error': str(error)}
+            if status == 504:
+                self.counters['timeouts'] += 1
+            elif status == 503:
+                headers['Retry-After'] = '1'
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as error:
+            self.counters['errors'] += 1
+            status, body = 500, {'error': str(error)}
+        
+        payload = json.dumps(body).encode()
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                'Content-Type: application/json',
+                f'Content-Length: {len(payload)}',
+                'Connection: close']
+        head += [f'{name}: {value}' for name, value in headers.items()]
+        try:
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        """Read one HTTP/1.1 request; returns (method, path, body)"""
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) < 2:
+            raise RequestError(400, "malformed request line")
+        method, path = request_line[0], request_line[1].split('?')[0]
+        length = 0
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                try:
+                    length = int(value)
+                except ValueError:
+                    raise RequestError(400, "bad Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise RequestError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method, path, body
+
+async def serve(host, port, workers, queue_size):
+    server = AnalysisServer(workers, queue_size)
+    listener = await server.start(host, port)
+    print(f"Listening on http://{host}:{port} with {server.workers} workers", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve engine analysis over local HTTP/JSON")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on")
+    parser.add_argument('--port', type=int, default=8765, help="port to listen on")
+    parser.add_argument('--workers', type=int, help="number of engine processes (default: all CPUs)")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help="maximum number of queued requests")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue_size))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,551 @@
+"""
+Endgame tablebases for small material sets, generated locally by retrograde analysis
+
+Each table stores, for every position of a material set (e.g. 'KQvK'), the
+distance to mate in plies for the side to move. Tables are indexed with the
+white king reduced by board symmetry (a1-d1-d4 triangle without pawns, files
+a-d with pawns) and written zlib-compressed to TABLEBASE_DIR.
+
+Generate tables (tables needed after captures/promotions are generated too):
+    python -m src.tablebase KQvK KRvK KPvK KBNvK
+"""
+
+import argparse
+import os
+import time
+import zlib
+from src.constants import TABLEBASE_DIR
+from src.endgame import get_material_signature, MATERIAL_ORDER
+from src.pieces import KNIGHT_MOVES, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, QUEEN_DIRECTIONS
+
+MAX_PIECES = 4
+
+# Giá trị lưu trong bảng (theo bên đi):
+# 0 = hòa, 1..127 = thắng sau n nửa nước, LOSS + n = thua sau n nửa nước, ILLEGAL = thế cờ không hợp lệ
+DRAW = 0
+LOSS = 128
+ILLEGAL = 255
+
+# Sức mạnh quân để chọn bên "mạnh" làm bên trắng của bảng
+PIECE_STRENGTH = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+
+COLORS = ('white', 'black')
+
+def _build_step_targets(offsets):
+    targets = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        targets.append([(row + d_row) * 8 + col + d_col for d_row, d_col in offsets
+                        if 0 <= row + d_row < 8 and 0 <= col + d_col < 8])
+    return targets
+
+def _build_rays(directions):
+    rays = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        sq_rays = []
+        for d_row, d_col in directions:
+            ray = []
+            r, c = row + d_row, col + d_col
+            while 0 <= r < 8 and 0 <= c < 8:
+                ray.append(r * 8 + c)
+                r += d_row
+                c += d_col
+            if ray:
+                sq_rays.append(ray)
+        rays.append(sq_rays)
+    return rays
+
+def _build_slider_paths(rays):
+    """Với mỗi ô xuất phát: ô đích -> các ô nằm giữa (phải trống để tấn công được)"""
+    paths = []
+    for sq_rays in rays:
+        sq_paths = {}
+        for ray in sq_rays:
+            for i, target in enumerate(ray):
+                sq_paths[target] = ray[:i]
+        paths.append(sq_paths)
+    return paths
+
+KNIGHT_TARGETS = _build_step_targets(KNIGHT_MOVES)
+KING_TARGETS = _build_step_targets(QUEEN_DIRECTIONS)
+KNIGHT_SETS = [set(targets) for targets in KNIGHT_TARGETS]
+KING_SETS = [set(targets) for targets in KING_TARGETS]
+PAWN_ATTACKS = {
+    'white': _build_step_targets([(-1, -1), (-1, 1)]),
+    'black': _build_step_targets([(1, -1), (1, 1)])
+}
+PAWN_ATTACK_SETS = {color: [set(targets) for targets in PAWN_ATTACKS[color]] for color in COLORS}
+RAYS = {
+    'R': _build_rays(ROOK_DIRECTIONS),
+    'B': _build_rays(BISHOP_DIRECTIONS),
+    'Q': _build_rays(QUEEN_DIRECTIONS)
+}
+SLIDER_PATHS = {piece_type: _build_slider_paths(rays) for piece_type, rays in RAYS.items()}
+
+# Phép đối xứng qua đường chéo a1-h8
+TRANSPOSE = [(7 - (sq & 7)) * 8 + (7 - (sq >> 3)) for sq in range(64)]
+
+# Ô được phép của vua trắng sau khi chuẩn hóa đối xứng
+PAWNLESS_REGION = [sq for sq in range(64) if (sq & 7) <= 3 and 7 - (sq >> 3) <= (sq & 7)]
+PAWN_REGION = [sq for sq in range(64) if (sq & 7) <= 3]
+
+def split_signature(name):
+    """Split 'KBNvK' into ('KBN', 'K')"""
+    white, black = name.split('v')
+    return white, black
+
+def _side_key(pieces):
+    return (sum(PIECE_STRENGTH[p] for p in pieces), len(pieces),
+            [len(MATERIAL_ORDER) - MATERIAL_ORDER.index(p) for p in pieces])
+
+def normalize_signature(white, black):
+    """
+    Return (table_name, swapped): the stronger side always plays white in a table,
+    swapped is True when colours must be exchanged to probe it.
+    """
+    white = ''.join(sorted(white, key=MATERIAL_ORDER.index))
+    black = ''.join(sorted(black, key=MATERIAL_ORDER.index))
+    if _side_key(black) > _side_key(white):
+        return f"{black}v{white}", True
+    return f"{white}v{black}", False
+
+def is_drawn_material(white, black):
+    """Material sets where no side can ever mate: K v K, K+minor v K"""
+    if white == 'K' and black == 'K':
+        return True
+    if white == 'K' and black in ('KB', 'KN'):
+        return True
+    if black == 'K' and white in ('KB', 'KN'):
+        return True
+    return False
+
+def get_dependencies(name):
+    """Tables reachable from this one by a capture or a promotion"""
+    white, black = split_signature(name)
+    dependencies = set()
+    for side, other, is_white in ((white, black, True), (black, white, False)):
+        for i, piece_type in enumerate(side):
+            if piece_type == 'K':
+                continue
+            variants = [side[:i] + side[i + 1:]]
+            if piece_type == 'P':
+                variants += [side[:i] + promoted + side[i + 1:] for promoted in 'QRBN']
+            for variant in variants:
+                sub_white, sub_black = (variant, other) if is_white else (other, variant)
+                if is_drawn_material(sub_white, sub_black):
+                    continue
+                sub_name, _ = normalize_signature(sub_white, sub_black)
+                if sub_name != name:
+                    dependencies.add(sub_name)
+    return sorted(dependencies)
+
+class Tablebase:
+    """Distance-to-mate table for one material set"""
+
+    def __init__(self, name, values=None):
+        self.name = name
+        white, black = split_signature(name)
+        self.pieces = [(p, 'white') for p in white] + [(p, 'black') for p in black]
+        self.has_pawns = 'P' in name
+        self.region = PAWN_REGION if self.has_pawns else PAWNLESS_REGION
+        self.region_index = {sq: i for i, sq in enumerate(self.region)}
+        self.size = len(self.region) * 64 ** (len(self.pieces) - 1) * 2
+        self.values = values
+
+    def canonical(self, squares):
+        """Apply the board symmetry that brings the white king into the stored region"""
+        king = squares[0]
+        if king & 7 > 3:
+            squares = [sq ^ 7 for sq in squares]
+            king ^= 7
+        if not self.has_pawns:
+            if king >> 3 < 4:
+                squares = [sq ^ 56 for sq in squares]
+                king ^= 56
+            rank, file = 7 - (king >> 3), king & 7
+            if rank > file:
+                squares = [TRANSPOSE[sq] for sq in squares]
+            elif rank == file:
+                # Vua trên đường chéo: chọn một trong hai dạng đối xứng để mỗi thế cờ chỉ có một chỉ số
+                transposed = [TRANSPOSE[sq] for sq in squares]
+                if transposed < squares:
+                    squares = transposed
+        return squares
+
+    def index(self, squares, stm):
+        """Index of a position given in canonical form; stm is 0 for white, 1 for black"""
+        index = self.region_index[squares[0]]
+        for sq in squares[1:]:
+            index = index * 64 + sq
+        return index * 2 + stm
+
+    def decode(self, index):
+        """Inverse of index(): (squares, stm)"""
+        stm = index & 1
+        index >>= 1
+        squares = [0] * len(self.pieces)
+        for i in range(len(self.pieces) - 1, 0, -1):
+            squares[i] = index & 63
+            index >>= 6
+        squares[0] = self.region[index]
+        return squares, stm
+
+    def lookup(self, squares, stm):
+        """Raw table value for squares in table piece order (any symmetry)"""
+        return self.values[self.index(self.canonical(squares), stm)]
+
+    def lookup_entries(self, entries, stm):
+        """Raw table value for [(piece_type, color, sq), ...] already in this table's colours"""
+        remaining = list(entries)
+        squares = []
+        for piece in self.pieces:
+            for i, (piece_type, color, sq) in enumerate(remaining):
+                if (piece_type, color) == piece:
+                    squares.append(sq)
+                    del remaining[i]
+                    break
+            else:
+                raise ValueError(f"Position does not match table {self.name}")
+        return self.lookup(squares, stm)
+
+def _is_attacked(target, attacker_color, pieces, squares, occupied):
+    """Ô target có bị bên attacker_color tấn công không (bỏ qua quân đã bị bắt: ô None)"""
+    for (piece_type, color), sq in zip(pieces, squares):
+        if color != attacker_color or sq is None:
+            continue
+        if piece_type == 'K':
+            if target in KING_SETS[sq]:
+                return True
+        elif piece_type == 'N':
+            if target in KNIGHT_SETS[sq]:
+                return True
+        elif piece_type == 'P':
+            if target in PAWN_ATTACK_SETS[color][sq]:
+                return True
+        else:
+            path = SLIDER_PATHS[piece_type][sq].get(target)
+            if path is not None and not any(between in occupied for between in path):
+                return True
+    return False
+
+def _pseudo_moves(pieces, squares, color, occupied):
+    """Sinh (slot, ô đích, slot bị bắt hoặc None) cho các quân của một bên"""
+    for slot, ((piece_type, piece_color), sq) in enumerate(zip(pieces, squares)):
+        if piece_color != color:
+            continue
+        if piece_type == 'P':
+            step = -8 if color == 'white' else 8
+            target = sq + step
+            if target not in occupied:
+                yield slot, target, None
+                start_row = 6 if color == 'white' else 1
+                if sq >> 3 == start_row and target + step not in occupied:
+                    yield slot, target + step, None
+            for target in PAWN_ATTACKS[color][sq]:
+                victim = occupied.get(target)
+                if victim is not None and pieces[victim][1] != color:
+                    yield slot, target, victim
+        elif piece_type == 'K' or piece_type == 'N':
+            for target in (KING_TARGETS if piece_type == 'K' else KNIGHT_TARGETS)[sq]:
+                victim = occupied.get(target)
+                if victim is None:
+                    yield slot, target, None
+                elif pieces[victim][1] != color:
+                    yield slot, target, victim
+        else:
+            for ray in RAYS[piece_type][sq]:
+                for target in ray:
+                    victim = occupied.get(target)
+                    if victim is None:
+                        yield slot, target, None
+                    else:
+                        if pieces[victim][1] != color:
+                            yield slot, target, victim
+                        break
+
+def _legal_moves(pieces, squares, color):
+    """
+    Sinh các nước hợp lệ: (squares mới, slot bị bắt hoặc None, quân phong cấp hoặc None).
+    Ô của quân bị bắt được đặt thành None.
+    """
+    occupied = {sq: slot for slot, sq in enumerate(squares)}
+    opponent = 'black' if color == 'white' else 'white'
+    king_slot = pieces.index(('K', color))
+    for slot, target, victim in _pseudo_moves(pieces, squares, color, occupied):
+        new_squares = list(squares)
+        new_squares[slot] = target
+        if victim is not None:
+            new_squares[victim] = None
+        new_occupied = {sq for sq in new_squares if sq is not None}
+        if _is_attacked(new_squares[king_slot], opponent, pieces, new_squares, new_occupied):
+            continue
+        if pieces[slot][0] == 'P' and (target >> 3) in (0, 7):
+            for promoted in 'QRBN':
+                yield new_squares, victim, promoted
+        else:
+            yield new_squares, victim, None
+
+def _is_legal_position(pieces, squares, stm):
+    if len(set(squares)) != len(squares):
+        return False
+    for (piece_type, _), sq in zip(pieces, squares):
+        if piece_type == 'P' and (sq >> 3) in (0, 7):
+            return False
+    # Bên không được đi không thể đang bị chiếu
+    waiting = COLORS[1 - stm]
+    king_sq = squares[pieces.index(('K', waiting))]
+    return not _is_attacked(king_sq, COLORS[stm], pieces, squares, set(squares))
+
+def _in_check(pieces, squares, stm):
+    color = COLORS[stm]
+    king_sq = squares[pieces.index(('K', color))]
+    return _is_attacked(king_sq, COLORS[1 - stm], pieces, squares, set(squares))
+
+def _lookup_external(entries, stm, tables):
+    """Giá trị (theo bên đi) của thế cờ có vật chất khác bảng đang tạo"""
+    white = ''.join(p for p, c, _ in entries if c == 'white')
+    black = ''.join(p for p, c, _ in entries if c == 'black')
+    if is_drawn_material(white, black):
+        return DRAW
+    name, swapped = normalize_signature(white, black)
+    if swapped:
+        entries = [(p, 'black' if c == 'white' else 'white', sq ^ 56) for p, c, sq in entries]
+        stm = 1 - stm
+    return tables[name].lookup_entries(entries, stm)
+
+def _predecessors(table, squares, stm):
+    """Các thế cờ (chỉ số chuẩn hóa) có một nước không bắt quân, không phong cấp dẫn tới thế này"""
+    pieces = table.pieces
+    mover = COLORS[1 - stm]
+    occupied = set(squares)
+    result = set()
+    for slot, ((piece_type, color), sq) in enumerate(zip(pieces, squares)):
+        if color != mover:
+            continue
+        origins = []
+        if piece_type == 'P':
+            step = 8 if color == 'white' else -8
+            origin = sq + step
+            if origin not in occupied and 1 <= origin >> 3 <= 6:
+                origins.append(origin)
+                start_row = 6 if color == 'white' else 1
+                if (origin + step) >> 3 == start_row and origin + step not in occupied:
+                    origins.append(origin + step)
+        elif piece_type == 'K' or piece_type == 'N':
+            origins = [t for t in (KING_TARGETS if piece_type == 'K' else KNIGHT_TARGETS)[sq] if t not in occupied]
+        else:
+            for ray in RAYS[piece_type][sq]:
+                for origin in ray:
+                    if origin in occupied:
+                        break
+                    origins.append(origin)
+        for origin in origins:
+            new_squares = list(squares)
+            new_squares[slot] = origin
+            result.add(table.index(table.canonical(new_squares), 1 - stm))
+    return result
+
+def generate_table(name, tables, verbose=False):
+    """Solve one table by retrograde analysis; tables must already contain its dependencies"""
+    table = Tablebase(name)
+    pieces = table.pieces
+    size = table.size
+    values = bytearray(size)
+    table.values = values
+    counts = bytearray(size)  # số thế con trong bảng chưa được xác định là thắng cho đối phương
+    safe = bytearray(size)  # có nước ra ngoài bảng dẫn tới hòa hoặc thắng: không thể thua
+    external_loss = bytearray(size)  # số nửa nước thua dài nhất qua các nước ra ngoài bảng
+    levels = {}  # nửa nước -> [(chỉ số, giá trị)]
+    started = time.time()
+    
+    # Bước 1: phân loại từng thế cờ, đếm các thế con và xử lý các nước ra ngoài bảng
+    for index in range(size):
+        squares, stm = table.decode(index)
+        # Chỉ giải các thế cờ ở dạng chuẩn; dạng đối xứng khác không bao giờ được tra cứu
+        if table.canonical(squares) != squares or not _is_legal_position(pieces, squares, stm):
+            values[index] = ILLEGAL
+            continue
+        
+        children = set()
+        best_win = None
+        has_move = False
+        for new_squares, victim, promoted in _legal_moves(pieces, squares, COLORS[stm]):
+            has_move = True
+            if victim is None and promoted is None:
+                children.add(table.index(table.canonical(new_squares), 1 - stm))
+                continue
+            entries = [(promoted if promoted and pieces[slot][0] == 'P' and sq >> 3 in (0, 7) else piece_type,
+                        color, sq)
+                       for slot, ((piece_type, color), sq) in enumerate(zip(pieces, new_squares)) if sq is not None]
+            value = _lookup_external(entries, 1 - stm, tables)
+            if value >= LOSS:
+                plies = value - LOSS + 1
+                if best_win is None or plies < best_win:
+                    best_win = plies
+            elif value == DRAW:
+                safe[index] = 1
+            else:
+                external_loss[index] = max(external_loss[index], value + 1)
+        
+        if not has_move:
+            if _in_check(pieces, squares, stm):
+                levels.setdefault(0, []).append((index, LOSS))
+            continue
+        
+        counts[index] = len(children)
+        if best_win is not None:
+            safe[index] = 1
+            levels.setdefault(best_win, []).append((index, best_win))
+        elif not children and not safe[index]:
+            plies = external_loss[index]
+            levels.setdefault(plies, []).append((index, LOSS + plies))
+    
+    if verbose:
+        print(f"{name}: initialised {size} positions in {time.time() - started:.1f}s")
+    
+    # Bước 2: lan truyền ngược theo từng nửa nước
+    ply = 0
+    while levels:
+        for index, value in levels.pop(ply, []):
+            if values[index] != DRAW:
+                continue
+            values[index] = value
+            squares, stm = table.decode(index)
+            for parent in _predecessors(table, squares, stm):
+                if values[parent] != DRAW:
+                    continue
+                if value >= LOSS:
+                    # Thế con thua cho bên đi -> thế cha thắng sau ply + 1 nửa nước
+                    levels.setdefault(ply + 1, []).append((parent, ply + 1))
+                else:
+                    counts[parent] -= 1
+                    if counts[parent] == 0 and not safe[parent]:
+                        plies = max(ply + 1, external_loss[parent])
+                        levels.setdefault(plies, []).append((parent, LOSS + plies))
+        ply += 1
+        if ply >= LOSS - 1:
+            raise ValueError(f"{name}: distance to mate exceeds the table format")
+    
+    if verbose:
+        print(f"{name}: solved in {time.time() - started:.1f}s, longest mate {ply - 1} plies")
+    return table
+
+def table_path(name, directory=TABLEBASE_DIR):
+    return os.path.join(directory, f"{name}.tb")
+
+def save_table(table, directory=TABLEBASE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    with open(table_path(table.name, directory), 'wb') as table_file:
+        table_file.write(zlib.compress(bytes(table.values), 9))
+
+def load_table(name, directory=TABLEBASE_DIR):
+    """Load a table from disk, or return None if it has not been generated"""
+    path = table_path(name, directory)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as table_file:
+        values = zlib.decompress(table_file.read())
+    table = Tablebase(name, values)
+    if len(values) != table.size:
+        return None
+    return table
+
+def generate_tables(names, directory=TABLEBASE_DIR, force=False, verbose=False):
+    """Generate tables and their dependencies, reusing tables already on disk"""
+    tables = {}
+
+    def build(name):
+        if name in tables:
+            return
+        for dependency in get_dependencies(name):
+            build(dependency)
+        table = None if force else load_table(name, directory)
+        if table is None:
+            table = generate_table(name, tables, verbose)
+            save_table(table, directory)
+        tables[name] = table
+    
+    for name in names:
+        white, black = split_signature(name)
+        if len(white) + len(black) > MAX_PIECES:
+            raise ValueError(f"{name}: at most {MAX_PIECES} pieces are supported")
+        normalized, _ = normalize_signature(white, black)
+        build(normalized)
+    return tables
+
+# Bảng đã nạp cho việc tra cứu trong ván đấu (None nếu chưa được tạo)
+_loaded_tables = {}
+
+def get_table(name):
+    if name not in _loaded_tables:
+        _loaded_tables[name] = load_table(name)
+    return _loaded_tables[name]
+
+def _castling_possible(game_state):
+    board = game_state['board']
+    rights = game_state['castling_rights']
+    for color, row in (('white', 7), ('black', 0)):
+        if board.get((row, 4)) != ('K', color):
+            continue
+        if rights[f'{color}_king_side'] and board.get((row, 7)) == ('R', color):
+            return True
+        if rights[f'{color}_queen_side'] and board.get((row, 0)) == ('R', color):
+            return True
+    return False
+
+def _en_passant_possible(game_state):
+    target = game_state.get('en_passant_target')
+    if not target:
+        return False
+    color = game_state['turn']
+    row = target[0] + (1 if color == 'white' else -1)
+    return any(game_state['board'].get((row, target[1] + d)) == ('P', color) for d in (-1, 1))
+
+def probe_position(game_state):
+    """
+    Probe the tables for a game state.
+    Returns ('win' | 'loss' | 'draw', plies to mate) for the side to move, or None
+    if the position is not covered (too many pieces, table missing, castling or en passant possible).
+    """
+    board = game_state['board']
+    if len(board) > MAX_PIECES:
+        return None
+    
+    white, black = split_signature(get_material_signature(board))
+    if is_drawn_material(white, black):
+        return ('draw', 0)
+    if _castling_possible(game_state) or _en_passant_possible(game_state):
+        return None
+    
+    name, swapped = normalize_signature(white, black)
+    table = get_table(name)
+    if table is None:
+        return None
+    
+    stm = 0 if game_state['turn'] == 'white' else 1
+    entries = [(piece_type, color, row * 8 + col) for (row, col), (piece_type, color) in board.items()]
+    if swapped:
+        entries = [(p, 'black' if c == 'white' else 'white', sq ^ 56) for p, c, sq in entries]
+        stm = 1 - stm
+    
+    value = table.lookup_entries(entries, stm)
+    if value == ILLEGAL:
+        return None
+    if value == DRAW:
+        return ('draw', 0)
+    if value >= LOSS:
+        return ('loss', value - LOSS)
+    return ('win', value)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases by retrograde analysis")
+    parser.add_argument('tables', nargs='+', help="material sets such as KQvK KRvK KPvK KBNvK")
+    parser.add_argument('-o', '--output', default=TABLEBASE_DIR, help="output directory")
+    parser.add_argument('--force', action='store_true', help="regenerate tables that already exist")
+    args = parser.parse_args(argv)
+    
+    generate_tables(args.tables, args.output, args.force, verbose=True)
+
+if __name__ == '__main__':
+    main()
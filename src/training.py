@@ -0,0 +1,256 @@
+"""
+Training positions for evaluation tuning, extracted to NumPy arrays
+
+Games are read from PGN files or binary game record files (src/records.py,
+e.g. self-play games written by 'python -m src.match --records'), replayed on
+a process pool, and their quiet positions are written to fixed-size chunks in
+an output directory, so memory use does not depend on the size of the corpus:
+
+    planes_00000.npy  uint8 (n, 12, 8)  piece planes in PLANE_PIECES order, one bit per file
+    turn_00000.npy    uint8 (n,)        1 if white is to move
+    result_00000.npy  int8 (n,)         game result from white's point of view (1, 0, -1)
+    index.json        chunk names and position counts
+
+    python -m src.training games.pgn selfplay.bin -o data/ --workers 8
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import deque
+from multiprocessing import Pool
+import numpy as np
+from src import ai
+from src.pgn import iter_game_states, read_games
+from src.pieces import is_check, is_king_in_check_simple
+from src.records import GameRecordReader
+
+PLANE_PIECES = [(piece_type, color) for color in ('white', 'black') for piece_type in 'PNBRQK']
+PLANE_INDEX = {piece: index for index, piece in enumerate(PLANE_PIECES)}
+RESULT_VALUES = {'1-0': 1, '1/2-1/2': 0, '0-1': -1}
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+# Số ván trong mỗi việc gửi cho tiến trình con
+GAMES_PER_TASK = 64
+# Bỏ qua các nước khai cuộc (thường lấy từ sách hoặc từ tệp khai cuộc)
+DEFAULT_SKIP_PLIES = 8
+
+def is_quiet(game_state):
+    """
+    Static quiescence test: the side to move is not in check, has no promotion and no
+    capture that wins material outright (a more valuable piece or an undefended one).
+    """
+    board = game_state['board']
+    turn = game_state['turn']
+    opponent = 'black' if turn == 'white' else 'white'
+    if is_check(board, game_state, turn):
+        return False
+    for start, end in ai.get_all_valid_moves(board, game_state, turn):
+        piece_type = board[start][0]
+        if piece_type == 'P' and end[0] in (0, 7):
+            return False
+        victim = board.get(end)
+        if victim is None:
+            continue
+        if ai.PIECE_VALUES[victim[0]] > ai.PIECE_VALUES[piece_type] or not is_king_in_check_simple(board, end, opponent):
+            return False
+    return True
+
+def encode_positions(boards):
+    """Pack a list of boards into a uint8 array of shape (n, 12, 8), one bit per square"""
+    rows, columns = [], []
+    for index, board in enumerate(boards):
+        for (row, col), piece in board.items():
+            rows.append(index)
+            columns.append(PLANE_INDEX[piece] * 64 + row * 8 + col)
+    planes = np.zeros((len(boards), len(PLANE_PIECES) * 64), dtype=np.uint8)
+    planes[rows, columns] = 1
+    return np.packbits(planes.reshape(len(boards), len(PLANE_PIECES), 8, 8), axis=-1).reshape(len(boards), len(PLANE_PIECES), 8)
+
+def unpack_planes(planes):
+    """Expand packed planes (..., 12, 8) into 0/1 planes (..., 12, 8, 8)"""
+    return np.unpackbits(planes[..., np.newaxis], axis=-1)
+
+def extract_task(task):
+    """
+    Worker-process entry point. task = (kind, source, options) where kind is 'pgn'
+    (source = list of games from read_games) or 'records' (source = (path, first, stop)).
+    Returns {'planes', 'turn', 'result', 'games', 'positions'} for the quiet positions found.
+    """
+    kind, source, options = task
+    reader = None
+    if kind == 'pgn':
+        games = ((game['result'], iter_game_states(game)) for game in source)
+    else:
+        path, first, stop = source
+        reader = GameRecordReader(path)
+        games = ((reader.header(index)['result'], reader.replay(index)) for index in range(first, stop))
+    
+    boards, turns, results = [], [], []
+    game_count = positions = 0
+    try:
+        for result, replay in games:
+            # Ván chưa kết thúc không có nhãn
+            if result not in RESULT_VALUES:
+                continue
+            game_count += 1
+            try:
+                for ply, (game_state, _) in enumerate(replay):
+                    positions += 1
+                    if ply < options['skip_plies'] or (options['quiet'] and not is_quiet(game_state)):
+                        continue
+                    boards.append(dict(game_state['board']))
+                    turns.append(game_state['turn'] == 'white')
+                    results.append(RESULT_VALUES[result])
+            except ValueError:
+                # Nước đi không hợp lệ trong tệp ván đấu: giữ các thế cờ trước đó
+                pass
+    finally:
+        if reader:
+            reader.close()
+    
+    return {'planes': encode_positions(boards), 'turn': np.array(turns, dtype=np.uint8),
+            'result': np.array(results, dtype=np.int8), 'games': game_count, 'positions': positions}
+
+def _tasks(paths, options):
+    """Chia các tệp đầu vào thành các việc nhỏ, đọc dần PGN để không nạp cả tệp"""
+    for path in paths:
+        if path.endswith('.pgn'):
+            batch = []
+            for game in read_games(path):
+                batch.append(game)
+                if len(batch) == GAMES_PER_TASK:
+                    yield 'pgn', batch, options
+                    batch = []
+            if batch:
+                yield 'pgn', batch, options
+        else:
+            reader = GameRecordReader(path)
+            count = len(reader)
+            reader.close()
+            for first in range(0, count, GAMES_PER_TASK):
+                yield 'records', (path, first, min(first + GAMES_PER_TASK, count)), options
+
+class ChunkWriter:
+    """Buffers positions and writes them as fixed-size .npy chunks"""
+
+    def __init__(self, directory, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.planes = np.zeros((chunk_size, len(PLANE_PIECES), 8), dtype=np.uint8)
+        self.turn = np.zeros(chunk_size, dtype=np.uint8)
+        self.result = np.zeros(chunk_size, dtype=np.int8)
+        self.count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, batch):
+        """Append the arrays returned by extract_task, writing every chunk that fills up"""
+        done = 0
+        total = len(batch['turn'])
+        while done < total:
+            size = min(total - done, self.chunk_size - self.count)
+            for name in ('planes', 'turn', 'result'):
+                getattr(self, name)[self.count:self.count + size] = batch[name][done:done + size]
+            self.count += size
+            done += size
+            if self.count == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered positions as the next chunk"""
+        if not self.count:
+            return
+        number = len(self.chunks)
+        for name in ('planes', 'turn', 'result'):
+            np.save(os.path.join(self.directory, f'{name}_{number:05d}.npy'), getattr(self, name)[:self.count])
+        self.chunks.append({'number': number, 'positions': self.count})
+        self.count = 0
+
+    def close(self):
+        """Write the last partial chunk and the index"""
+        self.flush()
+        with open(os.path.join(self.directory, 'index.json'), 'w', encoding='utf-8') as index_file:
+            json.dump({'planes': [f'{color}_{piece_type}' for piece_type, color in PLANE_PIECES],
+                       'chunks': self.chunks}, index_file, indent=2)
+
+def extract_training_data(paths, output_dir, chunk_size=DEFAULT_CHUNK_SIZE, workers=None,
+                          skip_plies=DEFAULT_SKIP_PLIES, quiet=True, callback=None):
+    """
+    Extract the positions of all games in `paths` (PGN or record files) into chunks in output_dir.
+    Only positions after skip_plies are kept, and only quiet ones when quiet is set.
+    callback(stats) is called after every finished task.
+    Returns {'games', 'positions', 'kept', 'chunks', 'time'}.
+    """
+    options = {'skip_plies': skip_plies, 'quiet': quiet}
+    writer = ChunkWriter(output_dir, chunk_size)
+    stats = {'games': 0, 'positions': 0, 'kept': 0, 'chunks': 0, 'time': 0.0}
+    start = time.perf_counter()
+
+    def collect(batch):
+        writer.add(batch)
+        stats['games'] += batch['games']
+        stats['positions'] += batch['positions']
+        stats['kept'] += len(batch['turn'])
+        stats['chunks'] = len(writer.chunks)
+        stats['time'] = time.perf_counter() - start
+        if callback:
+            callback(stats)
+    
+    workers = workers or os.cpu_count() or 1
+    pool = Pool(workers) if workers > 1 else None
+    # Giới hạn số việc đang chờ để bộ nhớ không phụ thuộc vào kích thước dữ liệu
+    pending = deque()
+    try:
+        for task in _tasks(paths, options):
+            if pool is None:
+                collect(extract_task(task))
+                continue
+            pending.append(pool.apply_async(extract_task, (task,)))
+            if len(pending) >= workers * 2:
+                collect(pending.popleft().get())
+        while pending:
+            collect(pending.popleft().get())
+    finally:
+        if pool:
+            pool.terminate()
+    
+    writer.close()
+    stats['chunks'] = len(writer.chunks)
+    stats['time'] = time.perf_counter() - start
+    return stats
+
+def load_chunks(directory, mmap=True):
+    """Yield {'planes', 'turn', 'result'} for every chunk; arrays are memory-mapped by default"""
+    with open(os.path.join(directory, 'index.json'), encoding='utf-8') as index_file:
+        chunks = json.load(index_file)['chunks']
+    for chunk in chunks:
+        yield {name: np.load(os.path.join(directory, f"{name}_{chunk['number']:05d}.npy"), mmap_mode='r' if mmap else None)
+               for name in ('planes', 'turn', 'result')}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract labelled training positions from games into NumPy chunks")
+    parser.add_argument('games', nargs='+', help="PGN files or binary game record files")
+    parser.add_argument('-o', '--output', required=True, help="output directory")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="positions per chunk file")
+    parser.add_argument('--workers', type=int, help="number of processes (default: all CPUs)")
+    parser.add_argument('--skip-plies', type=int, default=DEFAULT_SKIP_PLIES, help="skip the first N plies of every game")
+    parser.add_argument('--all', action='store_true', help="keep positions that are not quiet")
+    args = parser.parse_args(argv)
+
+    def progress(stats):
+        print(f"Games {stats['games']:8d}  positions {stats['positions']:10d}  kept {stats['kept']:10d}"
+              f"  {stats['positions'] / max(stats['time'], 1e-6):.0f} positions/s", flush=True)
+    
+    stats = extract_training_data(args.games, args.output, args.chunk_size, args.workers,
+                                  args.skip_plies, not args.all, progress)
+    print("===========================")
+    print(f"Games          : {stats['games']}")
+    print(f"Positions      : {stats['positions']}")
+    print(f"Kept           : {stats['kept']}")
+    print(f"Chunks         : {stats['chunks']}")
+    print(f"Time (s)       : {stats['time']:.1f}")
+
+if __name__ == '__main__':
+    main()
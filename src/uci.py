@@ -0,0 +1,308 @@
+"""
+UCI (Universal Chess Interface) front end
+
+Lets match managers and chess GUIs drive find_best_move:
+
+    python -m src.uci
+
+Supported commands: uci, isready, setoption, ucinewgame, position, go
+(wtime/btime/winc/binc/movestogo/movetime/depth/nodes/infinite/ponder), stop,
+ponderhit and quit. Standard input is read on its own thread, so stop and
+isready are handled while a search is running; the search streams info
+lines (depth, score, nodes, nps, time, pv) after every completed depth.
+With the MultiPV option above 1 the search runs find_best_moves and reports
+every line with its multipv index. Forced wins are reported as 'score mate N'.
+This module does not import pygame.
+"""
+
+import sys
+import threading
+import time
+from queue import Queue
+from src import ai
+from src.board import create_game_state, move_piece
+from src.fen import parse_fen
+from src.pgn import parse_square, square_name
+
+ENGINE_NAME = 'Chess Game with AI'
+ENGINE_AUTHOR = 'ai-chess-python'
+
+# Độ sâu tối đa khi tìm kiếm theo thời gian, số nút hoặc vô hạn
+MAX_DEPTH = 64
+
+# Phân bổ thời gian khi không có movestogo: giả định còn khoảng 30 nước
+DEFAULT_MOVES_TO_GO = 30
+# Thời gian dự phòng cho độ trễ giao tiếp (giây)
+MOVE_OVERHEAD = 0.05
+
+# Tùy chọn UCI: tên -> (kiểu, mặc định, min, max)
+OPTIONS = {
+    'Hash': ('spin', ai.TT_BYTES // (1024 * 1024), 1, 1024),
+    'OwnBook': ('check', True, None, None),
+    'Tablebases': ('check', True, None, None),
+    'Experience': ('check', False, None, None),
+    'Ponder': ('check', False, None, None),
+    'MultiPV': ('spin', 1, 1, 16),
+    'Clear Hash': ('button', None, None, None)
+}
+
+def move_to_uci(move, promotion=None):
+    """Convert (start, end) to long algebraic notation, e.g. 'e2e4' or 'e7e8q'"""
+    start, end = move
+    return square_name(start) + square_name(end) + (promotion or '').lower()
+
+def parse_uci_move(text):
+    """Convert long algebraic notation to (start, end, promotion)"""
+    promotion = text[4].upper() if len(text) > 4 else None
+    return parse_square(text[0:2]), parse_square(text[2:4]), promotion
+
+def allocate_time(game_state, limits):
+    """Seconds to spend on this move from the go parameters, or None for no time limit"""
+    if 'movetime' in limits:
+        return max(0.01, limits['movetime'] / 1000 - MOVE_OVERHEAD)
+    side = 'w' if game_state['turn'] == 'white' else 'b'
+    if f'{side}time' not in limits:
+        return None
+    remaining = limits[f'{side}time'] / 1000
+    increment = limits.get(f'{side}inc', 0) / 1000
+    moves_to_go = limits.get('movestogo') or DEFAULT_MOVES_TO_GO
+    budget = remaining / moves_to_go + increment * 0.8
+    # Không bao giờ dùng quá nửa thời gian còn lại
+    return max(0.01, min(budget, remaining / 2) - MOVE_OVERHEAD)
+
+def format_score(value, game_state):
+    """
+    UCI score from the side to move's point of view: 'mate N' for forced wins
+    (checkmate or tablebase win, N in moves), otherwise 'cp N'
+    """
+    if game_state['turn'] == 'black':
+        value = -value
+    plies = ai.mate_distance(value)
+    if plies is not None:
+        moves = (abs(plies) + 1) // 2
+        return f"mate {moves if plies > 0 else -moves}"
+    return f"cp {int(value)}"
+
+class UCIEngine:
+    """UCI command loop; the search runs on a background thread"""
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.game_state = create_game_state()
+        self.options = {name: default for name, (_, default, _, _) in OPTIONS.items()}
+        self.search_thread = None
+        self.ponder_timer = None
+        # Được đặt khi bestmove có thể được gửi (tìm kiếm vô hạn/ponder phải chờ stop hoặc ponderhit)
+        self.release = threading.Event()
+        self.search_time = None
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def run(self, source=sys.stdin):
+        """Read commands until 'quit' or end of input"""
+        commands = Queue()
+        
+        def read_input():
+            for line in source:
+                commands.put(line)
+            commands.put('quit')
+        
+        threading.Thread(target=read_input, daemon=True).start()
+        while True:
+            line = commands.get().strip()
+            if line and not self.handle(line):
+                break
+
+    def handle(self, line):
+        """Handle one command line; returns False on 'quit'"""
+        command, _, arguments = line.partition(' ')
+        if command == 'uci':
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            for name, (kind, default, low, high) in OPTIONS.items():
+                option = f"option name {name} type {kind}"
+                if kind == 'check':
+                    option += f" default {'true' if default else 'false'}"
+                elif kind == 'spin':
+                    option += f" default {default} min {low} max {high}"
+                self.send(option)
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            self.set_option(arguments)
+        elif command == 'ucinewgame':
+            self.stop()
+            ai.reset_caches()
+            self.game_state = create_game_state()
+        elif command == 'position':
+            self.stop()
+            self.set_position(arguments)
+        elif command == 'go':
+            self.stop()
+            self.go(arguments)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'ponderhit':
+            self.ponderhit()
+        elif command == 'quit':
+            self.stop()
+            return False
+        return True
+
+    def set_option(self, arguments):
+        """setoption name <name> [value <value>]"""
+        words = arguments.split()
+        if 'name' not in words:
+            return
+        value_index = words.index('value') if 'value' in words else len(words)
+        name = ' '.join(words[words.index('name') + 1:value_index])
+        value = ' '.join(words[value_index + 1:])
+        option = next((option for option in OPTIONS if option.lower() == name.lower()), None)
+        if option is None:
+            self.send(f"info string unknown option {name}")
+            return
+        kind, _, low, high = OPTIONS[option]
+        if kind == 'button':
+            ai.reset_caches()
+        elif kind == 'check':
+            self.options[option] = value.lower() == 'true'
+        elif kind == 'spin':
+            try:
+                self.options[option] = max(low, min(high, int(value)))
+            except ValueError:
+                return
+            if option == 'Hash':
+                ai.configure_caches(tt_bytes=self.options[option] * 1024 * 1024)
+
+    def set_position(self, arguments):
+        """position startpos | fen <fen> [moves <move> ...]"""
+        words = arguments.split()
+        moves_index = words.index('moves') if 'moves' in words else len(words)
+        try:
+            if words and words[0] == 'fen':
+                game_state = parse_fen(' '.join(words[1:moves_index]))
+            else:
+                game_state = create_game_state()
+            for text in words[moves_index + 1:]:
+                start, end, promotion = parse_uci_move(text)
+                played = len(game_state['move_history'])
+                game_state = move_piece(game_state, start, end, promotion or 'Q')
+                if len(game_state['move_history']) == played:
+                    raise ValueError(f"illegal move {text}")
+        except (ValueError, IndexError) as error:
+            self.send(f"info string invalid position: {error}")
+            return
+        self.game_state = game_state
+
+    def go(self, arguments):
+        """Start searching the current position on a background thread"""
+        words = arguments.split()
+        limits = {}
+        for index, word in enumerate(words):
+            if word in ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'movetime', 'depth', 'nodes'):
+                try:
+                    limits[word] = int(words[index + 1])
+                except (IndexError, ValueError):
+                    pass
+        infinite = 'infinite' in words
+        ponder = 'ponder' in words
+        
+        self.search_time = allocate_time(self.game_state, limits)
+        profile = {
+            'nodes': limits.get('nodes'),
+            'max_depth': limits.get('depth', MAX_DEPTH),
+            'noise': 0,
+            # Khi ponder hoặc vô hạn, chỉ dừng khi có stop/ponderhit
+            'time': None if infinite or ponder else self.search_time,
+            'book': self.options['OwnBook'] and not infinite,
+            'tablebase': self.options['Tablebases'],
+            'experience': self.options['Experience']
+        }
+        if infinite or ponder:
+            self.release.clear()
+        else:
+            self.release.set()
+        
+        ai.search_limits['stop'] = False
+        self.search_thread = threading.Thread(target=self.search, args=(self.game_state, profile), daemon=True)
+        self.search_thread.start()
+
+    def search(self, game_state, profile):
+        start_time = time.time()
+        multipv = self.options['MultiPV']
+        line_number = 0
+        
+        def report(iteration):
+            nonlocal line_number
+            # Mỗi lượt của find_best_moves bắt đầu lại từ độ sâu 1
+            if iteration['depth'] == 1:
+                line_number += 1
+            elapsed = max(time.time() - start_time, 1e-6)
+            pv = ai.get_principal_variation(game_state, iteration['move'], iteration['depth'])
+            line = f" multipv {line_number}" if multipv > 1 else ""
+            self.send(f"info depth {iteration['depth']}{line} score {format_score(iteration['score'], game_state)}"
+                      f" nodes {iteration['nodes']} nps {int(iteration['nodes'] / elapsed)}"
+                      f" time {int(elapsed * 1000)} pv {' '.join(move_to_uci(move) for move in pv)}")
+        
+        ai.search_limits['on_iteration'] = report
+        try:
+            if multipv > 1:
+                # Phân tích nhiều biến: chia đều ngân sách cho các lượt, không dùng sách khai cuộc
+                max_time = profile['time'] / multipv if profile['time'] else None
+                max_nodes = profile['nodes'] // multipv if profile['nodes'] else None
+                lines = ai.find_best_moves(game_state, profile['max_depth'], multipv, max_time, max_nodes=max_nodes)
+                move = lines[0]['move'] if lines else None
+            else:
+                move = ai.find_best_move(game_state, profile['max_depth'], profile)
+        finally:
+            ai.search_limits['on_iteration'] = None
+        
+        stats = ai.get_search_stats()
+        elapsed = time.time() - start_time
+        self.send(f"info nodes {stats['nodes']} time {int(elapsed * 1000)} nps {int(stats['nodes'] / max(elapsed, 1e-6))}")
+        # Tìm kiếm vô hạn/ponder kết thúc sớm: chờ stop hoặc ponderhit rồi mới trả lời
+        self.release.wait()
+        
+        if move is None:
+            self.send("bestmove 0000")
+            return
+        start, end = move
+        piece = game_state['board'].get(start)
+        promotion = 'q' if piece and piece[0] == 'P' and end[0] in (0, 7) else None
+        line = f"bestmove {move_to_uci(move, promotion)}"
+        pv = ai.get_principal_variation(game_state, move, 2)
+        if len(pv) > 1:
+            line += f" ponder {move_to_uci(pv[1])}"
+        self.send(line)
+
+    def stop(self):
+        """Stop the running search, if any, and wait for its bestmove"""
+        if self.ponder_timer:
+            self.ponder_timer.cancel()
+            self.ponder_timer = None
+        if self.search_thread and self.search_thread.is_alive():
+            ai.stop_search()
+            self.release.set()
+            self.search_thread.join()
+        self.search_thread = None
+
+    def ponderhit(self):
+        """The expected move was played: keep searching, now under the normal time limit"""
+        if not (self.search_thread and self.search_thread.is_alive()):
+            return
+        self.release.set()
+        if self.search_time is not None:
+            self.ponder_timer = threading.Timer(self.search_time, ai.stop_search)
+            self.ponder_timer.daemon = True
+            self.ponder_timer.start()
+
+def main():
+    UCIEngine().run()
+
+if __name__ == '__main__':
+    main()
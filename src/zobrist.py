@@ -0,0 +1,73 @@
+"""
+Zobrist hashing for chess positions
+"""
+
+import random
+
+# Sinh số ngẫu nhiên cố định để khóa giống nhau giữa các lần chạy
+_rng = random.Random(0x5EED_C0DE)
+
+def _random64():
+    return _rng.getrandbits(64)
+
+# Khóa cho từng (loại quân, màu) tại từng ô (chỉ số ô: row * 8 + col)
+PIECE_KEYS = {
+    (piece_type, color): [_random64() for _ in range(64)]
+    for color in ('white', 'black')
+    for piece_type in ('P', 'N', 'B', 'R', 'Q', 'K')
+}
+
+# Khóa cho lượt đi của đen
+SIDE_KEY = _random64()
+
+# Khóa cho quyền nhập thành
+CASTLING_KEYS = {
+    'white_king_side': _random64(),
+    'white_queen_side': _random64(),
+    'black_king_side': _random64(),
+    'black_queen_side': _random64()
+}
+
+# Khóa cho cột có thể bắt tốt qua đường
+EN_PASSANT_KEYS = [_random64() for _ in range(8)]
+
+def en_passant_capturable(board, target, turn):
+    """
+    True if a pawn of the side to move stands next to the pawn that just moved two squares.
+    Only then is the en passant file part of the key, so that positions that differ
+    only by an unusable en passant square count as repetitions.
+    """
+    row, col = target
+    # Tốt bắt qua đường đứng cùng hàng với tốt vừa đi 2 bước
+    pawn_row = row + 1 if turn == 'white' else row - 1
+    for pawn_col in (col - 1, col + 1):
+        if 0 <= pawn_col < 8 and board.get((pawn_row, pawn_col)) == ('P', turn):
+            return True
+    return False
+
+def compute_pawn_key(board):
+    """Compute a key from the pawns only, used by the pawn structure hash table"""
+    key = 0
+    for (row, col), piece in board.items():
+        if piece[0] == 'P':
+            key ^= PIECE_KEYS[piece][row * 8 + col]
+    return key
+
+def compute_hash(game_state):
+    """Compute the full Zobrist key of a game state from scratch"""
+    key = 0
+    for (row, col), piece in game_state['board'].items():
+        key ^= PIECE_KEYS[piece][row * 8 + col]
+    
+    if game_state['turn'] == 'black':
+        key ^= SIDE_KEY
+    
+    for right, allowed in game_state['castling_rights'].items():
+        if allowed:
+            key ^= CASTLING_KEYS[right]
+    
+    en_passant_target = game_state.get('en_passant_target')
+    if en_passant_target and en_passant_capturable(game_state['board'], en_passant_target, game_state['turn']):
+        key ^= EN_PASSANT_KEYS[en_passant_target[1]]
+    
+    return key